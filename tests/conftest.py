@@ -0,0 +1,11 @@
+import pytest
+
+from xedocs import settings
+
+
+@pytest.fixture(autouse=True)
+def record_cache_dir(tmp_path_factory, monkeypatch):
+    """Keep validated records cached by tests out of the user data dir"""
+    path = str(tmp_path_factory.mktemp("record_cache"))
+    monkeypatch.setattr(settings, "RECORD_CACHE_DIR", path)
+    return path
@@ -0,0 +1,194 @@
+"""Tests for the in-memory caches."""
+import os
+import datetime
+
+import pandas as pd
+import pydantic
+import pytest
+from rframe import DataAccessor
+
+from xedocs.lru import LRUCache
+from xedocs.cache import QueryCache
+from xedocs.schemas.corrections import PmtAreaToPE
+
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), "..", "test_data")
+
+
+def pmt_gains_accessor():
+    path = os.path.join(TEST_DATA, "pmt_gains_random_data.csv")
+    docs = []
+    for doc in pd.read_csv(path).to_dict(orient="records"):
+        try:
+            docs.append(PmtAreaToPE(**doc).pandas_dict())
+        except pydantic.ValidationError:
+            continue
+    df = pd.DataFrame(docs).set_index(list(PmtAreaToPE.get_index_fields()))
+    return DataAccessor(PmtAreaToPE, df)
+
+
+def test_lru_eviction():
+    cache = LRUCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert "b" not in cache
+    assert "a" in cache and "c" in cache
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["entries"] == 2
+
+
+def test_lru_ttl():
+    cache = LRUCache()
+    cache.set("a", 1, ttl=-1)
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_query_cache():
+    accessor = pmt_gains_accessor()
+    cache = QueryCache(max_entries=10)
+    doc = accessor.find_docs()[0]
+    labels = dict(version=doc.version, detector=doc.detector, pmt=doc.pmt)
+
+    first = cache.find_docs(accessor, time=doc.time, **labels)
+    # string times are normalized to the same key
+    second = cache.find_docs(accessor, time=str(doc.time), **labels)
+    assert first == second
+    assert cache.hits == 1 and cache.misses == 1
+
+    key = cache.make_key(accessor, "find_docs", time=doc.time, **labels)
+    assert cache._entries[key].expires is None
+
+    # queries without a time may change and expire
+    cache.find_docs(accessor, **labels)
+    key = cache.make_key(accessor, "find_docs", **labels)
+    assert cache._entries[key].expires is not None
+
+    # queries after the cutoff expire
+    future = datetime.datetime.utcnow() + datetime.timedelta(days=365)
+    assert cache.ttl_for(PmtAreaToPE, first, time=future) == cache.ttl
+
+
+def test_offline_query_store(tmp_path):
+    import pymongo
+    from xedocs.cache import normalize_labels
+    from xedocs.data_locations.mongodb import MongoAccessor
+    from xedocs.data_locations.query_store import QueryStore
+
+    store = QueryStore(str(tmp_path / "query_cache.sqlite"))
+    collection = pymongo.MongoClient("mongodb://localhost", connect=False)["xedocs"]["pmt_area_to_pes"]
+    accessor = MongoAccessor(PmtAreaToPE, collection, store=store, offline=True)
+
+    doc = pmt_gains_accessor().find_docs()[0]
+    labels = dict(version=doc.version, detector=doc.detector, pmt=doc.pmt, time=doc.time)
+    key = store.key(collection.full_name, normalize_labels(PmtAreaToPE, **labels))
+    store.set(key, collection.full_name, [doc.dict()])
+
+    found = accessor.find_docs(**labels)
+    assert found == [doc]
+
+    with pytest.raises(KeyError):
+        accessor.find_docs(version="v0", detector="tpc", pmt=0, time=doc.time)
+
+    with pytest.raises(RuntimeError):
+        accessor.count()
+
+
+def test_immutable_results_pin_labels():
+    accessor = pmt_gains_accessor()
+    cache = QueryCache(max_entries=10)
+    doc = accessor.find_docs()[0]
+    docs = [doc]
+
+    labels = dict(version=doc.version, detector=doc.detector, pmt=doc.pmt, time=doc.time)
+    assert cache.ttl_for(PmtAreaToPE, docs, **labels) is None
+
+    # new versions or pmts may still be inserted
+    for name, label in [("version", None), ("version", [doc.version, "v99"]),
+                        ("pmt", None), ("pmt", [doc.pmt, doc.pmt + 1])]:
+        unpinned = dict(labels, **{name: label})
+        assert cache.ttl_for(PmtAreaToPE, docs, **unpinned) == cache.ttl
+
+
+def test_query_cache_settings(monkeypatch):
+    from xedocs._settings import settings
+
+    cache = QueryCache()
+    monkeypatch.setattr(settings, "QUERY_CACHE_MAX_ENTRIES", 1)
+    monkeypatch.setattr(settings, "QUERY_CACHE_TTL", 5.0)
+    assert cache.max_entries == 1 and cache.ttl == 5.0
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert len(cache) == 1
+
+    # explicit bounds take precedence
+    assert QueryCache(max_entries=10).max_entries == 10
+
+
+def test_find_docs_query_cache(monkeypatch):
+    import xedocs
+    from xedocs._settings import settings
+
+    accessor = pmt_gains_accessor()
+    datasource = {PmtAreaToPE._ALIAS: accessor}
+    doc = accessor.find_docs()[0]
+    labels = dict(version=doc.version, detector=doc.detector, pmt=doc.pmt, time=doc.time)
+
+    calls = []
+    find_docs = accessor.find_docs
+
+    def spy(**kwargs):
+        calls.append(kwargs)
+        return find_docs(**kwargs)
+
+    monkeypatch.setattr(accessor, "find_docs", spy)
+    monkeypatch.setattr(settings, "QUERY_CACHE", True)
+    xedocs.query_cache.clear()
+
+    first = xedocs.find_docs(PmtAreaToPE, datasource=datasource, **labels)
+    second = xedocs.find_docs(PmtAreaToPE, datasource=datasource, **labels)
+    assert first == second == [doc]
+    assert len(calls) == 1
+
+    records = xedocs.find_docs(PmtAreaToPE, datasource=datasource, fields=["value"], **labels)
+    assert [r.value for r in records] == [doc.value]
+    assert len(calls) == 1
+
+    monkeypatch.setattr(settings, "QUERY_CACHE", False)
+    xedocs.find_docs(PmtAreaToPE, datasource=datasource, **labels)
+    assert len(calls) == 2
+    xedocs.query_cache.clear()
+
+
+def test_query_store_bounds(tmp_path):
+    import json
+    import pickle
+    from xedocs.data_locations.query_store import QueryStore
+
+    store = QueryStore(str(tmp_path / "query_cache.sqlite"), max_entries=2)
+    record = dict(value=1.5, time=datetime.datetime(2020, 1, 1))
+    store.set("a", "db.a", [record])
+    assert store.get("a") == [record]
+
+    # records are stored as JSON, never unpickled
+    data = store.connection.execute("SELECT records FROM queries").fetchone()[0]
+    assert json.loads(data)[0]["value"] == {"$numberDouble": "1.5"}
+    with store.connection as conn:
+        conn.execute("UPDATE queries SET records = ? WHERE key = 'a'",
+                     (pickle.dumps([record]),))
+    assert store.get("a") is None
+
+    store.set("b", "db.b", [record])
+    store.set("c", "db.b", [record])
+    store.set("d", "db.b", [record])
+    assert len(store) == 2
+    assert store.get("b") is None and store.get("d") == [record]
+
+    store.max_age = -1
+    assert store.get("d") is None
+
+    store.clear("db.b")
+    assert len(store) == 0
@@ -0,0 +1,93 @@
+"""Tests for building DataFrames directly from raw records."""
+import datetime
+
+import pandas as pd
+import pytest
+from rframe import DataAccessor
+
+import xedocs
+from xedocs.utils import ColumnarDataAccessor, Database, LazyFileAccessor
+from xedocs.columnar import records_to_dataframe
+from xedocs.schemas.corrections import PmtAreaToPE
+from xedocs.schemas.corrections.implementations.global_versions import GlobalVersion
+
+
+START = datetime.datetime(2022, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def pmt_gains_df(n=500):
+    docs = []
+    for i in range(n):
+        doc = PmtAreaToPE(version="v1" if i % 3 else "ONLINE", detector="tpc", pmt=i % 10,
+                          time=START + datetime.timedelta(hours=i // 10), value=float(i))
+        docs.append(doc.pandas_dict())
+    return pd.DataFrame(docs).set_index(list(PmtAreaToPE.get_index_fields()))
+
+
+def global_versions_df():
+    docs = []
+    for i in range(20):
+        left = START + datetime.timedelta(days=30 * i)
+        right = left + datetime.timedelta(days=30) if i < 19 else None
+        doc = GlobalVersion(version=f"v{i % 3}", config_name=f"config_{i % 4}",
+                            url=f"url_{i}", time=(left, right))
+        docs.append(doc.pandas_dict())
+    return pd.DataFrame(docs).set_index(list(GlobalVersion.get_index_fields()))
+
+
+@pytest.mark.parametrize("schema,df", [
+    (PmtAreaToPE, pmt_gains_df()),
+    (GlobalVersion, global_versions_df()),
+])
+def test_columnar_find_df(schema, df):
+    rows = DataAccessor(schema, df)
+    columnar = ColumnarDataAccessor(schema, df)
+    for labels in [{}, {"version": "v1"}, {"version": "v1", "time": START + datetime.timedelta(days=95)}]:
+        expected = rows.find_df(**labels)
+        pd.testing.assert_frame_equal(columnar.find_df(**labels), expected)
+        pd.testing.assert_frame_equal(columnar.find_df(validate=False, **labels), expected)
+
+
+def test_records_to_dataframe():
+    records = [
+        dict(version="v1", detector="tpc", pmt=1, time=START, value=1),
+        # invalid detector
+        dict(version="v1", detector="nveto", pmt=1, time=START, value=2.0),
+        # pmt out of range
+        dict(version="v1", detector="tpc", pmt=-1, time=START, value=3.0),
+        # missing value
+        dict(version="v1", detector="tpc", pmt=2, time=START),
+        # duplicate index
+        dict(version="v1", detector="tpc", pmt=1, time=START, value=5.0),
+        dict(version="v1", detector="tpc", pmt=3, time=START.isoformat(),
+             created_date=START, value=6.0),
+    ]
+    df = records_to_dataframe(PmtAreaToPE, records)
+    assert len(df) == 2
+    assert list(df["value"]) == [1.0, 6.0]
+    assert df["value"].dtype == float
+    assert list(df.index.names) == list(PmtAreaToPE.get_index_fields())
+
+
+@pytest.mark.parametrize("ext", ["csv", "parquet"])
+def test_find_docs_fields(tmp_path, ext):
+    df = pmt_gains_df(100)
+    expected = DataAccessor(PmtAreaToPE, df).find_docs(version="v1")
+    fields = ["pmt", "value"]
+
+    path = str(tmp_path / f"gains.{ext}")
+    getattr(df.reset_index(), f"to_{ext}")(path, index=False)
+    accessors = [ColumnarDataAccessor(PmtAreaToPE, df), LazyFileAccessor(PmtAreaToPE, path)]
+    for accessor in accessors:
+        db = Database({PmtAreaToPE._ALIAS: accessor})
+        records = xedocs.find_docs(PmtAreaToPE, datasource=db, fields=fields, version="v1")
+        assert [tuple(r) for r in records] == [(doc.pmt, doc.value) for doc in expected]
+        assert records[0]._fields == tuple(fields)
+        streamed = list(xedocs.find_iter(PmtAreaToPE, datasource=db, fields=fields,
+                                         version="v1", batch_size=7))
+        assert streamed == records
+
+    # projected file reads are not cached
+    assert not accessors[1].loaded
+    with pytest.raises(KeyError):
+        xedocs.find_docs(PmtAreaToPE, datasource=db, fields=["nope"], version="v1")
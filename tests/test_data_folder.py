@@ -0,0 +1,691 @@
+"""Tests for loading documents from data folders."""
+import os
+import json
+import datetime
+
+import yaml
+import fsspec
+
+import pandas as pd
+import pytest
+from rframe import DataAccessor, TimeInterval
+
+import xedocs
+from xedocs import settings
+from xedocs.dispatchers import read_files, split_compression
+from xedocs.utils import Database, LazyFileAccessor, thread_map
+from xedocs.manifest import write_manifest
+from xedocs.file_listing import partition_format, partition_range, template_to_glob
+from xedocs.data_locations.data_folder import DataFolder
+from xedocs.schemas.corrections import PmtAreaToPE
+from xedocs.schemas.corrections.implementations.global_versions import GlobalVersion
+
+from .test_columnar import START, pmt_gains_df
+
+
+def write_pmt_files(tmp_path, df, ext="csv"):
+    df = df.reset_index()
+    for pmt, group in df.groupby("pmt"):
+        path = str(tmp_path / f"pmt_{pmt}.{ext}")
+        getattr(group, f"to_{ext}")(path, index=False)
+    return str(tmp_path / ("pmt_{pmt}." + ext))
+
+
+def test_thread_map():
+    items = list(range(50))
+    assert thread_map(lambda x: x * 2, items, threads=4) == [x * 2 for x in items]
+    assert thread_map(lambda x: x * 2, items, threads=1) == [x * 2 for x in items]
+    assert thread_map(lambda x: x, [], threads=4) == []
+
+
+@pytest.mark.parametrize("threads", [1, 4])
+def test_parallel_load_files(tmp_path, monkeypatch, threads):
+    monkeypatch.setattr(settings, "FILE_LOAD_THREADS", threads)
+    monkeypatch.setattr(settings, "STREAM_BATCH_SIZE", 7)
+    df = pmt_gains_df(200)
+    pattern = write_pmt_files(tmp_path, df)
+    expected = DataAccessor(PmtAreaToPE, df).find_df(version="v1")
+
+    accessor = LazyFileAccessor(PmtAreaToPE, pattern)
+    accessor.find_df(pmt=[1, 2], version="v1")
+    assert len(accessor.loaded) == 2
+
+    result = accessor.find_df(version="v1")
+    assert len(accessor.loaded) == 10
+    # csv files dont round trip empty strings
+    pd.testing.assert_series_equal(result["value"].sort_index(), expected["value"].sort_index())
+
+
+def test_deferred_storage_merge(tmp_path):
+    df = pmt_gains_df(200)
+    pattern = write_pmt_files(tmp_path, df)
+    accessor = LazyFileAccessor(PmtAreaToPE, pattern)
+
+    for pmt in range(3):
+        accessor.load_files(pmt=pmt)
+    assert len(accessor.partitions) == 3
+    storage = accessor.storage
+    assert not accessor.partitions
+    assert len(storage) == 60
+    index_fields = list(PmtAreaToPE.get_index_fields())
+    pd.testing.assert_frame_equal(storage, storage.sort_values(index_fields))
+
+    # nothing new to load, storage is left untouched
+    accessor.load_files(pmt=1)
+    assert not accessor.partitions
+    assert accessor.storage is storage
+
+
+def test_cached_listing(tmp_path, monkeypatch):
+    df = pmt_gains_df(100)
+    pattern = write_pmt_files(tmp_path, df)
+    accessor = LazyFileAccessor(PmtAreaToPE, pattern)
+
+    calls = []
+    get_fs_token_paths = fsspec.get_fs_token_paths
+
+    def counting(*args, **kwargs):
+        calls.append(args)
+        return get_fs_token_paths(*args, **kwargs)
+
+    monkeypatch.setattr(fsspec, "get_fs_token_paths", counting)
+
+    paths = [p for p, _, _ in accessor.matching_paths(pmt=[3, 1])]
+    assert [os.path.basename(p) for p in paths] == ["pmt_1.csv", "pmt_3.csv"]
+    assert accessor.listing(pattern).labels_for(paths[0]) == {"pmt": 1}
+    assert len(list(accessor.matching_paths())) == 10
+    assert not list(accessor.matching_paths(pmt=11))
+    assert len(calls) == 1
+
+    # the watched directories are only collected when listing
+    from xedocs.file_listing import PathListing
+
+    walks = []
+    directories = PathListing.directories
+    monkeypatch.setattr(PathListing, "directories",
+                        lambda self: walks.append(1) or directories(self))
+    for pmt in range(10):
+        assert len(list(accessor.matching_paths(pmt=pmt))) == 1
+    assert not walks
+
+    # a new file modifies the directory and refreshes the listing
+    df.reset_index().head(1).assign(pmt=11).to_csv(tmp_path / "pmt_11.csv", index=False)
+    os.utime(tmp_path, ns=(0, 0))
+    assert len(list(accessor.matching_paths(pmt=11))) == 1
+    assert len(calls) == 2
+
+
+def write_global_versions(root, n_files=4):
+    """Global versions split into files of consecutive time ranges"""
+    os.makedirs(root / "global_versions")
+    for part in range(n_files):
+        docs = []
+        for i in range(5):
+            left = START + datetime.timedelta(days=100 * part + 20 * i)
+            right = left + datetime.timedelta(days=20)
+            doc = GlobalVersion(version="v1", config_name=f"config_{part}",
+                                url=f"url_{part}_{i}", time=(left, right))
+            docs.append(doc.jsonable())
+        with open(root / "global_versions" / f"part_{part}.json", "w") as f:
+            json.dump(docs, f)
+    with open(root / "datasets.yml", "w") as f:
+        yaml.safe_dump({"global_versions": {"schema": GlobalVersion._ALIAS,
+                                            "path": "global_versions/*.json"}}, f)
+
+
+def test_manifest_pruning(tmp_path):
+    write_global_versions(tmp_path)
+    folder = DataFolder(root=str(tmp_path))
+    unpruned = folder.get_datasets()[GlobalVersion._ALIAS]
+    assert unpruned.manifest is None
+
+    path = write_manifest(folder)
+    with open(path) as f:
+        manifest = json.load(f)
+    files = manifest["datasets"][GlobalVersion._ALIAS]["files"]
+    entry = files[os.path.join("global_versions", "part_1.json")]
+    assert entry["rows"] == 5
+    assert entry["labels"]["config_name"] == ["config_1"]
+    assert pd.Timestamp(entry["ranges"]["time"][0]) == START + datetime.timedelta(days=100)
+
+    accessor = folder.get_datasets()[GlobalVersion._ALIAS]
+    assert accessor.manifest is not None
+
+    time = START + datetime.timedelta(days=130)
+    assert accessor.find_docs(time=time) == unpruned.find_docs(time=time)
+    assert [os.path.basename(p) for p in accessor.loaded] == ["part_1.json"]
+
+    interval = TimeInterval(left=START + datetime.timedelta(days=150),
+                            right=START + datetime.timedelta(days=250))
+    accessor.find_docs(time=interval)
+    assert len(accessor.loaded) == 2
+
+    accessor.find_docs(config_name="config_3")
+    assert len(accessor.loaded) == 3
+
+    # modified files are not pruned
+    with open(tmp_path / "global_versions" / "part_0.json", "a") as f:
+        f.write(" ")
+    accessor.find_docs(time=time)
+    assert len(accessor.loaded) == 4
+
+
+def test_manifest_same_size_edit(tmp_path):
+    write_global_versions(tmp_path)
+    folder = DataFolder(root=str(tmp_path))
+    write_manifest(folder)
+
+    # relabel a file without changing its size
+    path = tmp_path / "global_versions" / "part_2.json"
+    content = path.read_text()
+    path.write_text(content.replace("config_2", "config_9"))
+    assert len(path.read_text()) == len(content)
+    os.utime(path, ns=(0, 0))
+
+    accessor = folder.get_datasets()[GlobalVersion._ALIAS]
+    assert accessor.manifest is not None
+    assert len(accessor.find_docs(config_name="config_9")) == 5
+
+    # touched files with the recorded checksum are still pruned
+    accessor = folder.get_datasets()[GlobalVersion._ALIAS]
+    os.utime(tmp_path / "global_versions" / "part_1.json", ns=(0, 0))
+    assert len(accessor.find_docs(config_name="config_0")) == 5
+    # the edited file can not be pruned
+    assert sorted(os.path.basename(p) for p in accessor.loaded) == ["part_0.json", "part_2.json"]
+
+
+def test_partition_templates():
+    assert template_to_glob("/data/{time:%Y}/{time:%m}_{pmt:d}.csv") == "/data/*/*_*.csv"
+    assert template_to_glob("/data/{science_run}/{time:%Y}{time:%m}.csv") == "/data/*/*.csv"
+    fmt, partitions = partition_format("{science_run}/{time:%Y}/{time:%m}.csv")
+    assert fmt == "{science_run}/{time__0}/{time__1}.csv"
+    assert partitions == {"time": [("time__0", "%Y"), ("time__1", "%m")]}
+    lo, hi = partition_range([("%Y", "2023"), ("%m", "12")])
+    assert pd.Timestamp(lo, tz="UTC") == pd.Timestamp("2023-12-01", tz="UTC")
+    assert pd.Timestamp(hi, tz="UTC") == pd.Timestamp("2024-01-01", tz="UTC")
+    # months without a year are not a time range
+    assert partition_range([("%m", "12")]) is None
+
+
+def test_time_partitioned_folder(tmp_path, monkeypatch):
+    docs = []
+    for day in range(120):
+        for pmt in range(2):
+            doc = PmtAreaToPE(version="v1", detector="tpc", pmt=pmt,
+                              time=START + datetime.timedelta(days=day, hours=12),
+                              value=float(day + pmt))
+            docs.append(doc.pandas_dict())
+    df = pd.DataFrame(docs)
+    for month, group in df.groupby(df["time"].dt.month):
+        os.makedirs(tmp_path / "2022", exist_ok=True)
+        group.to_csv(tmp_path / "2022" / f"{month:02d}.csv", index=False)
+    template = str(tmp_path / "{time:%Y}" / "{time:%m}.csv")
+
+    time = START + datetime.timedelta(days=45)
+    accessor = LazyFileAccessor(PmtAreaToPE, template, prune_interpolated=True)
+    docs = accessor.find_docs(time=time, version="v1")
+    # the nearest partitions are kept for interpolation
+    assert sorted(os.path.basename(p) for p in accessor.loaded) == ["01.csv", "02.csv", "03.csv"]
+    expected = DataAccessor(PmtAreaToPE, df.set_index(list(PmtAreaToPE.get_index_fields())))
+    assert [d.value for d in docs] == [d.value for d in expected.find_docs(time=time, version="v1")]
+
+    # without opting in, interpolated fields are not pruned
+    accessor = LazyFileAccessor(PmtAreaToPE, template)
+    assert len(list(accessor.matching_paths(time=time))) == 4
+
+    monkeypatch.setattr(type(settings), "run_id_to_time",
+                        lambda self, run_id: START + datetime.timedelta(days=100))
+    accessor = LazyFileAccessor(PmtAreaToPE, template, prune_interpolated=True)
+    assert [p for p, _, _ in accessor.matching_paths(run_id=1)] == [
+        str(tmp_path / "2022" / "03.csv"), str(tmp_path / "2022" / "04.csv")]
+
+    os.makedirs(tmp_path / "gv")
+    for year in [2022, 2023, 2024]:
+        left = datetime.datetime(year, 6, 1, tzinfo=datetime.timezone.utc)
+        right = left + datetime.timedelta(days=400)
+        doc = GlobalVersion(version="v1", config_name="config", url=f"url_{year}", time=(left, right))
+        with open(tmp_path / "gv" / f"{year}.json", "w") as f:
+            json.dump([doc.jsonable()], f)
+    accessor = LazyFileAccessor(GlobalVersion, str(tmp_path / "gv" / "{time:%Y}.json"))
+    docs = accessor.find_docs(time=datetime.datetime(2023, 3, 1, tzinfo=datetime.timezone.utc))
+    assert [d.url for d in docs] == ["url_2022"]
+    # intervals may extend past their partition
+    assert sorted(os.path.basename(p) for p in accessor.loaded) == ["2022.json", "2023.json"]
+
+
+def test_interpolated_series_missing_from_partition(tmp_path):
+    # pmt 1 has no samples in february, its nearest sample is in january
+    docs = []
+    for month, pmts in [(1, [0, 1]), (2, [0]), (3, [0, 1])]:
+        for pmt in pmts:
+            doc = PmtAreaToPE(version="v1", detector="tpc", pmt=pmt,
+                              time=datetime.datetime(2022, month, 10, tzinfo=datetime.timezone.utc),
+                              value=float(10 * month + pmt))
+            docs.append(doc.pandas_dict())
+    df = pd.DataFrame(docs)
+    os.makedirs(tmp_path / "2022")
+    for month, group in df.groupby(df["time"].dt.month):
+        group.to_csv(tmp_path / "2022" / f"{month:02d}.csv", index=False)
+    template = str(tmp_path / "{time:%Y}" / "{time:%m}.csv")
+
+    time = datetime.datetime(2022, 3, 5, tzinfo=datetime.timezone.utc)
+    expected = DataAccessor(PmtAreaToPE, df.set_index(list(PmtAreaToPE.get_index_fields())))
+    expected_docs = expected.find_docs(time=time, version="v1")
+    assert sorted(d.pmt for d in expected_docs) == [0, 1]
+
+    accessor = LazyFileAccessor(PmtAreaToPE, template)
+    docs = accessor.find_docs(time=time, version="v1")
+    assert sorted((d.pmt, d.value) for d in docs) == sorted((d.pmt, d.value) for d in expected_docs)
+
+    # pruning assumes all series are in the adjacent partitions
+    pruned = LazyFileAccessor(PmtAreaToPE, template, prune_interpolated=True)
+    assert [d.pmt for d in pruned.find_docs(time=time, version="v1")] == [0]
+
+
+@pytest.mark.parametrize("pushdown", [True, False])
+def test_parquet_filter_pushdown(tmp_path, monkeypatch, pushdown):
+    monkeypatch.setattr(settings, "FILE_FILTER_PUSHDOWN", pushdown)
+    df = pmt_gains_df(200)
+    path = str(tmp_path / "gains.parquet")
+    # extra columns are not read
+    df.reset_index().assign(extra=1).to_parquet(path, row_group_size=20)
+
+    rows_read = []
+
+    def counting_read_files(*args, **kwargs):
+        records = read_files(*args, **kwargs)
+        rows_read.append(len(records))
+        return records
+
+    monkeypatch.setattr(xedocs.utils, "read_files", counting_read_files)
+
+    accessor = LazyFileAccessor(PmtAreaToPE, path)
+    expected = DataAccessor(PmtAreaToPE, df)
+    labels = dict(pmt=[1, 2], version="v1")
+    pd.testing.assert_frame_equal(accessor.find_df(**labels), expected.find_df(**labels))
+    assert accessor.find_docs(**labels) == expected.find_docs(**labels)
+    if pushdown:
+        assert not accessor.loaded
+        assert max(rows_read) < 40
+    else:
+        assert accessor.loaded
+        assert rows_read == [200]
+
+
+def test_parquet_filter_pushdown_cached(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "FILE_FILTER_PUSHDOWN", True)
+    df = pmt_gains_df(200)
+    path = str(tmp_path / "gains.parquet")
+    df.reset_index().to_parquet(path, row_group_size=20)
+
+    reads = []
+
+    def counting_read_files(*args, **kwargs):
+        reads.append(kwargs.get("filters", None))
+        return read_files(*args, **kwargs)
+
+    monkeypatch.setattr(xedocs.utils, "read_files", counting_read_files)
+
+    accessor = LazyFileAccessor(PmtAreaToPE, path)
+    expected = DataAccessor(PmtAreaToPE, df)
+    doc = expected.find_docs(pmt=3, version="v1")[0]
+    labels = dict(pmt=3, version="v1", time=doc.time)
+    assert accessor.find_one(**labels) == expected.find_one(**labels)
+    assert len(reads) == 1 and reads[0] is not None
+    assert accessor.find_one(**labels) == expected.find_one(**labels)
+    assert len(reads) == 1
+    assert not accessor.loaded
+
+    # other filters and modified files are read again
+    accessor.find_one(pmt=4, version="v1", time=doc.time)
+    assert len(reads) == 2
+    df.assign(value=df["value"] + 1).reset_index().to_parquet(path, row_group_size=20)
+    os.utime(path, ns=(0, 0))
+    assert accessor.find_one(**labels).value == doc.value + 1
+    assert len(reads) == 3
+
+
+def write_run_id_lifetimes(tmp_path, monkeypatch):
+    """A parquet file of electron lifetimes keyed by run_id instead of time"""
+    monkeypatch.setattr(type(settings), "run_id_to_time",
+                        lambda self, run_id: START + datetime.timedelta(days=int(run_id)))
+    path = str(tmp_path / "lifetimes.parquet")
+    pd.DataFrame(dict(version="v1", run_id=list(range(5)),
+                      value=[float(i) for i in range(5)])).to_parquet(path)
+    return path
+
+
+@pytest.mark.parametrize("pushdown", [True, False])
+def test_run_id_keyed_parquet(tmp_path, monkeypatch, pushdown):
+    from xedocs.schemas.corrections import ElectronLifetime
+
+    monkeypatch.setattr(settings, "FILE_FILTER_PUSHDOWN", pushdown)
+    path = write_run_id_lifetimes(tmp_path, monkeypatch)
+    accessor = LazyFileAccessor(ElectronLifetime, path)
+    docs = accessor.find_docs(version="v1")
+    assert sorted(d.value for d in docs) == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert docs[0].time == START
+
+
+@pytest.mark.parametrize("pushdown", [True, False])
+def test_run_id_keyed_projection(tmp_path, monkeypatch, pushdown):
+    from xedocs.schemas.corrections import ElectronLifetime
+
+    monkeypatch.setattr(settings, "FILE_FILTER_PUSHDOWN", pushdown)
+    path = write_run_id_lifetimes(tmp_path, monkeypatch)
+    accessor = LazyFileAccessor(ElectronLifetime, path)
+    assert "run_id" in accessor.query_fields(["value"])
+    records = xedocs.find_docs(ElectronLifetime, datasource={ElectronLifetime._ALIAS: accessor},
+                               fields=["value"], version="v1")
+    assert sorted(r.value for r in records) == [0.0, 1.0, 2.0, 3.0, 4.0]
+
+
+@pytest.mark.parametrize("ext", ["csv", "parquet", "pkl"])
+def test_columnar_file_loading(tmp_path, monkeypatch, ext):
+    df = pmt_gains_df(100).reset_index()
+    raw = df.copy()
+    raw.loc[3, "detector"] = "nveto"
+    raw.loc[5, "pmt"] = -1
+    path = str(tmp_path / f"gains.{ext}")
+    if ext == "pkl":
+        raw.to_pickle(path)
+    else:
+        getattr(raw, f"to_{ext}")(path, index=False)
+
+    accessor = LazyFileAccessor(PmtAreaToPE, path)
+
+    def validate_chunk(records):
+        raise AssertionError("records should be validated column-wise")
+
+    def table_to_records(table):
+        raise AssertionError("tables without run_id should not be converted to records")
+
+    accessor.validate_chunk = validate_chunk
+    monkeypatch.setattr("xedocs.columnar.table_to_records", table_to_records)
+    monkeypatch.setattr("xedocs.utils.table_to_records", table_to_records)
+    accessor.load_files()
+    assert len(accessor.storage) == len(df) - 2
+
+    expected = df.drop(index=[3, 5]).set_index(list(PmtAreaToPE.get_index_fields()))
+    expected = DataAccessor(PmtAreaToPE, expected)
+    pd.testing.assert_series_equal(accessor.find_df(version="v1")["value"].sort_index(),
+                                   expected.find_df(version="v1")["value"].sort_index())
+
+
+@pytest.mark.parametrize("ext", ["arrow", "feather"])
+def test_arrow_files(tmp_path, monkeypatch, ext):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.feather
+
+    def no_records(*args, **kwargs):
+        raise AssertionError("arrow tables should be validated column-wise")
+
+    monkeypatch.setattr("xedocs.columnar.table_to_records", no_records)
+    monkeypatch.setattr("xedocs.utils.table_to_records", no_records)
+    monkeypatch.setattr(LazyFileAccessor, "validate_chunk", no_records)
+
+    df = pmt_gains_df(100).sort_index()
+    table = pa.Table.from_pandas(df.reset_index(), preserve_index=False)
+    for part in range(2):
+        path = str(tmp_path / f"gains_{part}.{ext}")
+        rows = table.slice(part * 50, 50)
+        if ext == "arrow":
+            with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, rows.schema) as writer:
+                writer.write_table(rows)
+        else:
+            pyarrow.feather.write_feather(rows, path)
+
+    pattern = str(tmp_path / f"gains_*.{ext}")
+    records = read_files(pattern, columns=["pmt", "value"], filters=[("pmt", "in", [1])])
+    assert sorted(records[0]) == ["pmt", "value"]
+    assert {r["pmt"] for r in records} == {1}
+    assert len(records) == 10
+
+    expected = DataAccessor(PmtAreaToPE, df)
+    accessor = LazyFileAccessor(PmtAreaToPE, pattern)
+    pd.testing.assert_frame_equal(accessor.find_df(version="v1", pmt=[1, 2]),
+                                  expected.find_df(version="v1", pmt=[1, 2]))
+    assert accessor.find_docs(version="v1") == expected.find_docs(version="v1")
+
+    # the numeric columns of a single sorted file are not copied from the table
+    accessor = LazyFileAccessor(PmtAreaToPE, str(tmp_path / f"gains_0.{ext}"))
+    accessor.load_files()
+    assert not accessor.storage["value"].to_numpy().flags.writeable
+
+
+@pytest.mark.parametrize("ext", ["json", "jsonl", "ndjson"])
+def test_streamed_json_files(tmp_path, monkeypatch, ext):
+    monkeypatch.setattr(settings, "STREAM_BATCH_SIZE", 16)
+    df = pmt_gains_df(100)
+    docs = DataAccessor(PmtAreaToPE, df).find_docs()
+    path = tmp_path / f"gains.{ext}"
+    with open(path, "w") as f:
+        if ext == "json":
+            json.dump([doc.jsonable() for doc in docs], f)
+        else:
+            f.writelines(json.dumps(doc.jsonable()) + "\n" for doc in docs)
+
+    records = read_files(str(path), stream=True)
+    assert not isinstance(records, list)
+    assert len(list(records)) == len(docs)
+
+    accessor = LazyFileAccessor(PmtAreaToPE, str(path))
+    accessor.load_files()
+    assert sorted(accessor.find_docs(), key=lambda d: d.index_labels_tuple) == \
+        sorted(docs, key=lambda d: d.index_labels_tuple)
+
+
+@pytest.mark.parametrize("name", ["gains.csv.gz", "gains.json.gz", "gains.jsonl.bz2", "gains.csv.zst"])
+def test_compressed_files(tmp_path, name):
+    compression = split_compression(name)[1]
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    df = pmt_gains_df(100)
+    docs = DataAccessor(PmtAreaToPE, df).find_docs()
+    path = str(tmp_path / name)
+    with fsspec.open(path, "wt", compression=compression) as f:
+        if ".csv" in name:
+            df.reset_index().to_csv(f, index=False)
+        elif ".jsonl" in name:
+            f.writelines(json.dumps(doc.jsonable()) + "\n" for doc in docs)
+        else:
+            json.dump([doc.jsonable() for doc in docs], f)
+
+    assert len(read_files(path)) == len(docs)
+    accessor = LazyFileAccessor(PmtAreaToPE, path)
+    assert sorted(d.value for d in accessor.find_docs(version="v1", pmt=1)) == \
+        sorted(d.value for d in docs if d.version == "v1" and d.pmt == 1)
+
+
+def test_record_cache(tmp_path, monkeypatch, record_cache_dir):
+    df = pmt_gains_df(100)
+    pattern = write_pmt_files(tmp_path, df)
+    expected = LazyFileAccessor(PmtAreaToPE, pattern).find_df(version="v1")
+    cached = os.listdir(os.path.join(record_cache_dir, PmtAreaToPE.__name__))
+    assert len(cached) == 10
+
+    # a new accessor (e.g. in a new process) neither reads nor validates
+    def fail(*args, **kwargs):
+        raise AssertionError("cached file was read")
+
+    with monkeypatch.context() as m:
+        m.setattr("xedocs.utils.read_files", fail)
+        m.setattr(LazyFileAccessor, "validate_chunk", fail)
+        result = LazyFileAccessor(PmtAreaToPE, pattern).find_df(version="v1")
+    pd.testing.assert_frame_equal(result, expected)
+
+    # modified files are validated again
+    path = tmp_path / "pmt_1.csv"
+    modified = pd.read_csv(path)
+    modified["value"] = 42.0
+    modified.to_csv(path, index=False)
+    result = LazyFileAccessor(PmtAreaToPE, pattern).find_df(pmt=1, version="v1")
+    assert (result["value"] == 42.0).all()
+    assert len(os.listdir(os.path.join(record_cache_dir, PmtAreaToPE.__name__))) == 11
+
+    monkeypatch.setattr(settings, "RECORD_CACHE", False)
+    result = LazyFileAccessor(PmtAreaToPE, pattern).find_df(pmt=1, version="v1")
+    assert (result["value"] == 42.0).all()
+
+
+class Exploit:
+    def __reduce__(self):
+        return (os.system, ("touch exploited",))
+
+
+def test_record_cache_is_not_unpickled(tmp_path, monkeypatch, record_cache_dir):
+    import pickle
+    from xedocs.record_cache import RecordCache
+
+    cache = RecordCache(record_cache_dir)
+    df = pmt_gains_df(10)
+    cache.put(PmtAreaToPE, "key", df)
+    assert cache.path(PmtAreaToPE, "key").endswith(".parquet")
+    pd.testing.assert_frame_equal(cache.get(PmtAreaToPE, "key"), df)
+
+    # a planted pickle is discarded instead of executed
+    monkeypatch.chdir(tmp_path)
+    with open(cache.path(PmtAreaToPE, "key"), "wb") as f:
+        pickle.dump(Exploit(), f)
+    assert cache.get(PmtAreaToPE, "key") is None
+    assert not os.path.exists(tmp_path / "exploited")
+
+    # nested values would not round-trip
+    cache.put(PmtAreaToPE, "nested", df.assign(comments=[{"a": 1}] * len(df)))
+    assert cache.get(PmtAreaToPE, "nested") is None
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_compile_folder(tmp_path, fmt):
+    pytest.importorskip("pyarrow")
+    source = tmp_path / "source"
+    write_global_versions(source)
+    os.makedirs(source / "pmt_gains")
+    df = pmt_gains_df(100)
+    write_pmt_files(source / "pmt_gains", df)
+    with open(source / "datasets.yml", "w") as f:
+        yaml.safe_dump({
+            "global_versions": {"schema": GlobalVersion._ALIAS, "path": "global_versions/*.json"},
+            "pmt_gains": {"schema": PmtAreaToPE._ALIAS, "path": "pmt_gains/pmt_{pmt}.csv"},
+        }, f)
+
+    folder = DataFolder(root=str(source))
+    output = folder.compile(str(tmp_path / "compiled"), fmt=fmt)
+    with open(os.path.join(output, "datasets.yml")) as f:
+        config = yaml.safe_load(f)
+    assert config[PmtAreaToPE._ALIAS]["path"] == f"pmt_area_to_pes/version={{version}}/data.{fmt}"
+    assert (tmp_path / "compiled" / "pmt_area_to_pes" / "version=ONLINE" / f"data.{fmt}").exists()
+    assert (tmp_path / "compiled" / "global_versions" / "version=v1" / "time=2022" / f"data.{fmt}").exists()
+
+    compiled = xedocs.local_folder(output)
+    for alias, accessor in folder.get_datasets().items():
+        assert compiled[alias].manifest is not None
+        expected = accessor.find_df()
+        result = compiled[alias].find_df()
+        pd.testing.assert_frame_equal(result, expected, check_like=True)
+
+    # compiled files are sorted by the index fields
+    storage = compiled[PmtAreaToPE._ALIAS].storage
+    assert storage.index.is_monotonic_increasing
+
+    # queries only read the matching partitions
+    accessor = xedocs.local_folder(output)[GlobalVersion._ALIAS]
+    time = START + datetime.timedelta(days=150)
+    docs = accessor.find_docs(version="v1", time=time)
+    assert [doc.url for doc in docs] == ["url_1_2"]
+    assert len(accessor.loaded) <= 1
+
+
+def test_refresh_changed_files(tmp_path):
+    df = pmt_gains_df(100)
+    pattern = write_pmt_files(tmp_path, df)
+    accessor = LazyFileAccessor(PmtAreaToPE, pattern)
+    assert len(accessor.find_df(version="v1")) == len(df.xs("v1", level="version"))
+    assert accessor.refresh() == dict(added=[], modified=[], removed=[])
+
+    path = str(tmp_path / "pmt_1.csv")
+    modified = pd.read_csv(path)
+    modified["value"] = 42.0
+    modified.to_csv(path, index=False)
+    os.remove(tmp_path / "pmt_2.csv")
+    df.reset_index().query("pmt == 3").assign(pmt=10).to_csv(tmp_path / "pmt_10.csv", index=False)
+    # changes within the mtime resolution are still detected by size
+    os.utime(path, ns=(0, 0))
+
+    storage = accessor.storage
+    changes = accessor.refresh()
+    assert changes == dict(added=[str(tmp_path / "pmt_10.csv")], modified=[path],
+                           removed=[str(tmp_path / "pmt_2.csv")])
+    # the previous storage is left intact for ongoing queries
+    assert 2 in storage.index.get_level_values("pmt")
+    assert accessor.storage is not storage
+
+    result = accessor.find_df(version="v1")
+    pmts = set(result.index.get_level_values("pmt"))
+    assert 2 not in pmts and 10 in pmts
+    assert (result.xs(1, level="pmt")["value"] == 42.0).all()
+    assert (result.xs(3, level="pmt")["value"] != 42.0).all()
+    expected = LazyFileAccessor(PmtAreaToPE, pattern).find_df(version="v1")
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_watch_files(tmp_path):
+    df = pmt_gains_df(20)
+    pattern = write_pmt_files(tmp_path, df)
+    accessor = LazyFileAccessor(PmtAreaToPE, pattern)
+    accessor.find_df()
+    watcher = accessor.watch(interval=0.05)
+    try:
+        os.remove(tmp_path / "pmt_0.csv")
+        for _ in range(100):
+            if "pmt_0.csv" not in {os.path.basename(p) for p in accessor.loaded}:
+                break
+            watcher.stopped.wait(0.05)
+        assert 0 not in accessor.find_df().index.get_level_values("pmt")
+    finally:
+        accessor.unwatch()
+    assert accessor.watcher is None
+
+
+def test_memory_budget(tmp_path):
+    df = pmt_gains_df(200)
+    pattern = write_pmt_files(tmp_path, df)
+    unbounded = LazyFileAccessor(PmtAreaToPE, pattern)
+    unbounded.find_df()
+    usage = unbounded.memory_usage()
+    assert usage["files"] == 10 and usage["rows"] == 200
+    assert usage["bytes"] == sum(unbounded.file_sizes.values()) > 0
+
+    accessor = LazyFileAccessor(PmtAreaToPE, pattern)
+    accessor.find_df(pmt=0)
+    budget = int(3.5 * accessor.memory_usage()["bytes"])
+    accessor.memory_budget = budget
+    for pmt in range(1, 10):
+        accessor.find_df(pmt=pmt)
+    usage = accessor.memory_usage()
+    assert usage["files"] == 3 and usage["bytes"] <= budget
+    assert usage["evictions"] == 7
+    assert sorted(os.path.basename(p) for p in accessor.loaded) == ["pmt_7.csv", "pmt_8.csv", "pmt_9.csv"]
+    assert set(accessor.storage.index.get_level_values("pmt")) == {7, 8, 9}
+
+    # recently used files are kept, evicted files are read again
+    accessor.find_df(pmt=7)
+    result = accessor.find_df(pmt=1)
+    pd.testing.assert_frame_equal(result, unbounded.find_df(pmt=1))
+    assert sorted(os.path.basename(p) for p in accessor.loaded) == ["pmt_1.csv", "pmt_7.csv", "pmt_9.csv"]
+
+    # the files of the current query are never evicted
+    assert len(accessor.find_df()) == len(unbounded.find_df())
+    db = Database(pmts=accessor)
+    assert db.memory_usage()["pmts"]["files"] == 10
+
+
+def test_missing_pyarrow_names_extra(tmp_path, monkeypatch):
+    import sys
+    from xedocs.dispatchers import require_pyarrow
+
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    with pytest.raises(ImportError, match=r"xedocs\[arrow\]"):
+        require_pyarrow("Reading parquet files")
+    with pytest.raises(ImportError, match=r"xedocs\[arrow\]"):
+        read_files(str(tmp_path / "data.arrow"))
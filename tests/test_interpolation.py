@@ -0,0 +1,99 @@
+"""Tests for vectorized evaluation of time-sampled corrections."""
+import datetime
+
+import numpy as np
+import pytest
+import pandas as pd
+from rframe import DataAccessor
+
+import xedocs
+from xedocs.utils import Database
+from xedocs.schemas.corrections import PmtAreaToPE
+
+
+START = datetime.datetime(2022, 1, 1, tzinfo=datetime.timezone.utc)
+PMTS = [0, 1, 2]
+
+
+def sampled_database():
+    docs = []
+    for version in ["v1", "ONLINE"]:
+        for pmt in PMTS:
+            for day in range(0, 50, 10):
+                doc = PmtAreaToPE(version=version, detector="tpc", pmt=pmt,
+                                  time=START + datetime.timedelta(days=day),
+                                  value=100 * pmt + day ** 2)
+                docs.append(doc.pandas_dict())
+    df = pd.DataFrame(docs).set_index(list(PmtAreaToPE.get_index_fields()))
+    accessor = DataAccessor(PmtAreaToPE, df)
+    return Database({PmtAreaToPE._ALIAS: accessor})
+
+
+def query_times():
+    return [
+        START - datetime.timedelta(days=1),
+        START,
+        START + datetime.timedelta(days=15, hours=3),
+        START + datetime.timedelta(days=40),
+        START + datetime.timedelta(days=45),
+    ]
+
+
+def test_correction_matrix():
+    db = sampled_database()
+    times = query_times()
+    for version in ["v1", "ONLINE"]:
+        matrix = xedocs.correction_matrix(PmtAreaToPE, version, times, "tpc",
+                                          pmts=PMTS, datasource=db)
+        assert matrix.shape == (len(times), len(PMTS))
+        for i, time in enumerate(times):
+            for j, pmt in enumerate(PMTS):
+                doc = xedocs.find_one(PmtAreaToPE, datasource=db, version=version,
+                                      detector="tpc", pmt=pmt, time=time)
+                if doc is None:
+                    assert np.isnan(matrix[i, j])
+                else:
+                    assert np.isclose(matrix[i, j], doc.value)
+
+    # beyond the last sample only ONLINE versions are extrapolated
+    v1 = xedocs.correction_matrix(PmtAreaToPE, "v1", times[-1:], "tpc", datasource=db)
+    online = xedocs.correction_matrix(PmtAreaToPE, "ONLINE", times[-1:], "tpc", datasource=db)
+    assert np.isnan(v1).all()
+    assert np.allclose(online[0], [100 * pmt + 40 ** 2 for pmt in PMTS])
+
+
+def test_interpolate_samples():
+    from xedocs.interpolation import interpolate_samples
+
+    samples = np.array([10, 20, 30])
+    values = np.array([1.0, 2.0, 4.0])
+    times = np.array([5, 10, 15, 30, 35])
+    result = interpolate_samples(times, samples, values)
+    assert np.isnan(result[[0, 4]]).all()
+    assert np.allclose(result[1:4], [1.0, 1.5, 4.0])
+
+    result = interpolate_samples(times, samples, values, extrapolate=True)
+    assert result[-1] == 4.0
+
+    labels = interpolate_samples(times, samples, np.array(["a", "b", "c"], dtype=object))
+    assert list(labels) == [None, "a", "a", "c", None]
+
+
+def test_evaluate():
+    db = sampled_database()
+    df = db[PmtAreaToPE._ALIAS].storage
+    times = query_times()
+    times_ns = xedocs.interpolation.to_ns(times)
+    for version in ["v1", "ONLINE"]:
+        values = PmtAreaToPE.evaluate(times_ns, version, datasource=df, detector="tpc", pmt=1)
+        assert values.dtype == np.float64
+        for time, value in zip(times, values):
+            doc = xedocs.find_one(PmtAreaToPE, datasource=db, version=version,
+                                  detector="tpc", pmt=1, time=time)
+            if doc is None:
+                assert np.isnan(value)
+            else:
+                assert np.isclose(value, doc.value)
+
+    with pytest.raises(ValueError):
+        PmtAreaToPE.evaluate(times_ns, "v1", datasource=df, detector="tpc")
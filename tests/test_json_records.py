@@ -0,0 +1,42 @@
+"""Tests for reading JSON records."""
+import io
+import json
+
+import pytest
+
+from xedocs.json_records import iter_json_lines, iter_json_records
+
+
+DOCS = [{"a": i, "b": "x" * (i % 7), "c": [1.5, None]} for i in range(200)] + [12345, 1.5e-7, "s", None]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 64, 2**16])
+def test_iter_json_records(chunk_size):
+    raw = json.dumps(DOCS, indent=1)
+    assert list(iter_json_records(io.StringIO(raw), chunk_size=chunk_size)) == DOCS
+    assert list(iter_json_records(io.BytesIO(raw.encode()), chunk_size=chunk_size)) == DOCS
+
+    # TinyDB style tables are parsed whole
+    tinydb = {"_default": {"1": {"a": 1}, "2": {"a": 2}}}
+    data = io.BytesIO(json.dumps(tinydb).encode())
+    assert list(iter_json_records(data, chunk_size=chunk_size)) == [{"a": 1}, {"a": 2}]
+
+    assert list(iter_json_records(io.BytesIO(b" [ ] "), chunk_size=chunk_size)) == []
+    assert list(iter_json_records(io.BytesIO(b""), chunk_size=chunk_size)) == []
+    for invalid in [b"[1, 2", b"[1 x]"]:
+        with pytest.raises(ValueError):
+            list(iter_json_records(io.BytesIO(invalid), chunk_size=chunk_size))
+
+
+def test_iter_json_records_is_lazy():
+    raw = json.dumps(DOCS).encode()
+    f = io.BytesIO(raw)
+    records = iter_json_records(f, chunk_size=64)
+    assert next(records) == DOCS[0]
+    assert f.tell() < len(raw)
+
+
+def test_iter_json_lines():
+    raw = "\n".join(json.dumps(doc) for doc in DOCS) + "\n\n"
+    assert list(iter_json_lines(io.BytesIO(raw.encode()))) == DOCS
+    assert list(iter_json_lines(io.StringIO(raw))) == DOCS
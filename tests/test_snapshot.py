@@ -0,0 +1,94 @@
+"""Tests for in-memory snapshots of time-interval corrections."""
+import datetime
+
+import pandas as pd
+import pytest
+from rframe import DataAccessor
+
+import xedocs
+from xedocs.utils import Database
+from xedocs.schemas.corrections.implementations.global_versions import GlobalVersion
+
+
+def make_df(docs):
+    df = pd.DataFrame([doc.pandas_dict() for doc in docs])
+    return df.set_index(list(GlobalVersion.get_index_fields()))
+
+
+def interval_docs(version, config_name, boundaries, right=None):
+    docs = []
+    rights = boundaries[1:] + [right]
+    for i, (left, right) in enumerate(zip(boundaries, rights)):
+        docs.append(GlobalVersion(version=version, config_name=config_name,
+                                  url=f"{config_name}_{i}", time=(left, right)))
+    return docs
+
+
+def boundaries(n, start=datetime.datetime(2021, 1, 1), days=30):
+    return [start + datetime.timedelta(days=days * i) for i in range(n)]
+
+
+def query_times():
+    start = datetime.datetime(2020, 12, 1, 12)
+    return [start + datetime.timedelta(days=7 * i) for i in range(60)]
+
+
+def test_snapshot_lookups():
+    docs = interval_docs("v1", "a", boundaries(5)) + interval_docs("v1", "b", boundaries(3))
+    accessor = DataAccessor(GlobalVersion, make_df(docs))
+
+    snap = xedocs.snapshot(GlobalVersion, Database({GlobalVersion._ALIAS: accessor}), version="v1")
+    assert len(snap) == len(docs)
+    assert len(snap.groups) == 2
+
+    times = query_times()
+    for config_name in ["a", "b"]:
+        urls = snap.values(times, attr="url", config_name=config_name)
+        for time, url in zip(times, urls):
+            doc = accessor.find_one(version="v1", config_name=config_name, time=time)
+            expected = doc.url if doc is not None else None
+            assert url == expected
+            found = snap.find_one(time, config_name=config_name)
+            assert (found.url if found is not None else None) == expected
+
+    with pytest.raises(ValueError):
+        snap.values(times, attr="url")
+
+    # no matching series, missing values follow the field type
+    urls = snap.values(times, attr="url", config_name="missing")
+    assert urls.dtype == object and all(url is None for url in urls)
+    with pytest.raises(KeyError):
+        snap.values(times, attr="unknown", config_name="missing")
+
+
+def test_missing_values():
+    import numpy as np
+    from xedocs.schemas.corrections import PmtAreaToPE
+    from xedocs.snapshot import missing_values
+
+    values = missing_values(PmtAreaToPE, "value", 3)
+    assert values.dtype == np.float64 and np.isnan(values).all()
+    assert list(missing_values(PmtAreaToPE, "detector", 2)) == [None, None]
+
+
+def test_snapshot_refresh():
+    docs = interval_docs("v1", "a", boundaries(3))
+    accessor = DataAccessor(GlobalVersion, make_df(docs))
+    snap = xedocs.snapshot(GlobalVersion, Database({GlobalVersion._ALIAS: accessor}))
+    assert snap.refresh() == 0
+
+    # close the open interval in the future and append a new one
+    future = datetime.datetime.utcnow() + datetime.timedelta(days=365)
+    extended = interval_docs("v1", "a", boundaries(3) + [future])
+    accessor.storage = make_df(extended)
+    assert snap.refresh() == 2
+    assert len(snap) == 4
+    t = future + datetime.timedelta(days=1)
+    assert snap.find_one(t).url == "a_3"
+
+    # a new version covering the past triggers a full reload
+    accessor.storage = make_df(extended + interval_docs("v2", "a", boundaries(2)))
+    snap.refresh()
+    assert len(snap) == 6
+    urls = snap.values(query_times(), attr="url", version="v2")
+    assert set(urls) == {None, "a_0", "a_1"}
@@ -0,0 +1,92 @@
+"""Tests for batched streaming of query results."""
+import threading
+
+import pytest
+from rframe import DataAccessor
+
+import xedocs
+from xedocs.utils import ColumnarDataAccessor, Database
+from xedocs.streaming import batched, prefetch
+from xedocs.schemas.corrections import PmtAreaToPE
+
+from .test_columnar import pmt_gains_df
+
+
+def test_batched():
+    assert list(batched(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert list(batched([], 3)) == []
+    with pytest.raises(ValueError):
+        list(batched(range(3), 0))
+
+
+def test_prefetch():
+    produced = []
+
+    def produce():
+        for i in range(100):
+            produced.append(i)
+            yield i
+
+    assert list(prefetch(produce(), depth=2)) == list(range(100))
+
+    def failing():
+        yield 1
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        list(prefetch(failing()))
+
+    # closing the consumer stops the producer
+    produced.clear()
+    items = prefetch(produce(), depth=1)
+    assert next(items) == 0
+    items.close()
+    threads = [t for t in threading.enumerate() if t.name == "xedocs-prefetch"]
+    for thread in threads:
+        thread.join(timeout=5)
+    assert len(produced) < 100
+
+
+def test_find_iter_batches():
+    df = pmt_gains_df()
+    expected = DataAccessor(PmtAreaToPE, df).find_docs(version="v1")
+    db = Database({PmtAreaToPE._ALIAS: ColumnarDataAccessor(PmtAreaToPE, df)})
+    for batch_size in [1, 7, 1000]:
+        for prefetch_next in [True, False]:
+            docs = list(xedocs.find_iter(PmtAreaToPE, datasource=db, version="v1",
+                                         batch_size=batch_size, prefetch=prefetch_next))
+            assert docs == expected
+
+
+def test_find_iter_batches_plain_accessor():
+    df = pmt_gains_df()
+    accessor = DataAccessor(PmtAreaToPE, df)
+    expected = accessor.find_docs(version="v1")
+
+    consumed = []
+    find_iter = accessor.find_iter
+
+    def spy(**labels):
+        for doc in find_iter(**labels):
+            consumed.append(threading.current_thread().name)
+            yield doc
+
+    accessor.find_iter = spy
+    db = Database({PmtAreaToPE._ALIAS: accessor})
+
+    docs = xedocs.find_iter(PmtAreaToPE, datasource=db, version="v1", batch_size=5, prefetch=False)
+    first = next(docs)
+    # a whole batch is fetched before the first document is returned
+    assert len(consumed) == 5
+    rest = [next(docs) for _ in range(4)]
+    assert len(consumed) == 5
+    assert [first] + rest == expected[:5]
+
+    consumed.clear()
+    docs = list(xedocs.find_iter(PmtAreaToPE, datasource=db, version="v1", batch_size=7))
+    assert docs == expected
+    assert set(consumed) == {"xedocs-prefetch"}
+
+    records = list(xedocs.find_iter(PmtAreaToPE, datasource=db, version="v1",
+                                    batch_size=3, prefetch=False, fields=["value"]))
+    assert [r.value for r in records] == [d.value for d in expected]
@@ -43,3 +43,156 @@ def test_command_line_interface():
     """Test the CLI."""
     runner = CliRunner()
     result = runner.invoke(cli.main)
+
+
+def test_lazy_database():
+    from xedocs.utils import LazyDatabase
+
+    calls = []
+
+    def factory():
+        calls.append(1)
+        return object()
+
+    db = LazyDatabase({"some_schema": factory})
+    assert "some_schema" in db
+    assert not db.is_built("some_schema")
+    first = db["some_schema"]
+    assert db["some_schema"] is first
+    assert db.some_schema is first
+    assert len(calls) == 1
+
+
+def test_database_registry():
+    from xedocs.registry import DatabaseRegistry
+
+    calls = []
+
+    def some_db(**kwargs):
+        calls.append(kwargs)
+        return dict(kwargs)
+
+    registry = DatabaseRegistry()
+    db = registry.get(some_db, path="a")
+    assert registry.get(some_db, path="a") is db
+    assert registry.get(some_db, path="b") is not db
+    assert len(calls) == 2
+
+    registry.invalidate(some_db, path="a")
+    assert registry.get(some_db, path="a") is not db
+    assert len(calls) == 3
+
+    registry.invalidate(some_db)
+    assert some_db not in registry
+
+
+def test_database_registry_concurrent_builds():
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from xedocs.registry import DatabaseRegistry
+
+    calls = []
+    b_started = threading.Event()
+
+    def some_db(path):
+        calls.append(path)
+        if path == "a":
+            # waits for a build of another key, which would
+            # deadlock if builds held the registry lock
+            assert b_started.wait(timeout=5)
+        else:
+            b_started.set()
+        return dict(path=path)
+
+    registry = DatabaseRegistry()
+    with ThreadPoolExecutor(4) as pool:
+        a = [pool.submit(registry.get, some_db, path="a") for _ in range(2)]
+        b = pool.submit(registry.get, some_db, path="b")
+        dbs = [f.result(timeout=10) for f in a]
+        assert b.result(timeout=10) == dict(path="b")
+    assert dbs[0] is dbs[1]
+    assert sorted(calls) == ["a", "b"]
+    assert len(registry) == 2
+
+
+class FakeRunsCollection:
+    """Minimal stand-in for the runs collection"""
+
+    def __init__(self, docs):
+        self.docs = {doc["number"]: doc for doc in docs}
+        self.queries = []
+
+    def project(self, doc, projection):
+        return {k: v for k, v in doc.items() if k in projection}
+
+    def find(self, query, projection=None):
+        self.queries.append(query)
+        numbers = query["number"]["$in"]
+        return [self.project(self.docs[n], projection) for n in numbers if n in self.docs]
+
+    def find_one(self, query, projection=None):
+        self.queries.append(query)
+        doc = self.docs.get(query["number"], None)
+        return None if doc is None else self.project(doc, projection)
+
+
+def test_prefetch_run_docs(monkeypatch):
+    import datetime
+    from xedocs.lru import LRUCache
+    from xedocs._settings import Settings
+
+    start = datetime.datetime(2022, 1, 1)
+    runs = FakeRunsCollection(
+        [dict(number=number,
+              start=start + datetime.timedelta(hours=number),
+              end=start + datetime.timedelta(hours=number, minutes=30))
+         for number in range(10)]
+    )
+    monkeypatch.setattr(Settings, "xent_collection", lambda self, *args, **kwargs: runs)
+    monkeypatch.setattr(Settings, "_RUNDOC_CACHE", LRUCache(max_entries=100))
+
+    settings = xedocs.settings
+    docs = settings.prefetch_run_docs(["000001", 2, 3, 100])
+    assert sorted(docs) == [1, 2, 3]
+    assert len(runs.queries) == 1
+
+    times = settings.run_ids_to_times([1, 2, 3])
+    assert len(runs.queries) == 1
+    assert times[0] == settings.run_id_to_time(1)
+
+    intervals = settings.run_ids_to_intervals([4, 5])
+    assert len(runs.queries) == 2
+    assert intervals[1] == settings.run_id_to_interval("5")
+
+
+def test_run_doc_cache(monkeypatch):
+    import datetime
+    from xedocs.lru import LRUCache
+    from xedocs._settings import Settings
+
+    start = datetime.datetime(2022, 1, 1)
+    runs = FakeRunsCollection([dict(number=1, start=start, end=start + datetime.timedelta(hours=1)),
+                               dict(number=2, start=start)])
+    monkeypatch.setattr(Settings, "xent_collection", lambda self, *args, **kwargs: runs)
+    monkeypatch.setattr(Settings, "_RUNDOC_CACHE", LRUCache())
+
+    settings = xedocs.settings
+    monkeypatch.setattr(settings, "RUNDOC_ONGOING_TTL", -1)
+    # the size is read when the cache is used
+    monkeypatch.setattr(settings, "RUNDOC_CACHE_SIZE", 1)
+
+    settings.run_doc(1)
+    settings.run_doc(1)
+    assert len(runs.queries) == 1
+
+    # ongoing runs expire
+    settings.run_doc(2)
+    settings.run_doc(2)
+    assert len(runs.queries) == 3
+
+    # cache is bounded
+    settings.run_doc(1)
+    assert len(runs.queries) == 4
+    stats = settings.run_doc_cache_stats()
+    assert stats["entries"] == 1
+    assert stats["hits"] == 1
@@ -15,6 +15,8 @@ from . import utils
 from . import schemas
 from . import data_locations
 from . import databases
+from .registry import db_registry
+from .cache import query_cache
 from .xedocs import *
 from .databases import *
 
@@ -1,9 +1,11 @@
 import os
 import appdirs
 import logging
+import numpy as np
 import pandas as pd
 from rframe.types import TimeInterval
 
+from .lru import LRUCache
 from .xenon_config import XenonConfig
 
 logger = logging.getLogger(__name__)
@@ -24,41 +26,122 @@ class Settings(BaseSettings):
         env_file_encoding = "utf-8"
 
     _DATABASE_INTERFACE_CLASSES = {}
-    _RUNDOC_CACHE = {}
+    _RUNDOC_CACHE = LRUCache(max_entries=10_000)
     _MONGO_CLIENTS = {}
 
     CONFIG_DIR = dirs.user_config_dir
     DATA_DIR = dirs.user_data_dir
     DEFAULT_DATABASE = "straxen_db"
     GITHUB_TOKEN: str = None
-    
+
+    QUERY_CACHE: bool = False
+    QUERY_CACHE_MAX_ENTRIES: int = 10_000
+    QUERY_CACHE_MAX_BYTES: int = None
+    QUERY_CACHE_TTL: float = 60.0
+
+    RUNDOC_CACHE_SIZE: int = 10_000
+    # run documents of ongoing runs (no end time) expire after this many seconds
+    RUNDOC_ONGOING_TTL: float = 60.0
+
+    # number of documents fetched and validated at a time by find_iter
+    STREAM_BATCH_SIZE: int = 1000
+
+    # number of threads used to read data folder files
+    FILE_LOAD_THREADS: int = 8
+
+    # read only the rows matching the query from files that support
+    # filters (parquet) instead of loading and caching the whole file
+    FILE_FILTER_PUSHDOWN: bool = True
+
+    # seconds until cached data folder listings are refreshed,
+    # local listings are also refreshed when a directory changes
+    LISTING_CACHE_TTL: float = 60.0
+
+    # keep validated records of data files on disk, keyed by file
+    # content and schema version, defaults to DATA_DIR/record_cache
+    RECORD_CACHE: bool = True
+    RECORD_CACHE_DIR: str = None
+
+    # bytes of loaded rows kept per data folder dataset before the
+    # least recently used files are evicted, None keeps all rows
+    FILE_MEMORY_BUDGET: int = None
+
     xenon_config: XenonConfig = XenonConfig()
 
     clock = SimpleClock()        
 
+    def run_doc_cache(self) -> LRUCache:
+        """The run document cache, sized by the current RUNDOC_CACHE_SIZE"""
+        cache = self._RUNDOC_CACHE
+        if cache.max_entries != self.RUNDOC_CACHE_SIZE:
+            cache.max_entries = self.RUNDOC_CACHE_SIZE
+            cache.evict()
+        return cache
+
+    def cache_run_doc(self, key, doc):
+        # ongoing runs will get an end time, dont keep them forever
+        ttl = None if doc.get("end", None) is not None else self.RUNDOC_ONGOING_TTL
+        self.run_doc_cache().set(key, doc, ttl=ttl)
+
+    def run_doc_cache_stats(self):
+        return self.run_doc_cache().stats()
+
+    def clear_run_doc_cache(self):
+        self._RUNDOC_CACHE.clear()
+
     def run_doc(self, run_id, fields=("start", "end")):
+        if isinstance(run_id, str):
+            run_id = int(run_id)
+
         key = (run_id,) + tuple(fields)
         
-        if key in self._RUNDOC_CACHE:
-            return self._RUNDOC_CACHE[key]
+        doc = self.run_doc_cache().get(key)
+        if doc is not None:
+            return doc
         
         rundb = self.xent_collection()
 
-        if isinstance(run_id, str):
-            run_id = int(run_id)
-
         query = {"number": run_id}
 
         doc = rundb.find_one(query, projection={f: 1 for f in fields})
         if not doc:
             raise KeyError(f"Run {run_id} not found.")
         
-        self._RUNDOC_CACHE[key] = doc
+        self.cache_run_doc(key, doc)
 
         return doc
 
-    def run_id_to_time(self, run_id):
-        doc = self.run_doc(run_id)
+    def prefetch_run_docs(self, run_ids, fields=("start", "end")):
+        """Fetch the run documents of many runs with a single query
+        and add them to the run document cache.
+
+        Returns a dictionary of run number to run document,
+        runs that were not found are omitted.
+        """
+        run_ids = [int(run_id) for run_id in run_ids]
+        fields = tuple(fields)
+
+        cache = self.run_doc_cache()
+        docs = {}
+        for run_id in run_ids:
+            doc = cache.get((run_id,) + fields)
+            if doc is not None:
+                docs[run_id] = doc
+
+        missing = sorted(set(run_ids) - set(docs))
+        if missing:
+            rundb = self.xent_collection()
+            projection = {f: 1 for f in fields}
+            projection["number"] = 1
+            query = {"number": {"$in": missing}}
+            for doc in rundb.find(query, projection=projection):
+                number = doc["number"] if "number" in fields else doc.pop("number")
+                self.cache_run_doc((number,) + fields, doc)
+                docs[number] = doc
+
+        return docs
+
+    def run_doc_to_time(self, doc):
         start = doc["start"]
         end = doc.get("end", None)
     
@@ -69,10 +152,8 @@ class Settings(BaseSettings):
             time = start + (end - start) / 2
     
         return self.clock.normalize_tz(time)
-    
-    
-    def run_id_to_interval(self, run_id):
-        doc = self.run_doc(run_id)
+
+    def run_doc_to_interval(self, doc):
         start = self.clock.normalize_tz(doc["start"] + pd.Timedelta("1s"))
     
         end_raw = doc.get("end", None)
@@ -84,6 +165,40 @@ class Settings(BaseSettings):
     
         return TimeInterval(left=start, right=end)
 
+    def run_id_to_time(self, run_id):
+        doc = self.run_doc(run_id)
+        return self.run_doc_to_time(doc)
+    
+    def run_id_to_interval(self, run_id):
+        doc = self.run_doc(run_id)
+        return self.run_doc_to_interval(doc)
+
+    def run_ids_to_times(self, run_ids):
+        """Array version of `run_id_to_time`,
+        fetches all run documents with a single query.
+        """
+        docs = self.prefetch_run_docs(run_ids)
+        times = np.empty(len(run_ids), dtype=object)
+        for i, run_id in enumerate(run_ids):
+            if int(run_id) in docs:
+                times[i] = self.run_doc_to_time(docs[int(run_id)])
+            else:
+                times[i] = self.run_id_to_time(run_id)
+        return times
+
+    def run_ids_to_intervals(self, run_ids):
+        """Array version of `run_id_to_interval`,
+        fetches all run documents with a single query.
+        """
+        docs = self.prefetch_run_docs(run_ids)
+        intervals = np.empty(len(run_ids), dtype=object)
+        for i, run_id in enumerate(run_ids):
+            if int(run_id) in docs:
+                intervals[i] = self.run_doc_to_interval(docs[int(run_id)])
+            else:
+                intervals[i] = self.run_id_to_interval(run_id)
+        return intervals
+
     def extract_time(self, kwargs):
         if "time" in kwargs:
             time = kwargs.pop("time")
@@ -5,22 +5,15 @@ import straxen
 
 import xedocs
 
-DB_CACHE = {}
 
 def get_accessor(name, db=None, **kwargs):
     if db is None:
         db = "straxen_db"
-    db_func = getattr(xedocs.databases, db)
     db_kwargs = {k[4:] : v for k,v in kwargs.items() if k.startswith("db__")}
-    db_key = (db, )
-    if len(db_kwargs):
-        db_key = db_key + tuple(sorted(db_kwargs.items()))
-    if db_key not in DB_CACHE:
-        DB_CACHE[db_key] = db_func(**db_kwargs)
-    db = DB_CACHE[db_key]
-    if name not in db:
-        raise KeyError(f"{db_key} database has no such collection: {name}")
-    return db[name]
+    database = xedocs.db_registry.get(db, **db_kwargs)
+    if name not in database:
+        raise KeyError(f"{db} database has no such collection: {name}")
+    return database[name]
 
 
 @straxen.URLConfig.register("xedocs")
@@ -0,0 +1,229 @@
+"""In-memory caches used to avoid repeated database round-trips."""
+
+import weakref
+import datetime
+
+import pandas as pd
+
+from typing import Optional
+
+from rframe.types import Interval
+
+from ._settings import settings
+from .lru import LRUCache
+from .registry import freeze
+from .schemas.corrections import BaseCorrectionSchema
+
+
+MISSING = object()
+
+
+def latest_time(label):
+    """Returns the latest datetime referenced by a time label"""
+    if label is None:
+        return None
+    if isinstance(label, (list, tuple)):
+        times = [latest_time(v) for v in label]
+        if any(t is None for t in times):
+            return None
+        return max(times) if times else None
+    if isinstance(label, slice):
+        return latest_time(label.stop)
+    if isinstance(label, Interval):
+        return latest_time(label.right)
+    if isinstance(label, dict):
+        return latest_time(label.get("right", None))
+    if isinstance(label, (str, datetime.datetime, pd.Timestamp)):
+        return settings.clock.normalize_tz(label)
+    return None
+
+
+def normalize_label(label):
+    """Normalize a label value so equivalent queries share a key"""
+    if isinstance(label, (datetime.datetime, pd.Timestamp)):
+        return settings.clock.normalize_tz(label)
+    if isinstance(label, Interval):
+        return (normalize_label(label.left), normalize_label(label.right))
+    if isinstance(label, slice):
+        return ("slice", normalize_label(label.start),
+                normalize_label(label.stop), label.step)
+    if isinstance(label, (list, tuple, set)):
+        values = [normalize_label(v) for v in label]
+        try:
+            values = sorted(set(values))
+        except TypeError:
+            pass
+        return tuple(freeze(v) for v in values)
+    if isinstance(label, dict):
+        return freeze({k: normalize_label(v) for k, v in label.items()})
+    return freeze(label)
+
+
+def normalize_labels(schema, **labels):
+    """Normalize query labels to a hashable, order independent key"""
+    normalized = {}
+    for name, label in labels.items():
+        if label is None:
+            continue
+        if name == "sort":
+            # order of sort fields is significant
+            normalized[name] = freeze(label)
+            continue
+        if name == "run_id":
+            try:
+                label = int(label)
+            except (TypeError, ValueError):
+                pass
+        elif isinstance(label, str) and name in schema.__fields__:
+            if schema.__fields__[name].type_ is datetime.datetime:
+                label = settings.clock.normalize_tz(label)
+        normalized[name] = normalize_label(label)
+    return tuple(sorted(normalized.items()))
+
+
+def query_time(**labels):
+    """The latest time a query depends on, or None
+    if it cannot be determined.
+    """
+    if labels.get("time", None) is not None:
+        return latest_time(labels["time"])
+    if labels.get("run_id", None) is not None:
+        run_ids = labels["run_id"]
+        if not isinstance(run_ids, (list, tuple)):
+            run_ids = [run_ids]
+        ends = []
+        for run_id in run_ids:
+            try:
+                end = settings.run_doc(run_id).get("end", None)
+            except Exception:
+                return None
+            if end is None:
+                # ongoing run
+                return None
+            ends.append(settings.clock.normalize_tz(end))
+        return max(ends) if ends else None
+    return None
+
+
+def is_pinned(label) -> bool:
+    """Whether a label selects a single value"""
+    if label is None:
+        return False
+    return not isinstance(label, (list, tuple, set, slice, dict, Interval))
+
+
+def is_immutable_result(schema, result, buffer=300.0, **labels):
+    """Whether the result of a query can no longer change.
+
+    Corrections are append-only and values before the cutoff
+    time (see `settings.clock.cutoff_datetime`) are frozen, so
+    non-empty correction results for times at least `buffer` seconds
+    before the cutoff are immutable, as long as every other index
+    label is pinned to a single value. Otherwise e.g. a new version
+    or a new pmt would still change the result.
+    """
+    if not issubclass(schema, BaseCorrectionSchema):
+        return False
+
+    # new documents may still be inserted for empty results
+    if not result:
+        return False
+
+    for name in schema.get_index_fields():
+        if name == "time":
+            continue
+        if not is_pinned(labels.get(name, None)):
+            return False
+
+    dt = query_time(**labels)
+    if dt is None:
+        return False
+
+    return not settings.clock.after_cutoff(dt, buffer=-buffer)
+
+
+class setting_default:
+    """Attribute that reads a setting unless it was set explicitly"""
+
+    def __init__(self, setting: str):
+        self.setting = setting
+
+    def __set_name__(self, owner, name):
+        self.name = "_" + name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        value = obj.__dict__.get(self.name, MISSING)
+        if value is MISSING:
+            return getattr(settings, self.setting)
+        return value
+
+    def __set__(self, obj, value):
+        obj.__dict__[self.name] = value
+
+
+class QueryCache(LRUCache):
+    """Cache of query results for xedocs accessors.
+
+    Immutable results (see `is_immutable_result`) are cached
+    indefinitely, all other results expire after `ttl` seconds.
+    Entries are evicted in least-recently-used order once `max_entries`
+    or `max_bytes` is exceeded. Bounds that are not passed explicitly
+    follow the current `settings.QUERY_CACHE_*` values.
+    """
+
+    max_entries = setting_default("QUERY_CACHE_MAX_ENTRIES")
+    max_bytes = setting_default("QUERY_CACHE_MAX_BYTES")
+    ttl = setting_default("QUERY_CACHE_TTL")
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = MISSING,
+        max_bytes: Optional[int] = MISSING,
+        ttl: float = MISSING,
+        cutoff_buffer: float = 300.0,
+    ):
+        super().__init__(max_entries=max_entries, max_bytes=max_bytes)
+        self.ttl = ttl
+        self.cutoff_buffer = cutoff_buffer
+
+    def make_key(self, accessor, method, **labels):
+        labels = normalize_labels(accessor.schema, **labels)
+        return (id(accessor), method, labels)
+
+    def ttl_for(self, schema, result, **labels) -> Optional[float]:
+        """Returns the time-to-live of a query result,
+        None means the result never expires.
+        """
+        if is_immutable_result(schema, result, buffer=self.cutoff_buffer, **labels):
+            return None
+        return self.ttl
+
+    def cached_query(self, accessor, method, **labels):
+        key = self.make_key(accessor, method, **labels)
+        cached = self.get(key, MISSING)
+        if cached is not MISSING:
+            ref, result = cached
+            if ref() is accessor:
+                return result
+            self.pop(key)
+
+        result = getattr(accessor, method)(**labels)
+        ttl = self.ttl_for(accessor.schema, result, **labels)
+        size = self.sizeof(result) if self.max_bytes is not None else 0
+        self.set(key, (weakref.ref(accessor), result), ttl=ttl, size=size)
+        return result
+
+    def find_docs(self, accessor, **labels):
+        docs = self.cached_query(accessor, "find_docs", **labels)
+        return [doc.copy(deep=True) for doc in docs]
+
+    def find_one(self, accessor, **labels):
+        doc = self.cached_query(accessor, "find_one", **labels)
+        if doc is None:
+            return None
+        return doc.copy(deep=True)
+
+
+query_cache = QueryCache()
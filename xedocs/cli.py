@@ -48,8 +48,10 @@ def main():
     ),
 )
 @click.argument("name")
+@click.option("batch_size", "--batch-size", "-b", default=None, type=int,
+              help="Number of documents to fetch at a time")
 @click.pass_context
-def cli_find(ctx, name: str):
+def cli_find(ctx, name: str, batch_size: int = None):
     console = Console()
     kwargs = dict([item.strip("--").split("=") for item in ctx.args])
     kwargs = {k: v.split(",") if "," in v else v for k, v in kwargs.items()}
@@ -78,7 +80,7 @@ def cli_find(ctx, name: str):
     with console.status(
         f"[bold green]Looking for {name} documents that match your query..."
     ) as status:
-        docs = schema.find_iter(**kwargs)
+        docs = xedocs.find_iter(schema, batch_size=batch_size, **kwargs)
 
     with Live(table, refresh_per_second=4):
 
@@ -128,5 +130,41 @@ def cli_download(ctx, name: str, path: str = None):
     console.print(f"Data saved to {fpath}")
 
 
+@main.command(name="manifest")
+@click.argument("path")
+@click.option("output", "--output", "-o", default=None,
+              help="Path to write the manifest to, defaults to <path>/manifest.json")
+def cli_manifest(path: str, output: str = None):
+    """Write the file manifest of a local data folder."""
+    from xedocs.data_locations.data_folder import DataFolder
+    from xedocs.manifest import write_manifest
+
+    console = Console()
+    folder = DataFolder(root=path)
+
+    with console.status(f"[bold green]Summarizing the files in {folder.root}"):
+        output = write_manifest(folder, path=output)
+
+    console.print(f"Manifest saved to {output}")
+
+
+@main.command(name="compile")
+@click.argument("path")
+@click.argument("output")
+@click.option("fmt", "--format", "-f", default="parquet",
+              type=click.Choice(["parquet", "arrow"]), help="File format to write")
+def cli_compile(path: str, output: str, fmt: str = "parquet"):
+    """Compile a local data folder into sorted, partitioned columnar files."""
+    from xedocs.data_locations.data_folder import DataFolder
+
+    console = Console()
+    folder = DataFolder(root=path)
+
+    with console.status(f"[bold green]Compiling the datasets in {folder.root}"):
+        output = folder.compile(output, fmt=fmt)
+
+    console.print(f"Compiled data folder saved to {output}")
+
+
 if __name__ == "__main__":
     sys.exit(main())  # pragma: no cover
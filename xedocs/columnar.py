@@ -0,0 +1,565 @@
+"""Build DataFrames directly from raw records.
+
+Validating every record into a pydantic model and converting it back
+with `pandas_dict()` dominates the cost of `find_df` for large
+collections. Here records are validated one column at a time instead:
+numeric columns are checked with numpy and all other columns are
+validated once per unique value. The resulting frame is identical to
+the one built from validated documents.
+
+Projected queries (only some fields requested) are returned as
+lightweight namedtuple records built the same way.
+"""
+
+import inspect
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from collections import namedtuple
+from functools import lru_cache, partial
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, ConstrainedFloat, ConstrainedInt
+from pydantic.fields import SHAPE_SINGLETON
+from rframe.interfaces.pandas import to_pandas
+from rframe.types import Interval
+
+from .registry import freeze
+
+
+MISSING = object()
+
+# keys of raw records consumed by the schema pre root
+# validators, e.g. run_id labels that are converted to times
+PRE_ROOT_VALIDATOR_KEYS = ("run_id",)
+
+
+class Unsupported(Exception):
+    """Raised when records can not be converted column-wise"""
+
+
+def uses_values(validator) -> bool:
+    func = getattr(validator.func, "__func__", validator.func)
+    try:
+        return "values" in inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        return True
+
+
+def is_columnar_field(field) -> bool:
+    """Whether a field can be validated independently of other fields
+    and is stored in a single (non-nested) column.
+    """
+    type_ = field.type_
+    if isinstance(type_, type):
+        if issubclass(type_, BaseModel) and not issubclass(type_, Interval):
+            return False
+        if issubclass(type_, dict):
+            return False
+    if field.shape != SHAPE_SINGLETON and field.sub_fields and not all(
+        is_columnar_field(f) for f in field.sub_fields
+    ):
+        return False
+    return not any(uses_values(v) for v in field.class_validators.values())
+
+
+def supports_columnar(schema) -> bool:
+    if schema.__post_root_validators__:
+        return False
+    return all(is_columnar_field(field) for field in schema.__fields__.values())
+
+
+def numeric_bounds_mask(type_, arr) -> np.ndarray:
+    """Mask of values violating the bounds of a constrained number type"""
+    invalid = np.zeros(len(arr), dtype=bool)
+    if getattr(type_, "gt", None) is not None:
+        invalid |= ~(arr > type_.gt)
+    if getattr(type_, "ge", None) is not None:
+        invalid |= ~(arr >= type_.ge)
+    if getattr(type_, "lt", None) is not None:
+        invalid |= ~(arr < type_.lt)
+    if getattr(type_, "le", None) is not None:
+        invalid |= ~(arr <= type_.le)
+    return invalid
+
+
+def fast_numeric_column(field, values: list):
+    """Validate a plain numeric column with numpy.
+
+    Returns the validated array and invalid mask or None
+    if the column does not qualify.
+    """
+    type_ = field.type_
+    if field.class_validators or field.shape != SHAPE_SINGLETON:
+        return None
+    if type_ is float or (isinstance(type_, type) and issubclass(type_, ConstrainedFloat)):
+        kind = "f"
+    elif type_ is int or (isinstance(type_, type) and issubclass(type_, ConstrainedInt)):
+        kind = "i"
+    else:
+        return None
+    if getattr(type_, "strict", False) or getattr(type_, "multiple_of", None) is not None:
+        return None
+    if getattr(type_, "allow_inf_nan", None) is False:
+        return None
+
+    try:
+        arr = np.asarray(values)
+    except (TypeError, ValueError):
+        return None
+    if arr.dtype.kind not in "iuf":
+        return None
+
+    # arrays of the right type are not copied
+    if kind == "f":
+        arr = arr.astype(np.float64, copy=False)
+    elif arr.dtype.kind == "f":
+        if not np.isfinite(arr).all():
+            return None
+        arr = arr.astype(np.int64)
+    else:
+        arr = arr.astype(np.int64, copy=False)
+
+    return arr, numeric_bounds_mask(type_, arr)
+
+
+def pandas_value(value):
+    if isinstance(value, datetime.datetime):
+        # equivalent to `to_pandas` but skips the dispatch
+        return pd.Timestamp(value)
+    return to_pandas(value)
+
+
+def validate_column(schema, name, field, values: list, validate=True,
+                    convert=pandas_value, rows: List[dict] = None):
+    """Validate the values of a single field.
+
+    Each unique value is validated and converted (by default to its
+    pandas representation) only once. Fields with validators that
+    depend on other fields are validated per value, with the already
+    validated values of each row passed in `rows`.
+
+    Returns:
+        Tuple[Union[list, np.ndarray], np.ndarray]: the converted values and
+            a boolean mask of invalid values.
+    """
+    n = len(values)
+    invalid = np.zeros(n, dtype=bool)
+    per_row = rows is not None and any(uses_values(v) for v in field.class_validators.values())
+
+    missing = {i for i, v in enumerate(values) if v is MISSING}
+    if missing:
+        values = list(values)
+        for i in missing:
+            if field.required:
+                invalid[i] = True
+                values[i] = None
+            else:
+                values[i] = field.get_default()
+    elif validate and convert is pandas_value:
+        fast = fast_numeric_column(field, values)
+        if fast is not None:
+            return fast
+
+    if not validate:
+        return [convert(v) for v in values], invalid
+
+    converted = {}
+    result = [None] * n
+    for i, value in enumerate(values):
+        if invalid[i]:
+            continue
+        if i in missing:
+            # defaults are not validated
+            result[i] = convert(value)
+            continue
+        if per_row:
+            validated, error = field.validate(value, dict(rows[i]), loc=name, cls=schema)
+            if error:
+                invalid[i] = True
+            else:
+                result[i] = convert(validated)
+            continue
+        try:
+            key = (type(value), value)
+            hash(key)
+        except TypeError:
+            key = (type(value), freeze(value))
+        if key not in converted:
+            validated, error = field.validate(value, {}, loc=name, cls=schema)
+            if error:
+                converted[key] = MISSING
+            else:
+                if convert is pandas_value and isinstance(validated, dict):
+                    # nested values are flattened into multiple columns
+                    raise Unsupported(name)
+                converted[key] = convert(validated)
+        value = converted[key]
+        if value is MISSING:
+            invalid[i] = True
+        else:
+            result[i] = value
+    return result, invalid
+
+
+def record_value(record: dict, keys: List[str]):
+    for key in keys:
+        if key in record:
+            return record[key]
+    return MISSING
+
+
+def apply_pre_root_validators(schema, record: dict) -> Optional[dict]:
+    """Returns the record after the schema pre root validators
+    or None if any of them fails.
+    """
+    values = dict(record)
+    for validator in schema.__pre_root_validators__:
+        try:
+            values = validator(schema, values)
+        except (ValueError, TypeError, AssertionError):
+            return None
+    return values
+
+
+def field_keys(schema, name: str) -> List[str]:
+    """The record keys a field may be stored under"""
+    field = schema.__fields__[name]
+    keys = [field.alias]
+    if name != field.alias and getattr(schema.__config__, "allow_population_by_field_name", False):
+        keys.append(name)
+    return keys
+
+
+def projection_fields(schema, fields=None) -> List[str]:
+    """Schema fields to read for a projection, the index
+    fields are always included to identify documents.
+    """
+    if fields is None:
+        return list(schema.__fields__)
+    if isinstance(fields, str):
+        fields = [fields]
+    unknown = [name for name in fields if name not in schema.__fields__]
+    if unknown:
+        raise KeyError(f"{schema.__name__} has no fields named {unknown}.")
+    index_fields = list(schema.get_index_fields())
+    return [name for name in schema.__fields__ if name in fields or name in index_fields]
+
+
+def source_keys(schema, fields=None) -> List[str]:
+    """The record keys to read for a projection, including the
+    keys consumed by the schema pre root validators.
+    """
+    keys = []
+    for name in projection_fields(schema, fields):
+        keys.extend(field_keys(schema, name))
+    if schema.__pre_root_validators__:
+        keys.extend(key for key in PRE_ROOT_VALIDATOR_KEYS if key not in keys)
+    return keys
+
+
+def validate_columns(schema, records: List[dict], fields: List[str],
+                     validate=True, convert=pandas_value):
+    """Validate the given fields of raw records column by column.
+
+    Returns:
+        Tuple[List[dict], Dict[str, list], np.ndarray]: the records after the pre
+            root validators, validated values per field and a mask of invalid records.
+    """
+    records = [r for r in records if isinstance(r, dict)]
+    if schema.__pre_root_validators__:
+        # e.g. converting run_id labels to times
+        records = [r for r in map(partial(apply_pre_root_validators, schema), records)
+                   if r is not None]
+
+    columns: Dict[str, list] = {}
+    invalid = np.zeros(len(records), dtype=bool)
+    rows = None
+    if convert is not pandas_value and any(
+        uses_values(v) for name in fields for v in schema.__fields__[name].class_validators.values()
+    ):
+        rows = [dict() for _ in records]
+
+    for name in fields:
+        field = schema.__fields__[name]
+        keys = field_keys(schema, name)
+        values = [record_value(r, keys) for r in records]
+        columns[name], bad = validate_column(schema, name, field, values, validate=validate,
+                                             convert=convert, rows=rows)
+        invalid |= bad
+        if rows is not None:
+            for row, value in zip(rows, columns[name]):
+                row[name] = value
+    return records, columns, invalid
+
+
+def drop_rows(columns: Dict[str, list], invalid: np.ndarray) -> Dict[str, list]:
+    if not invalid.any():
+        return columns
+    keep = ~invalid
+    return {
+        name: (values[keep] if isinstance(values, np.ndarray)
+               else [v for v, k in zip(values, keep) if k])
+        for name, values in columns.items()
+    }
+
+
+def columns_to_dataframe(schema, columns: Dict[str, list], invalid: np.ndarray,
+                         fields: List[str]) -> pd.DataFrame:
+    """Build the indexed frame of validated columns, dropping invalid
+    rows and rows with duplicate index labels (the first one is kept).
+    """
+    index_fields = [name for name in schema.get_index_fields() if name in fields]
+    df = pd.DataFrame(drop_rows(columns, invalid), columns=fields, copy=False)
+    # the index is built from the columns instead of with `set_index`,
+    # which would copy the (possibly memory mapped) value columns
+    if len(index_fields) == 1:
+        index = pd.Index(df[index_fields[0]])
+    else:
+        index = pd.MultiIndex.from_frame(df[index_fields])
+    df = pd.DataFrame({name: df[name].array for name in fields if name not in index_fields},
+                      index=index, copy=False)
+    duplicated = index.duplicated()
+    if duplicated.any():
+        df = df[~duplicated]
+    return df
+
+
+def empty_dataframe(schema, fields: List[str]) -> pd.DataFrame:
+    index_fields = [name for name in schema.get_index_fields() if name in fields]
+    index = index_fields[0] if len(index_fields) == 1 else index_fields
+    return pd.DataFrame().reindex(columns=fields).set_index(index)
+
+
+def records_to_dataframe(schema, records: List[dict], validate=True,
+                         fields: List[str] = None) -> Optional[pd.DataFrame]:
+    """Convert raw records to a DataFrame indexed by the schema index fields.
+
+    Invalid records are dropped, as are records with duplicate index
+    labels (the first one is kept).
+
+    Args:
+        schema (XeDoc): the schema of the records.
+        records (List[dict]): raw records, e.g. from a database cursor.
+        validate (bool, optional): validate values against the schema. Defaults to True.
+        fields (List[str], optional): only read these fields (and the index fields).
+
+    Returns:
+        Optional[DataFrame]: the frame or None if the schema or records require
+            validating whole documents, in that case use `find_df` on the documents.
+    """
+    fields = projection_fields(schema, fields)
+
+    if not supports_columnar(schema):
+        return None
+
+    records = [r for r in records if isinstance(r, dict)]
+    if not records:
+        return empty_dataframe(schema, fields)
+
+    try:
+        _, columns, invalid = validate_columns(schema, records, fields, validate=validate)
+    except Unsupported:
+        return None
+
+    return columns_to_dataframe(schema, columns, invalid, fields)
+
+
+def is_arrow(table) -> bool:
+    return hasattr(table, "to_pandas") and not isinstance(table, (pd.DataFrame, pd.Series))
+
+
+def table_column(table, keys: List[str]):
+    """The first of `keys` that is a column of the table, None if none is"""
+    names = table_column_names(table)
+    for key in keys:
+        if key in names:
+            return table.column(key) if is_arrow(table) else table[key]
+    return None
+
+
+def numeric_array(column) -> Optional[np.ndarray]:
+    """The values of a numeric column as a numpy array, None for other
+    columns. Arrow columns without nulls are not copied, e.g. columns
+    of memory mapped files keep referencing the page cache.
+    """
+    if is_arrow(column):
+        import pyarrow as pa
+
+        if not (pa.types.is_integer(column.type) or pa.types.is_floating(column.type)):
+            return None
+        if column.num_chunks == 1:
+            return column.chunk(0).to_numpy(zero_copy_only=False)
+        return column.to_numpy()
+    if column.dtype.kind in "iuf":
+        return column.to_numpy()
+    return None
+
+
+def unique_codes(column):
+    """The codes and unique values of a column, the
+    unique values are converted to python or pandas scalars.
+    """
+    if is_arrow(column):
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        try:
+            uniques = pc.unique(column)
+            codes = pc.index_in(column, value_set=uniques).to_numpy(zero_copy_only=False)
+            return codes, uniques.to_pandas().tolist()
+        except (pa.ArrowNotImplementedError, pa.ArrowInvalid, pa.ArrowTypeError):
+            # e.g. struct columns
+            column = column.to_pandas()
+    try:
+        codes, uniques = pd.factorize(column, use_na_sentinel=False)
+    except TypeError:
+        # unhashable values e.g. dicts
+        return np.arange(len(column)), column.tolist()
+    return codes, list(uniques)
+
+
+def take_values(values, codes: np.ndarray) -> np.ndarray:
+    """Expand the values of the unique codes to all rows"""
+    if not isinstance(values, np.ndarray):
+        array = np.empty(len(values), dtype=object)
+        for i, value in enumerate(values):
+            array[i] = value
+        values = array
+    return values[codes]
+
+
+def validate_table_column(schema, name: str, field, column, validate=True):
+    """Validate a table column without converting each row to a
+    python object: numeric columns are validated as numpy arrays,
+    other columns once per unique value.
+    """
+    values = numeric_array(column)
+    if values is not None and validate:
+        fast = fast_numeric_column(field, values)
+        if fast is not None:
+            return fast
+    codes, uniques = unique_codes(column)
+    result, invalid = validate_column(schema, name, field, uniques, validate=validate)
+    return take_values(result, codes), invalid[codes]
+
+
+def table_column_names(table) -> List[str]:
+    if is_arrow(table):
+        return list(table.column_names)
+    return list(table.columns)
+
+
+def table_records(table, n=None) -> List[dict]:
+    if is_arrow(table):
+        rows = table if n is None else table.slice(0, n)
+        return rows.to_pylist()
+    rows = table if n is None else table.iloc[:n]
+    return rows.to_dict(orient="records")
+
+
+def needs_pre_root_validators(schema, table) -> bool:
+    """Whether the schema pre root validators change the records
+    of a table, e.g. a `run_id` column converted to times. Tables
+    without such columns are validated column-wise.
+    """
+    if not schema.__pre_root_validators__ or not len(table):
+        return False
+    if "run_id" in table_column_names(table):
+        return True
+    # the validators must leave other records unchanged
+    first = table_records(table, 1)[0]
+    return apply_pre_root_validators(schema, first) != first
+
+
+def table_to_records(table) -> List[dict]:
+    """The raw records of a pandas DataFrame or pyarrow Table"""
+    if hasattr(table, "to_pandas"):
+        table = table.to_pandas()
+    return table.to_dict(orient="records")
+
+
+def table_to_dataframe(schema, table, validate=True,
+                       fields: List[str] = None) -> Optional[pd.DataFrame]:
+    """Same as `records_to_dataframe` for a table of raw records,
+    e.g. a pandas DataFrame or pyarrow Table read from a file.
+    The columns are validated without building a dict per record,
+    arrow columns are read directly without converting the table.
+    """
+    if needs_pre_root_validators(schema, table):
+        # the validators operate on whole records
+        return records_to_dataframe(schema, table_to_records(table),
+                                    validate=validate, fields=fields)
+
+    fields = projection_fields(schema, fields)
+
+    if not supports_columnar(schema):
+        return None
+
+    if not len(table):
+        return empty_dataframe(schema, fields)
+
+    columns: Dict[str, list] = {}
+    invalid = np.zeros(len(table), dtype=bool)
+    try:
+        for name in fields:
+            field = schema.__fields__[name]
+            column = table_column(table, field_keys(schema, name))
+            if column is None:
+                values = [MISSING] * len(table)
+                columns[name], bad = validate_column(schema, name, field, values,
+                                                     validate=validate)
+            else:
+                columns[name], bad = validate_table_column(schema, name, field, column,
+                                                           validate=validate)
+            invalid |= bad
+    except Unsupported:
+        return None
+
+    return columns_to_dataframe(schema, columns, invalid, fields)
+
+
+@lru_cache(maxsize=None)
+def record_type(schema, fields: Tuple[str, ...]):
+    """A namedtuple type for projected documents of a schema"""
+    return namedtuple(f"{schema.__name__}Record", fields)
+
+
+def docs_to_records(schema, docs, fields: List[str]) -> list:
+    """Project documents to namedtuple records"""
+    if isinstance(fields, str):
+        fields = [fields]
+    factory = record_type(schema, tuple(fields))
+    return [factory(*(getattr(doc, name) for name in fields)) for doc in docs]
+
+
+def records_to_tuples(schema, records: List[dict], fields: List[str],
+                      seen: set = None, validate=True) -> list:
+    """Validate the projected fields of raw records into namedtuples.
+
+    Records with invalid values and duplicate index labels
+    (tracked in `seen`) are skipped.
+    """
+    if isinstance(fields, str):
+        fields = [fields]
+    fields = tuple(fields)
+    read = projection_fields(schema, fields)
+    if seen is None:
+        seen = set()
+
+    records, columns, invalid = validate_columns(schema, records, read, validate=validate,
+                                                 convert=lambda v: v)
+    index_fields = list(schema.get_index_fields())
+    factory = record_type(schema, fields)
+    result = []
+    for i in range(len(records)):
+        if invalid[i]:
+            continue
+        key = tuple(freeze(columns[name][i]) for name in index_fields)
+        if key in seen:
+            continue
+        seen.add(key)
+        result.append(factory(*(columns[name][i] for name in fields)))
+    return result
@@ -0,0 +1,229 @@
+"""Compile data folders into read optimized snapshots.
+
+A compiled folder holds the validated documents of every dataset of
+a data folder as parquet (or Arrow IPC) files sorted by the index
+fields and partitioned by version and by the year of time intervals,
+next to a manifest and a `datasets.yml`, so it can be loaded like any
+other data folder e.g. with `local_folder()`.
+"""
+
+import os
+import re
+import json
+import datetime
+import logging
+
+import pandas as pd
+import yaml
+
+from typing import Dict, List, Optional
+
+from rframe import Index, IntervalIndex
+from rframe.types import TimeInterval
+
+from .dispatchers import require_pyarrow
+from .manifest import MANIFEST_VERSION, file_checksum, label_summary
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("parquet", "arrow")
+
+# labels that can not be written to and parsed back from a path
+UNSAFE_LABEL = re.compile(r"[\\/{}=:*?\[\]]|^\.|^$")
+
+
+def default_partitions(schema) -> List[str]:
+    """Partition by version and by the start of time intervals"""
+    fields = []
+    for name in schema.get_index_fields():
+        index = schema.index_for(name)
+        if isinstance(index, IntervalIndex):
+            if issubclass(schema.__fields__[name].type_, TimeInterval):
+                fields.append(name)
+        elif type(index) is Index and name == "version":
+            fields.append(name)
+    return fields
+
+
+def is_time_partition(schema, name: str) -> bool:
+    return isinstance(schema.index_for(name), IntervalIndex)
+
+
+def partition_labels(schema, df: pd.DataFrame, fields: List[str]) -> pd.DataFrame:
+    """The path labels of each row, time intervals are
+    partitioned by the year of their start.
+    """
+    index = df.index.to_frame(index=False)
+    labels = {}
+    for name in fields:
+        if is_time_partition(schema, name):
+            labels[name] = pd.IntervalIndex(index[name]).left.strftime("%Y")
+        else:
+            labels[name] = index[name].astype(str).values
+    return pd.DataFrame(labels)
+
+
+def safe_partitions(schema, df: pd.DataFrame, fields: List[str]) -> List[str]:
+    """The partition fields whose labels can be used in paths"""
+    index = df.index.to_frame(index=False)
+    safe = []
+    for name in fields:
+        if name not in index.columns:
+            continue
+        values = index[name]
+        if values.isna().any():
+            logger.warning(f"Not partitioning {schema.__name__} by {name}, missing labels.")
+            continue
+        if not is_time_partition(schema, name):
+            if any(UNSAFE_LABEL.search(str(v)) for v in pd.unique(values)):
+                logger.warning(f"Not partitioning {schema.__name__} by {name}, "
+                               "labels are not valid path names.")
+                continue
+        safe.append(name)
+    return safe
+
+
+def partition_template(alias: str, schema, fields: List[str], fmt: str) -> str:
+    """The relative path template of the files of a dataset
+    e.g. `pmt_gains/version={version}/time={time:%Y}/data.parquet`
+    """
+    parts = [alias]
+    for name in fields:
+        if is_time_partition(schema, name):
+            parts.append(f"{name}={{{name}:%Y}}")
+        else:
+            parts.append(f"{name}={{{name}}}")
+    parts.append(f"data.{fmt}")
+    return "/".join(parts)
+
+
+def to_arrow_table(df: pd.DataFrame):
+    """Convert a validated frame to an arrow table, interval
+    columns are stored as structs of their left and right bounds.
+    """
+    import pyarrow as pa
+
+    df = df.reset_index()
+    columns = {}
+    for name in df.columns:
+        values = df[name]
+        if isinstance(values.dtype, pd.IntervalDtype):
+            intervals = pd.IntervalIndex(values)
+            columns[name] = pa.StructArray.from_arrays(
+                [pa.array(intervals.left), pa.array(intervals.right)],
+                names=["left", "right"])
+        else:
+            columns[name] = pa.array(values, from_pandas=True)
+    return pa.table(columns)
+
+
+def write_table(table, path: str, fmt: str):
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        pq.write_table(table, path)
+    else:
+        import pyarrow.feather
+
+        # uncompressed files are memory mapped when read
+        pyarrow.feather.write_feather(table, path, compression="uncompressed")
+
+
+def compile_dataset(accessor, alias: str, output: str, fmt: str = "parquet",
+                    partition_by: Optional[List[str]] = None):
+    """Write the validated documents of a dataset accessor.
+    Returns the path template and the manifest entries of the written files.
+    """
+    schema = accessor.schema
+    index_fields = list(schema.get_index_fields())
+    accessor.load_files()
+    df = accessor.storage
+    if len(df):
+        df = df.sort_values(index_fields, kind="mergesort")
+
+    if partition_by is None:
+        partition_by = default_partitions(schema)
+    fields = safe_partitions(schema, df, [f for f in partition_by if f in index_fields])
+    template = partition_template(alias, schema, fields, fmt)
+
+    files = {}
+    if fields:
+        labels = partition_labels(schema, df, fields)
+        groups = labels.groupby(fields, sort=True).indices
+    else:
+        groups = {(): range(len(df))} if len(df) else {}
+    for key, rows in groups.items():
+        if not isinstance(key, tuple):
+            key = (key,)
+        part = df.iloc[sorted(rows)]
+        rel_path = template
+        for name, label in zip(fields, key):
+            pattern = f"{{{name}:%Y}}" if is_time_partition(schema, name) else f"{{{name}}}"
+            rel_path = rel_path.replace(pattern, label)
+        path = os.path.join(output, *rel_path.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_table(to_arrow_table(part), path, fmt)
+        with open(path, "rb") as f:
+            checksum = file_checksum(f)
+        files[rel_path] = dict(size=os.path.getsize(path), checksum=checksum,
+                               mtime_ns=os.stat(path).st_mtime_ns,
+                               rows=len(part), **label_summary(schema, part))
+    return template, files
+
+
+def compiled_files(output: str) -> set:
+    """The files listed in the manifest of a compiled folder"""
+    path = os.path.join(output, "manifest.json")
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        manifest = json.load(f)
+    return {p for dataset in manifest.get("datasets", {}).values()
+            for p in dataset.get("files", {})}
+
+
+def compile_folder(folder, output: str, fmt: str = "parquet",
+                   partition_by: Optional[Dict[str, List[str]]] = None) -> str:
+    """Validate all datasets of a data folder once and write them to
+    `output` as sorted, partitioned parquet or arrow files together
+    with a manifest and a datasets.yml. Returns the output path.
+
+    :param partition_by: partition fields per dataset, by default
+        datasets are partitioned by version and the year of time intervals.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt}, supported formats are {FORMATS}")
+    require_pyarrow("Compiling data folders")
+    if partition_by is None:
+        partition_by = {}
+
+    output = os.path.abspath(os.path.expanduser(output))
+    if folder.root is not None and output == os.path.abspath(folder.abs_path(".")):
+        raise ValueError("Can not compile a data folder into itself.")
+    os.makedirs(output, exist_ok=True)
+    previous = compiled_files(output)
+
+    config = {}
+    datasets = {}
+    for alias, accessor in folder.get_datasets().items():
+        template, files = compile_dataset(accessor, alias, output, fmt=fmt,
+                                          partition_by=partition_by.get(alias, None))
+        config[alias] = {"schema": alias, "path": template}
+        datasets[alias] = dict(schema=accessor.schema.__name__, files=files)
+
+    # files of an earlier compilation would still match the templates
+    written = {p for dataset in datasets.values() for p in dataset["files"]}
+    for rel_path in previous - written:
+        try:
+            os.remove(os.path.join(output, *rel_path.split("/")))
+        except OSError:
+            pass
+
+    manifest = dict(version=MANIFEST_VERSION,
+                    created=datetime.datetime.utcnow().isoformat(),
+                    datasets=datasets)
+    with open(os.path.join(output, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=1)
+    with open(os.path.join(output, "datasets.yml"), "w") as f:
+        yaml.safe_dump(config, f)
+    return output
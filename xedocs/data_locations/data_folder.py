@@ -16,6 +16,13 @@ class DataFolder(BaseSettings):
     root: str = None
     protocol: str = "file"
     config_path: str = "datasets.yml"
+    manifest_path: str = "manifest.json"
+    use_manifest: bool = True
+    # seconds between polls of local files for changes, None disables
+    watch_interval: float = None
+    # only read the partitions next to interpolated times, requires
+    # every partition to hold samples of all interpolated series
+    prune_interpolated: bool = False
 
     @validator("root", pre=True)
     def expand_user(cls, value):
@@ -34,30 +41,76 @@ class DataFolder(BaseSettings):
             path = os.path.join(self.root, path)
         return path
 
+    def rel_path(self, path):
+        """Path of a listed file relative to the folder root"""
+        if self.root is None:
+            return path
+        return os.path.relpath(path, self.root)
+
+    def listing_path(self, path):
+        """Inverse of `rel_path`"""
+        if self.root is None:
+            return path
+        return os.path.normpath(os.path.join(self.root, path))
+
     @property
     def datasets_config(self):
         return self.read_config()
 
-    def get_datasets(self):
+    def get_schemas(self):
         import xedocs
 
-        dsets = {}
+        schemas = {}
         for _, cfg in self.datasets_config.items():
             schema = cfg.get('schema', None)
-            if schema is None:
+            if schema is None or cfg.get('path', None) is None:
                 continue
             schema = xedocs.find_schema(schema)
-            path = cfg.get('path', None)
-            if path is None:
-                continue
+            schemas[schema._ALIAS] = (schema, cfg['path'])
+        return schemas
+
+    def read_manifest(self, schemas):
+        from ..manifest import read_manifest
+
+        path = self.abs_path(self.manifest_path)
+        return read_manifest(path, schemas,
+                             to_listing_path=self.listing_path,
+                             local=self.protocol == "file",
+                             **self.storage_kwargs(path))
+
+    def get_datasets(self, use_manifest=None):
+        if use_manifest is None:
+            use_manifest = self.use_manifest
+
+        schemas = self.get_schemas()
+        manifests = None
+        if use_manifest:
+            manifests = self.read_manifest({k: v[0] for k, v in schemas.items()})
+        if manifests is None:
+            manifests = {}
+
+        dsets = {}
+        for alias, (schema, path) in schemas.items():
             path = self.abs_path(path)
 
             kwargs = self.storage_kwargs(path)
-            dsets[schema._ALIAS] = LazyFileAccessor(schema,
-                                                    path, 
-                                                    **kwargs)
+            dsets[alias] = LazyFileAccessor(schema,
+                                            path,
+                                            manifest=manifests.get(alias, None),
+                                            prune_interpolated=self.prune_interpolated,
+                                            **kwargs)
+            if self.watch_interval is not None and self.protocol == "file":
+                dsets[alias].watch(self.watch_interval)
         return Database(dsets)
 
+    def compile(self, output: str, fmt: str = "parquet", partition_by=None) -> str:
+        """Write a compiled, read optimized copy of the
+        folder to `output`, see `xedocs.compiled.compile_folder`.
+        """
+        from ..compiled import compile_folder
+
+        return compile_folder(self, output, fmt=fmt, partition_by=partition_by)
+
     def read_config(self):
         path = self.abs_path(self.config_path)
         kwargs = self.storage_kwargs(path)
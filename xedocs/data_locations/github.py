@@ -82,6 +82,12 @@ class GithubRepo(DataFolder):
             return [self.abs_path(p) for p in path]
         return f"github://{path.lstrip('/')}"
 
+    def rel_path(self, path):
+        return path.lstrip('/')
+
+    def listing_path(self, path):
+        return path.lstrip('/')
+
     def storage_kwargs(self, path):
         return {
             "org": self.org,
@@ -1,7 +1,11 @@
 import os
+from functools import partial
 from typing import Any, Dict
 from pydantic import BaseSettings
-from rframe import DataAccessor
+
+from ..cache import is_immutable_result, normalize_labels
+from ..utils import ColumnarDataAccessor, LazyDatabase
+from .query_store import QueryStore
 
 
 def xenon_config_source(settings: BaseSettings) -> Dict[str, Any]:
@@ -28,8 +32,149 @@ def xenon_config_source(settings: BaseSettings) -> Dict[str, Any]:
     return data
 
 
+def needs_reduce(query) -> bool:
+    """Whether the query results must be post-processed
+    as a whole, e.g. to interpolate between documents.
+    """
+    from rframe.indexes import InterpolatingIndex
+
+    indexes = getattr(query.index, "indexes", [query.index])
+    return any(
+        isinstance(index, InterpolatingIndex) and query.labels.get(index.name, None) is not None
+        for index in indexes
+    )
+
+
+def stream_aggregation(query, batch_size: int, skip=None, limit=None, sort=None):
+    """Iterate over the results of a mongo aggregation query,
+    fetching `batch_size` documents per round-trip.
+
+    Equivalent to `query.iter` for queries that do not need
+    to be reduced, without loading all results at once.
+    """
+    from rframe.interfaces.mongo import from_mongo
+
+    pipeline = list(query.pipeline)
+    if sort is None:
+        sort = query.index.names
+    sort = [sort] if isinstance(sort, str) else sort
+    if isinstance(sort, list):
+        sort = {field: 1 for field in sort}
+    elif not isinstance(sort, dict):
+        raise TypeError(f"sort must be a list or dict, got {type(sort)}.")
+    pipeline.append({"$sort": sort})
+    if isinstance(skip, int):
+        pipeline.append({"$skip": skip * query.docs_per_label})
+    if isinstance(limit, int):
+        pipeline.append({"$limit": int(limit * query.docs_per_label)})
+    pipeline.append({"$project": {"_id": 0}})
+
+    cursor = query.collection.aggregate(pipeline, allowDiskUse=query.allow_disk_use,
+                                        batchSize=batch_size)
+    with cursor:
+        for collected, doc in enumerate(cursor, 1):
+            yield from_mongo(doc)
+            if limit is not None and collected >= limit:
+                return
+
+
+class MongoAccessor(ColumnarDataAccessor):
+    """DataAccessor for a mongodb collection with an optional
+    persistent cache of immutable query results.
+
+    In offline mode queries are only served from the cache.
+    """
+
+    store: QueryStore = None
+    offline: bool = False
+
+    def __init__(self, schema, datasource, store=None, offline=False):
+        self.store = store
+        self.offline = offline
+        if offline and store is None:
+            raise ValueError("Offline mode requires a query store.")
+        super().__init__(schema, datasource)
+
+    @property
+    def collection_name(self):
+        return self.storage.full_name
+
+    def check_online(self):
+        if self.offline:
+            raise RuntimeError(
+                f"Cannot query {self.collection_name} in offline mode, "
+                "only cached find queries are available."
+            )
+
+    def _find(self, skip=None, limit=None, sort=None, **labels):
+        if self.store is None:
+            yield from super()._find(skip=skip, limit=limit, sort=sort, **labels)
+            return
+
+        labels = {k: v for k, v in labels.items() if v is not None}
+        key_labels = normalize_labels(self.schema, skip=skip, limit=limit, sort=sort, **labels)
+        key = self.store.key(self.collection_name, key_labels)
+        docs = self.store.get(key)
+        if docs is None:
+            if self.offline:
+                raise KeyError(
+                    f"No cached results for {self.collection_name} query {labels} "
+                    "and offline mode is enabled."
+                )
+            docs = list(super()._find(skip=skip, limit=limit, sort=sort, **labels))
+            if is_immutable_result(self.schema, docs, **labels):
+                self.store.set(key, self.collection_name, docs)
+        yield from docs
+
+    def iter_records(self, skip=None, limit=None, sort=None, batch_size=None, fields=None, **labels):
+        if self.store is not None:
+            # cached results are stored as validated records
+            return self._find(skip=skip, limit=limit, sort=sort, **labels)
+
+        from rframe.interfaces.mongo import MongoAggregation
+
+        labels = {k: v for k, v in labels.items() if v is not None}
+        query = self.schema.compile_query(datasource=self.storage, **labels)
+        if not isinstance(query, MongoAggregation):
+            return query.iter(limit=limit, skip=skip, sort=sort)
+
+        # only read the fields used by the schema or the requested projection
+        projection = {"$project": {name: 1 for name in self.query_fields(fields)}}
+        query.pipeline = list(query.pipeline) + [projection]
+
+        if batch_size is None or needs_reduce(query):
+            return query.iter(limit=limit, skip=skip, sort=sort)
+
+        return stream_aggregation(query, batch_size, skip=skip, limit=limit, sort=sort)
+
+    def _min(self, **kwargs):
+        self.check_online()
+        return super()._min(**kwargs)
+
+    def _max(self, **kwargs):
+        self.check_online()
+        return super()._max(**kwargs)
+
+    def _count(self, **kwargs):
+        self.check_online()
+        return super()._count(**kwargs)
+
+    def _unique(self, **kwargs):
+        self.check_online()
+        return super()._unique(**kwargs)
+
+    def insert(self, docs, raise_on_error=True, dry=False):
+        self.check_online()
+        return super().insert(docs, raise_on_error=raise_on_error, dry=dry)
+
+    def delete(self, docs, raise_on_error=True):
+        self.check_online()
+        return super().delete(docs, raise_on_error=raise_on_error)
+
+
 class MongoDB(BaseSettings):
     CLIENT_CACHE = {}
+    STORE_CACHE = {}
 
     class Config:
         env_prefix = "xedocs_mongo_"
@@ -63,6 +208,13 @@ class MongoDB(BaseSettings):
     connect_timeout: int = 60000
     read_preference: str = "secondaryPreferred"
 
+    # persistent local cache of immutable query results
+    persistent_cache: bool = False
+    cache_path: str = None
+    cache_max_entries: int = 100_000
+    cache_max_age: float = None
+    offline: bool = False
+
     @property
     def client(self):
         if self.connection_uri is None:
@@ -71,6 +223,26 @@ class MongoDB(BaseSettings):
             self.CLIENT_CACHE[self.connection_uri] = self.make_client(self.connection_uri)
         return self.CLIENT_CACHE[self.connection_uri]
 
+    @property
+    def query_store(self):
+        path = self.cache_path
+        if path is None:
+            from xedocs import settings
+            path = os.path.join(settings.DATA_DIR, "query_cache.sqlite")
+        if path not in self.STORE_CACHE:
+            self.STORE_CACHE[path] = QueryStore(path)
+        store = self.STORE_CACHE[path]
+        store.max_entries = self.cache_max_entries
+        store.max_age = self.cache_max_age
+        return store
+
+    def clear_query_cache(self, schema=None):
+        """Remove the locally cached query results, of a single schema if given"""
+        collection = None
+        if schema is not None:
+            collection = f"{self.db_name}.{schema._ALIAS}"
+        self.query_store.clear(collection)
+
     def make_client(self, connection_uri):
         import pymongo
         return pymongo.MongoClient(connection_uri, 
@@ -81,7 +253,13 @@ class MongoDB(BaseSettings):
 
     @classmethod
     def from_utilix(cls, **kwargs):
-        from utilix import uconfig
+        try:
+            from utilix import uconfig
+        except ImportError:
+            if kwargs.get("offline", False):
+                # credentials are not needed in offline mode
+                return cls(**kwargs)
+            raise
         host = uconfig.get('RunDB', 'xent_url')
         username = uconfig.get('RunDB', 'xent_user')
         password = uconfig.get('RunDB', 'xent_password')
@@ -93,4 +271,18 @@ class MongoDB(BaseSettings):
 
     def data_accessor(self, schema):
         datasource = self.client[self.db_name][schema._ALIAS]
-        return DataAccessor(schema, datasource)
+        store = None
+        if self.persistent_cache or self.offline:
+            store = self.query_store
+        return MongoAccessor(schema, datasource, store=store, offline=self.offline)
+
+    def get_datasets(self, schemas=None):
+        """Returns a Database with an accessor for each schema,
+        accessors are only created when first used.
+        """
+        if schemas is None:
+            from xedocs import all_schemas
+            schemas = all_schemas()
+        factories = {name: partial(self.data_accessor, schema)
+                     for name, schema in schemas.items()}
+        return LazyDatabase(factories)
@@ -0,0 +1,118 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+from typing import List, Optional
+
+
+def encode_records(records: List[dict]) -> str:
+    """Encode records as MongoDB extended JSON, which
+    round-trips the BSON types of query results (e.g. dates).
+    """
+    from bson import json_util
+
+    return json_util.dumps(list(records), json_options=json_util.CANONICAL_JSON_OPTIONS)
+
+
+def decode_records(data) -> List[dict]:
+    from bson import json_util
+
+    return json_util.loads(data)
+
+
+class QueryStore:
+    """Persistent cache of query results backed by a sqlite file.
+
+    Results are stored per key (see `QueryStore.key`) as JSON
+    and can be shared between processes on the same machine.
+    Results older than `max_age` seconds are discarded and the
+    oldest results are removed once there are more than `max_entries`.
+    """
+
+    def __init__(self, path: str, timeout: float = 30.0,
+                 max_entries: Optional[int] = 100_000, max_age: Optional[float] = None):
+        self.path = path
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._local = threading.local()
+        dirname = os.path.dirname(os.path.abspath(path))
+        os.makedirs(dirname, exist_ok=True)
+        with self.connection as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS queries ("
+                "key TEXT PRIMARY KEY, "
+                "collection TEXT, "
+                "created REAL, "
+                "records BLOB)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS queries_collection "
+                "ON queries (collection)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS queries_created "
+                "ON queries (created)"
+            )
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "connection", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = conn
+        return conn
+
+    @staticmethod
+    def key(collection: str, labels) -> str:
+        return hashlib.sha1(repr((collection, labels)).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[List[dict]]:
+        row = self.connection.execute(
+            "SELECT created, records FROM queries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        created, data = row
+        if self.max_age is not None and created < time.time() - self.max_age:
+            return None
+        try:
+            return decode_records(data)
+        except ValueError:
+            # e.g. results stored by an older version, fetched again
+            return None
+
+    def set(self, key: str, collection: str, records: List[dict]):
+        data = encode_records(records)
+        with self.connection as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO queries VALUES (?, ?, ?, ?)",
+                (key, collection, time.time(), data),
+            )
+            self.prune(conn)
+
+    def prune(self, conn: sqlite3.Connection):
+        """Remove expired results and the oldest results beyond `max_entries`"""
+        if self.max_age is not None:
+            conn.execute("DELETE FROM queries WHERE created < ?",
+                         (time.time() - self.max_age,))
+        if self.max_entries is not None:
+            conn.execute(
+                "DELETE FROM queries WHERE key IN ("
+                "SELECT key FROM queries ORDER BY created DESC, rowid DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self, collection: str = None):
+        """Remove the stored results, of a single collection if given"""
+        with self.connection as conn:
+            if collection is None:
+                conn.execute("DELETE FROM queries")
+            else:
+                conn.execute("DELETE FROM queries WHERE collection = ?", (collection,))
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM queries").fetchone()[0]
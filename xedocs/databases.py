@@ -6,18 +6,26 @@ from .data_locations.api import XedocsApi
 from .data_locations.data_folder import DataFolder
 
 
-def straxen_db():
-    schemas = all_schemas()
-    db = MongoDB.from_utilix()
-    accessors = {name: db.data_accessor(schema) for name, schema in schemas.items()}
-    return Database(accessors)
+def _mongo_cache_kwargs(persistent_cache=None, offline=None):
+    kwargs = {}
+    if persistent_cache is not None:
+        kwargs["persistent_cache"] = persistent_cache
+    if offline is not None:
+        kwargs["offline"] = offline
+    return kwargs
+
+
+def straxen_db(persistent_cache=None, offline=None):
+    kwargs = _mongo_cache_kwargs(persistent_cache, offline)
+    db = MongoDB.from_utilix(**kwargs)
+    return db.get_datasets(all_schemas())
 
 
-def corrections_db():
+def corrections_db(persistent_cache=None, offline=None):
     schemas = schemas_by_category()['corrections']
-    db = MongoDB.from_utilix()
-    accessors = {name: db.data_accessor(schema) for name, schema in schemas.items()}
-    return Database(accessors)
+    kwargs = _mongo_cache_kwargs(persistent_cache, offline)
+    db = MongoDB.from_utilix(**kwargs)
+    return db.get_datasets(schemas)
 
 
 def corrections_repo(branch=None, username=None, token=None):
@@ -39,22 +47,18 @@ def xedocs_api(login=True):
     return api.get_datasets()
 
 
-def default_db():
-    return straxen_db()
+def default_db(**kwargs):
+    return straxen_db(**kwargs)
 
 
 def development_db():
-    schemas = all_schemas()
     db = MongoDB.from_utilix(db_name='xedocs-dev')
-    accessors = {name: db.data_accessor(schema) for name, schema in schemas.items()}
-    return Database(accessors)
+    return db.get_datasets(all_schemas())
 
 
 def local_mongo_db(**kwargs):
-    schemas = all_schemas()
     db = MongoDB(**kwargs)
-    accessors = {name: db.data_accessor(schema) for name, schema in schemas.items()}
-    return Database(accessors)
+    return db.get_datasets(all_schemas())
 
 
 def local_folder(path: str = None, **kwargs):
@@ -1,12 +1,14 @@
 import fsspec
+import fsspec.utils
+import fsspec.implementations.local
 import rframe
 import pandas as pd
 
 from io import IOBase
-from typing import Any, List
+from typing import Any, Iterator, List
 from plum import dispatch
 
-from xedocs.json_records import read_records
+from xedocs.json_records import iter_json_lines, iter_json_records, read_records
 
 from .regex_dispatcher import RegexDispatcher
 
@@ -46,58 +48,354 @@ def json_serializable(value: rframe.TimeInterval):
     return f"{str(value.left)} to {str(value.right)}"
 
 
-read_files = RegexDispatcher('read_files')
+# compression suffixes that are always recognized, fsspec
+# only registers codecs whose libraries are installed
+COMPRESSIONS = {
+    "gz": "gzip",
+    "bz2": "bz2",
+    "xz": "xz",
+    "lzma": "lzma",
+    "zst": "zstd",
+    "lz4": "lz4",
+    "sz": "snappy",
+}
+
+
+def split_compression(path: str):
+    """Split a path into the path of the uncompressed
+    file and the compression codec, if any.
+    e.g. `gains.csv.gz` -> (`gains.csv`, `gzip`)
+    """
+    base, _, suffix = path.rpartition(".")
+    if not base:
+        return path, None
+    compression = fsspec.utils.compressions.get(suffix, COMPRESSIONS.get(suffix, None))
+    if compression is None or compression == "zip":
+        return path, None
+    return base, compression
+
+
+class FileReaderDispatcher(RegexDispatcher):
+    """Dispatches files to a reader by their format. Compressed
+    files (e.g. `.json.gz`) are read by the reader of the uncompressed
+    format, decompressing the stream with fsspec.
+    """
+
+    def dispatch(self, s):
+        path, _ = split_compression(s)
+        return super().dispatch(path)
+
+    def __call__(self, s, *args, **kwargs):
+        _, compression = split_compression(s)
+        if compression is not None:
+            kwargs.setdefault("compression", compression)
+        return self.dispatch(s)(s, *args, **kwargs)
+
+
+read_files = FileReaderDispatcher('read_files')
+
+
+def select_columns(docs: List[dict], columns=None) -> List[dict]:
+    """Drop all keys not in `columns` from the records"""
+    if columns is None:
+        return docs
+    columns = set(columns)
+    return [{k: v for k, v in doc.items() if k in columns} for doc in docs]
+
+
+def concat_frames(dfs: List[pd.DataFrame]) -> pd.DataFrame:
+    if not dfs:
+        return pd.DataFrame()
+    if len(dfs) == 1:
+        return dfs[0]
+    return pd.concat(dfs, ignore_index=True)
+
+
+def frame_reader(func):
+    """Mark a reader that returns a single table (a pandas
+    DataFrame or pyarrow Table) instead of records when
+    called with `frame=True`.
+    """
+    func.supports_frames = True
+    return func
 
 
 @read_files.register(r'.*\.csv')
-def read_csv_files(path, **kwargs) -> List[dict]:
-    docs =[]
+@frame_reader
+def read_csv_files(path, columns=None, frame=False, **kwargs) -> List[dict]:
+    dfs =[]
     
     with fsspec.open_files(path, **kwargs) as fs:
         kwargs = rframe.utils.filter_kwargs(pd.read_csv, kwargs)
+        # fsspec already decompresses the stream
+        kwargs.pop("compression", None)
+        if columns is not None:
+            kwargs["usecols"] = set(columns).__contains__
         for f in fs:
-            ds = pd.read_csv(f, **kwargs).to_dict(orient='records')
-            docs.extend(ds)
-    return docs
+            dfs.append(pd.read_csv(f, **kwargs))
+    df = concat_frames(dfs)
+    return df if frame else df.to_dict(orient='records')
+
+
+def stream_reader(func):
+    """Mark a reader that returns an iterator over the
+    records instead of a list when called with `stream=True`.
+    """
+    func.supports_streams = True
+    return func
+
+
+def iter_file_records(path, parse, columns=None, **kwargs) -> Iterator[dict]:
+    """Lazily parse the records of the files matching a path,
+    each file is only opened while its records are consumed.
+    """
+    if columns is not None:
+        columns = set(columns)
+    for f in fsspec.open_files(path, **kwargs):
+        with f as fh:
+            for doc in parse(fh):
+                if columns is not None and isinstance(doc, dict):
+                    doc = {k: v for k, v in doc.items() if k in columns}
+                yield doc
 
 
 @read_files.register(r'.*\.json')
-def read_json_files(path, **kwargs) -> List[dict]:
+@stream_reader
+def read_json_files(path, columns=None, stream=False, **kwargs) -> List[dict]:
+    if stream:
+        return iter_file_records(path, iter_json_records, columns=columns, **kwargs)
     with fsspec.open_files(path, **kwargs) as fs:
         docs = read_records(fs)
-    return docs
+    return select_columns(docs, columns)
+
+
+@read_files.register(r'.*\.jsonl')
+@read_files.register(r'.*\.ndjson')
+@stream_reader
+def read_jsonl_files(path, columns=None, stream=False, **kwargs) -> List[dict]:
+    """Read JSON lines files, one record per line"""
+    docs = iter_file_records(path, iter_json_lines, columns=columns, **kwargs)
+    return docs if stream else list(docs)
+
+
+def reader_supports(path, feature: str) -> bool:
+    """Whether the reader of a path supports a feature
+    e.g. `filters` or `frames`.
+    """
+    try:
+        reader = read_files.dispatch(path)
+    except ValueError:
+        return False
+    return getattr(reader, f"supports_{feature}", False)
+
+
+def supports_filters(path) -> bool:
+    """Whether the reader of a path accepts row `filters`"""
+    return reader_supports(path, "filters")
+
+
+def supports_streams(path) -> bool:
+    """Whether the reader of a path can stream records"""
+    return reader_supports(path, "streams")
+
+
+def supports_frames(path) -> bool:
+    """Whether the reader of a path can return a table"""
+    return reader_supports(path, "frames")
+
+
+def require_pyarrow(feature: str):
+    """Import pyarrow, the ImportError names the extra to install"""
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImportError(f"{feature} requires pyarrow, "
+                          "install it with `pip install xedocs[arrow]`.") from e
+    return pyarrow
+
+
+def parquet_schema(f):
+    """The column names of a parquet file,
+    None if the file schema can not be read.
+    """
+    try:
+        import pyarrow.parquet as pq
+        return pq.read_schema(f).names
+    except ImportError:
+        return None
+    finally:
+        f.seek(0)
+
+
+def parquet_columns(f, columns, available=None):
+    """The requested columns that exist in a parquet file,
+    None (all columns) if the file schema can not be read.
+    """
+    if available is None:
+        available = parquet_schema(f)
+    if available is None:
+        return None
+    columns = set(columns)
+    return [c for c in available if c in columns]
+
+
+def parquet_filters(filters, available):
+    """The filters on columns that exist in a parquet file"""
+    if not filters or available is None:
+        return None
+    filters = [tuple(flt) for flt in filters if flt[0] in available]
+    return filters or None
 
 
 @read_files.register(r'.*\.parquet')
 @read_files.register(r'.*\.pq')
-def read_parquet_files(path, **kwargs) -> List[dict]:
-    docs =[]
+@frame_reader
+def read_parquet_files(path, columns=None, filters=None, frame=False, **kwargs) -> List[dict]:
+    """Read parquet files, optionally only the given columns and
+    rows matching pyarrow style `filters` e.g. [("pmt", "in", [1, 2])].
+    Filters prune row groups using the file statistics.
+    """
+    require_pyarrow("Reading parquet files")
+    dfs =[]
     
     with fsspec.open_files(path, **kwargs) as fs:
         kwargs = rframe.utils.filter_kwargs(pd.read_parquet, kwargs)
+        # read_parquet forwards unknown kwargs to the engine
+        kwargs.pop("protocol", None)
+        kwargs.pop("compression", None)
         for f in fs:
-            ds = pd.read_parquet(f, **kwargs).to_dict(orient='records')
-            docs.extend(ds)
-    return docs
+            available = parquet_schema(f) if columns is not None or filters else None
+            if columns is not None:
+                kwargs["columns"] = parquet_columns(f, columns, available)
+            pushdown = parquet_filters(filters, available)
+            try:
+                df = pd.read_parquet(f, filters=pushdown, **kwargs)
+            except (TypeError, ValueError, NotImplementedError):
+                if pushdown is None:
+                    raise
+                # e.g. labels not comparable to the column type,
+                # the rows are filtered by the query instead.
+                f.seek(0)
+                df = pd.read_parquet(f, **kwargs)
+            if columns is not None:
+                df = df[[c for c in df.columns if c in columns]]
+            dfs.append(df)
+    df = concat_frames(dfs)
+    return df if frame else df.to_dict(orient='records')
+
+
+read_parquet_files.supports_filters = True
+
+
+def arrow_filter_mask(table, filters):
+    """Mask of the rows of an arrow table matching all
+    (column, "in"/"==", values) filters on existing columns.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    mask = None
+    for name, op, values in filters:
+        if name not in table.column_names or op not in ("in", "=="):
+            continue
+        if op == "==":
+            values = [values]
+        try:
+            value_set = pa.array(values).cast(table.schema.field(name).type)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError):
+            continue
+        selected = pc.is_in(table[name], value_set=value_set)
+        mask = selected if mask is None else pc.and_(mask, selected)
+    return mask
+
+
+def read_arrow_table(f):
+    """Read an Arrow IPC / Feather file. Local files are memory mapped,
+    the table then references the (shared) page cache instead of a copy.
+    """
+    import pyarrow as pa
+    import pyarrow.feather
+
+    if isinstance(f.fs, fsspec.implementations.local.LocalFileSystem) and f.compression is None:
+        source = pa.memory_map(f.path, "r")
+    else:
+        with f as fh:
+            source = pa.BufferReader(fh.read())
+    try:
+        return pa.ipc.open_file(source).read_all()
+    except pa.ArrowInvalid:
+        # feather v1 files are not in the IPC format
+        source.seek(0)
+        return pyarrow.feather.read_table(source)
+
+
+@read_files.register(r'.*\.arrow')
+@read_files.register(r'.*\.feather')
+@frame_reader
+def read_arrow_files(path, columns=None, filters=None, frame=False, **kwargs) -> List[dict]:
+    """Read Arrow IPC / Feather files. With `frame=True` the arrow
+    table itself is returned, so no python records are built.
+    """
+    pa = require_pyarrow("Reading Arrow/Feather files")
+
+    tables = []
+    for f in fsspec.open_files(path, **kwargs):
+        table = read_arrow_table(f)
+        if columns is not None:
+            table = table.select([c for c in table.column_names if c in columns])
+        if filters:
+            mask = arrow_filter_mask(table, filters)
+            if mask is not None:
+                table = table.filter(mask)
+        tables.append(table)
+    if not tables:
+        return pd.DataFrame() if frame else []
+    table = tables[0] if len(tables) == 1 else pa.concat_tables(tables)
+    if frame:
+        return table
+    return table.to_pandas().to_dict(orient='records')
+
+
+read_arrow_files.supports_filters = True
+# local uncompressed files are memory mapped
+read_arrow_files.supports_memory_map = True
+
+
+def supports_memory_map(path, protocol="file") -> bool:
+    """Whether the columns read from a path reference the
+    page cache instead of a private copy of the file.
+    """
+    if protocol not in ("file", "local") or split_compression(path)[1] is not None:
+        return False
+    return reader_supports(path, "memory_map")
+
 
 @read_files.register(r'.*\.xlsx')
 @read_files.register(r'.*\.xls')
-def read_excel_files(path, **kwargs) -> List[dict]:
-    docs =[]
+@frame_reader
+def read_excel_files(path, columns=None, frame=False, **kwargs) -> List[dict]:
+    dfs =[]
     with fsspec.open_files(path, **kwargs) as fs:
         kwargs = rframe.utils.filter_kwargs(pd.read_excel, kwargs)
+        if columns is not None:
+            kwargs["usecols"] = set(columns).__contains__
         for f in fs:
-            ds = pd.read_excel(f, **kwargs).to_dict(orient='records')
-            docs.extend(ds)
-    return docs
+            dfs.append(pd.read_excel(f, **kwargs))
+    df = concat_frames(dfs)
+    return df if frame else df.to_dict(orient='records')
 
 
 @read_files.register(r'.*\.pkl')
-def read_pickle_files(path, **kwargs) -> List[dict]:
-    docs =[]
+@frame_reader
+def read_pickle_files(path, columns=None, frame=False, **kwargs) -> List[dict]:
+    dfs =[]
     with fsspec.open_files(path, **kwargs) as fs:
         kwargs = rframe.utils.filter_kwargs(pd.read_pickle, kwargs)
+        kwargs.pop("compression", None)
         for f in fs:
-            ds = pd.read_pickle(f, **kwargs).to_dict(orient='records')
-            docs.extend(ds)
-    return docs
+            df = pd.read_pickle(f, **kwargs)
+            if columns is not None:
+                df = df[[c for c in df.columns if c in columns]]
+            dfs.append(df)
+    df = concat_frames(dfs)
+    return df if frame else df.to_dict(orient='records')
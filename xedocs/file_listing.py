@@ -0,0 +1,366 @@
+"""Cached listings of the files matching a path pattern."""
+
+import os
+import re
+import time
+import parse
+import fsspec
+import datetime
+import threading
+
+import numpy as np
+import pandas as pd
+
+from typing import Dict, List, Optional, Tuple
+from rframe import IntervalIndex, InterpolatingIndex
+from rframe.types import Interval
+
+from .interpolation import to_ns
+
+
+MIN_NS = np.iinfo(np.int64).min
+MAX_NS = np.iinfo(np.int64).max
+
+# path template groups, e.g. {pmt}, {pmt:d} or {time:%Y}
+TEMPLATE_GROUP = re.compile(r"\{\s*(\w*)\s*(?::([^}]*))?\}")
+
+# width of a time partition by its finest strftime directive
+PARTITION_WIDTHS = [
+    ("%S", dict(seconds=1)),
+    ("%M", dict(minutes=1)),
+    ("%H", dict(hours=1)),
+    ("%d", dict(days=1)),
+    ("%j", dict(days=1)),
+    ("%m", dict(months=1)),
+    ("%b", dict(months=1)),
+    ("%B", dict(months=1)),
+    ("%Y", dict(years=1)),
+    ("%y", dict(years=1)),
+]
+
+
+def hashable(value) -> bool:
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+def template_to_glob(template: str) -> str:
+    """Replace all template groups with wildcards"""
+    glob = TEMPLATE_GROUP.sub("*", template)
+    return re.sub(r"\*{2,}", "*", glob)
+
+
+def partition_format(template: str):
+    """Split strftime formatted groups (e.g. {time:%Y}/{time:%m})
+    into separately named parse groups.
+
+    Returns the parse format and a map of field name
+    to the list of (group name, strftime format).
+    """
+    partitions = {}
+
+    def replace(match):
+        name, spec = match.group(1), match.group(2)
+        if not name or not spec or "%" not in spec:
+            return match.group(0)
+        parts = partitions.setdefault(name, [])
+        group = f"{name}__{len(parts)}"
+        parts.append((group, spec))
+        return "{" + group + "}"
+
+    return TEMPLATE_GROUP.sub(replace, template), partitions
+
+
+def partition_range(parts: List[Tuple[str, str]]) -> Optional[Tuple[int, int]]:
+    """The [start, end) range in ns of a time partition
+    given its (strftime format, value) parts.
+    """
+    specs = "|".join(spec for spec, _ in parts)
+    if "%Y" not in specs and "%y" not in specs:
+        return None
+    try:
+        start = datetime.datetime.strptime("|".join(v for _, v in parts), specs)
+    except ValueError:
+        return None
+    start = pd.Timestamp(start)
+    for directive, width in PARTITION_WIDTHS:
+        if directive in specs:
+            return to_ns(start), to_ns(start + pd.DateOffset(**width))
+    return None
+
+
+def query_range(value) -> Tuple[int, int]:
+    """The closed range in ns covered by a query label,
+    points have equal bounds.
+    """
+    if isinstance(value, (Interval, pd.Interval)):
+        value = value.left, value.right
+    if isinstance(value, tuple) and len(value) == 2:
+        lo, hi = value
+        lo = MIN_NS if lo is None else to_ns(lo)
+        hi = MAX_NS if hi is None else to_ns(hi)
+        return lo, hi
+    t = to_ns(value)
+    return t, t
+
+
+def ranges_overlap(ranges, lo, hi) -> bool:
+    """Whether any of the closed query ranges overlaps [lo, hi)"""
+    return any(left < hi and right >= lo for left, right in ranges)
+
+
+def file_signature(path: str, protocol: str = "file") -> Optional[Tuple[int, int]]:
+    """The modification time and size of a local file, None
+    for remote files and files that do not exist.
+    """
+    if protocol not in ("file", "local"):
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class PathListing:
+    """The files matching a glob pattern and the labels
+    parsed from their paths.
+
+    The listing is refreshed once `ttl` seconds have passed
+    (`None` never expires) and, for local files, whenever the
+    modification time of a listed directory changes.
+    Label selections are answered from a map of label value
+    to paths instead of re-parsing every path.
+
+    Time partitioned templates such as `{time:%Y}/{time:%m}.csv`
+    are pruned by range, rows are expected in the partition of
+    their time (the start time for intervals). Interpolated fields
+    are only pruned with `prune_interpolated`, which keeps the
+    partitions next to the queried times and is only correct if
+    every partition holds samples of all interpolated series.
+    """
+
+    def __init__(self, schema, urlpath: str, glob_pattern: str, format_pattern: str,
+                 storage_options: dict = None, ttl: Optional[float] = 60.0,
+                 prune_interpolated: bool = False):
+        self.schema = schema
+        self.prune_interpolated = prune_interpolated
+        self.urlpath = urlpath
+        self.glob_pattern = glob_pattern
+        self.format_pattern = format_pattern
+        self.storage_options = storage_options or {}
+        self.ttl = ttl
+        self.lock = threading.RLock()
+        self.listed_at = None
+        self.signature = None
+        self.protocol = "file"
+        self.fs_options = {}
+        self.paths: List[str] = []
+        self.watched_dirs: List[str] = []
+        self.positions: Dict[str, int] = {}
+        self.labels: Dict[str, dict] = {}
+        self.label_index: Dict[str, dict] = {}
+        self.ranges: Dict[str, Dict[str, Tuple[int, int]]] = {}
+        self.range_fields = set()
+
+    @property
+    def is_local(self) -> bool:
+        return self.protocol in ("file", "local")
+
+    def directories(self) -> List[str]:
+        """Directories whose modification time signals a change"""
+        root = self.glob_pattern.split("*", 1)[0].split("://", 1)[-1]
+        root = os.path.dirname(root) if not root.endswith(os.sep) else root.rstrip(os.sep)
+        dirs = {root or os.sep}
+        for path in self.paths:
+            parent = os.path.dirname(path)
+            while parent.startswith(root) and parent not in dirs:
+                dirs.add(parent)
+                parent = os.path.dirname(parent)
+        return sorted(dirs)
+
+    def directory_signature(self) -> Optional[Tuple]:
+        """The modification times of the directories found by
+        the last refresh, checked before every selection.
+        """
+        if not self.is_local:
+            return None
+        signature = []
+        for path in self.watched_dirs:
+            try:
+                signature.append((path, os.stat(path).st_mtime_ns))
+            except OSError:
+                signature.append((path, None))
+        return tuple(signature)
+
+    def is_stale(self) -> bool:
+        if self.listed_at is None:
+            return True
+        if self.ttl is not None and time.monotonic() - self.listed_at > self.ttl:
+            return True
+        return self.directory_signature() != self.signature
+
+    def parse_labels(self, pattern, partitions, fpath: str):
+        """The labels and partition ranges of a path,
+        None if the path does not match the pattern.
+        """
+        r = pattern.parse(fpath)
+        if r is None:
+            return None
+        groups = dict(r.named)
+        ranges = {}
+        for name, parts in partitions.items():
+            parts = [(spec, groups.pop(group)) for group, spec in parts]
+            bounds = partition_range(parts)
+            if bounds is not None:
+                ranges[name] = bounds
+        labels = {}
+        for k, label in groups.items():
+            if k in self.schema.__fields__:
+                label = self.schema.index_for(k).validate_label(label)
+            labels[k] = label
+        return labels, ranges
+
+    def refresh(self):
+        """List the files and parse their labels"""
+        with self.lock:
+            fs, _, fpaths = fsspec.get_fs_token_paths(self.glob_pattern,
+                                                      storage_options=self.storage_options)
+
+            protocol = fs.protocol if fs.protocol else 'file'
+            if isinstance(protocol, tuple):
+                protocol = protocol[0]
+
+            format_pattern = self.format_pattern.replace(f"{protocol}://", "")
+            format_pattern, partitions = partition_format(format_pattern)
+            pattern = parse.compile(format_pattern)
+
+            paths = []
+            labels = {}
+            ranges = {}
+            label_index = {}
+            for fpath in fpaths:
+                parsed = self.parse_labels(pattern, partitions, fpath)
+                if parsed is None:
+                    continue
+                path_labels, ranges[fpath] = parsed
+                paths.append(fpath)
+                labels[fpath] = path_labels
+                for k, label in path_labels.items():
+                    index = label_index.setdefault(k, {})
+                    if index is None:
+                        continue
+                    if not hashable(label):
+                        # fall back to scanning the paths for this label
+                        label_index[k] = None
+                        continue
+                    index.setdefault(label, []).append(fpath)
+
+            self.protocol = protocol
+            self.fs_options = dict(fs.storage_options)
+            self.paths = paths
+            self.positions = {p: i for i, p in enumerate(paths)}
+            self.labels = labels
+            self.ranges = ranges
+            self.range_fields = {k for r in ranges.values() for k in r}
+            self.label_index = label_index
+            # walking the paths for every query would cost O(files)
+            self.watched_dirs = self.directories()
+            self.signature = self.directory_signature()
+            self.listed_at = time.monotonic()
+
+    def ensure_fresh(self):
+        with self.lock:
+            if self.is_stale():
+                self.refresh()
+
+    def labels_for(self, path: str) -> dict:
+        """The labels parsed from a listed path"""
+        self.ensure_fresh()
+        return self.labels[path]
+
+    def select_range(self, paths, name, vs) -> set:
+        """The paths whose partition of field `name` can match `vs`"""
+        try:
+            queries = [query_range(v) for v in vs]
+        except (TypeError, ValueError):
+            return set(paths)
+        index = self.schema.index_for(name) if name in self.schema.__fields__ else None
+        if isinstance(index, InterpolatingIndex) and not self.prune_interpolated:
+            # the nearest sample of a series may be in any partition
+            return set(paths)
+        selected = set()
+        before, after = {}, {}
+        for path in paths:
+            if name not in self.ranges[path]:
+                selected.add(path)
+                continue
+            lo, hi = self.ranges[path][name]
+            if isinstance(index, IntervalIndex):
+                # intervals are partitioned by their start
+                # and may extend past the partition end
+                if any(lo <= right for _, right in queries):
+                    selected.add(path)
+            elif ranges_overlap(queries, lo, hi):
+                selected.add(path)
+            elif isinstance(index, InterpolatingIndex):
+                # interpolation needs the nearest samples on each side
+                for left, right in queries:
+                    if hi <= left:
+                        before.setdefault(left, []).append((hi, path))
+                    elif lo > right:
+                        after.setdefault(right, []).append((lo, path))
+        for candidates in before.values():
+            latest = max(hi for hi, _ in candidates)
+            selected.update(path for hi, path in candidates if hi == latest)
+        for candidates in after.values():
+            earliest = min(lo for lo, _ in candidates)
+            selected.update(path for lo, path in candidates if lo == earliest)
+        return selected
+
+    def select(self, **labels) -> List[str]:
+        """The listed paths matching the label selection,
+        in listing order. Labels not in the path pattern are ignored.
+        """
+        self.ensure_fresh()
+        with self.lock:
+            selected = None
+            ranged = []
+            for k, vs in labels.items():
+                if vs is None:
+                    continue
+                if not isinstance(vs, list):
+                    vs = [vs]
+                elif not len(vs):
+                    continue
+                if k not in self.label_index:
+                    if k in self.range_fields:
+                        ranged.append((k, vs))
+                    continue
+                if k in self.schema.__fields__:
+                    index = self.schema.index_for(k)
+                    vs = [index.validate_label(v) for v in vs]
+                label_index = self.label_index[k]
+                if label_index is None:
+                    matches = {p for p in self.paths if self.labels[p][k] in vs}
+                else:
+                    matches = set()
+                    for v in vs:
+                        if hashable(v):
+                            matches.update(label_index.get(v, ()))
+                        else:
+                            matches.update(p for label, ps in label_index.items()
+                                           if label == v for p in ps)
+                selected = matches if selected is None else selected & matches
+                if not selected:
+                    return []
+            # ranges are selected last since interpolated fields
+            # depend on the other partitions that match
+            for k, vs in ranged:
+                selected = self.select_range(self.paths if selected is None else selected, k, vs)
+            if selected is None:
+                return list(self.paths)
+            return sorted(selected, key=self.positions.__getitem__)
@@ -0,0 +1,112 @@
+"""Vectorized evaluation of time-sampled documents.
+
+These functions reproduce the semantics of `rframe.InterpolatingIndex`
+(linear interpolation between samples, exact matches, extrapolation
+rules) for many timestamps at once. Times are int64 nanoseconds
+since the unix epoch (UTC), the strax time convention.
+"""
+
+import numpy as np
+import pandas as pd
+
+from ._settings import settings
+
+
+def to_ns(times) -> np.ndarray:
+    """Convert times to int64 nanoseconds since epoch (UTC)"""
+    scalar = np.ndim(times) == 0
+    arr = np.atleast_1d(np.asarray(times))
+    if np.issubdtype(arr.dtype, np.integer):
+        ns = arr.astype(np.int64)
+    else:
+        ns = pd.to_datetime(arr, utc=True).asi8
+    return ns[0] if scalar else ns
+
+
+def extrapolation_mask(schema, times_ns, field="time", **labels):
+    """Boolean mask of the times at which the schema allows
+    extrapolation beyond the last sample.
+    """
+    from .schemas.corrections.base_corrections import can_extrapolate
+
+    index = schema.index_for(field)
+    extrapolate = getattr(index, "extrapolate", False)
+    times_ns = np.asarray(times_ns, dtype=np.int64)
+
+    if extrapolate is can_extrapolate:
+        # only ONLINE versions, up until the cutoff
+        if labels.get("version", None) != "ONLINE":
+            return np.zeros(len(times_ns), dtype=bool)
+        cutoff = to_ns(settings.clock.cutoff_datetime())
+        return times_ns <= cutoff
+
+    if callable(extrapolate):
+        times = pd.to_datetime(times_ns, utc=True).to_pydatetime()
+        return np.array(
+            [bool(extrapolate(dict(labels, **{field: t}))) for t in times], dtype=bool
+        )
+
+    return np.full(len(times_ns), bool(extrapolate), dtype=bool)
+
+
+def interpolate_samples(times_ns, sample_ns, values, extrapolate=False):
+    """Evaluate a sampled series at the given times.
+
+    Numeric values are linearly interpolated, other values take the
+    value of the nearest sample. Times before the first sample are
+    undefined, times after the last sample are only defined where
+    `extrapolate` is True (scalar or mask). Undefined values are NaN
+    for numeric series and None otherwise.
+
+    Args:
+        times_ns (np.ndarray): times to evaluate at, int64 ns
+        sample_ns (np.ndarray): sorted sample times, int64 ns
+        values (np.ndarray): sample values
+        extrapolate (Union[bool, np.ndarray]): where extrapolation is allowed
+
+    Returns:
+        np.ndarray: values at `times_ns`
+    """
+    times_ns = np.asarray(times_ns, dtype=np.int64)
+    sample_ns = np.asarray(sample_ns, dtype=np.int64)
+    values = np.asarray(values)
+    numeric = np.issubdtype(values.dtype, np.number) and not np.issubdtype(values.dtype, np.bool_)
+
+    if numeric:
+        result = np.full(len(times_ns), np.nan, dtype=np.float64)
+    else:
+        result = np.full(len(times_ns), None, dtype=object)
+
+    if not len(sample_ns) or not len(times_ns):
+        return result
+
+    first, last = sample_ns[0], sample_ns[-1]
+    valid = (times_ns >= first) & (times_ns <= last)
+    after = times_ns > last
+    valid |= after & np.broadcast_to(extrapolate, times_ns.shape)
+
+    if numeric:
+        # subtract the first sample to keep float precision
+        x = (times_ns[valid] - first).astype(np.float64)
+        xp = (sample_ns - first).astype(np.float64)
+        result[valid] = np.interp(x, xp, values.astype(np.float64))
+    elif len(sample_ns) == 1:
+        result[valid] = values[0]
+    else:
+        # nearest neighbour
+        x = times_ns[valid]
+        idx = np.clip(np.searchsorted(sample_ns, x), 1, len(sample_ns) - 1)
+        closer_left = (x - sample_ns[idx - 1]) <= (sample_ns[idx] - x)
+        result[valid] = values[np.where(closer_left, idx - 1, idx)]
+    return result
+
+
+def sample_series(df: pd.DataFrame, attr="value", field="time"):
+    """Returns the sorted sample times (int64 ns) and values
+    of a dataframe of time-sampled documents.
+    """
+    if field in df.index.names:
+        df = df.reset_index()
+    df = df.dropna(subset=[field]).sort_values(field, kind="stable")
+    sample_ns = to_ns(df[field].values) if len(df) else np.array([], dtype=np.int64)
+    return sample_ns, df[attr].values
@@ -1,9 +1,10 @@
 import json
+import codecs
 import logging
 import fsspec
 
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, Iterator, List, Optional
 
 from io import IOBase
 from plum import dispatch
@@ -15,7 +16,8 @@ logger = logging.getLogger(__name__)
 @dispatch
 def read_records(obj: IOBase) -> List[Dict]:
     """Reads a json file from an IOBase object"""
-    if not obj.size:
+    if hasattr(obj, "size") and not obj.size:
+        # decompressed streams have no size
         return []
     if not obj.readable():
         return []
@@ -63,6 +65,100 @@ def read_records(obj: Dict[str,Dict]) -> List[Dict]:
     return docs
 
 
+def iter_text(obj, chunk_size=2**16) -> Iterator[str]:
+    """Read a text or binary file in chunks of text"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    while True:
+        chunk = obj.read(chunk_size)
+        if not chunk:
+            break
+        if isinstance(chunk, bytes):
+            chunk = decoder.decode(chunk)
+        if chunk:
+            yield chunk
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def iter_json_lines(obj) -> Iterator[Dict]:
+    """Iterate over the records of a JSON lines file"""
+    for line in obj:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def iter_json_records(obj, chunk_size=2**16) -> Iterator[Dict]:
+    """Iterate over the records of a JSON file.
+
+    Top level arrays are decoded one element at a time, so only
+    a chunk of the file is held in memory. Other layouts
+    (e.g. TinyDB tables) are parsed whole by `read_records`.
+    """
+    decoder = json.JSONDecoder()
+    chunks = iter_text(obj, chunk_size)
+    buffer = ""
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+            return
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    def skip(chars):
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in chars:
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
+
+    skip(" \t\r\n")
+    if pos >= len(buffer):
+        return
+    if buffer[pos] != "[":
+        # not an array, parse the whole document
+        rest = "".join(chunks)
+        yield from read_records(json.loads(buffer[pos:] + rest))
+        return
+    pos += 1
+    while True:
+        skip(" \t\r\n,")
+        if pos >= len(buffer):
+            raise ValueError("Unterminated JSON array.")
+        if buffer[pos] == "]":
+            return
+        try:
+            record, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            fill()
+            continue
+        # a value is complete once it is followed by a delimiter,
+        # otherwise it may be truncated (e.g. a number)
+        after = end
+        while after < len(buffer) and buffer[after] in " \t\r\n":
+            after += 1
+        if after >= len(buffer) or buffer[after] not in ",]":
+            if not eof:
+                fill()
+                continue
+            if after < len(buffer):
+                raise ValueError(f"Invalid JSON array element at {buffer[pos:after + 1]!r}.")
+        pos = end
+        yield record
+
+
 class JsonLoader:
     def __init__(self, path, **storage_kwargs):
         self.path = path
@@ -76,5 +172,19 @@ class JsonLoader:
                 docs =[]
         return docs
 
+    def fingerprint(self) -> Optional[str]:
+        """An identifier of the content of the files read,
+        None if any of them can not be identified.
+        """
+        from .record_cache import file_fingerprint
+
+        fingerprints = []
+        for f in fsspec.open_files(self.path, **self.storage_kwargs):
+            fingerprint = file_fingerprint(f.fs, f.path)
+            if fingerprint is None:
+                return None
+            fingerprints.append(fingerprint)
+        return "|".join(fingerprints) or None
+
     def __call__(self) -> List[dict]:
         return self.read()
@@ -0,0 +1,138 @@
+"""Thread-safe least-recently-used cache."""
+
+import time
+import pickle
+import threading
+
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+def sizeof(value: Any) -> int:
+    """Estimate the memory footprint of a value in bytes"""
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 0
+
+
+class CacheEntry:
+    __slots__ = ("value", "size", "expires")
+
+    def __init__(self, value, size=0, expires=None):
+        self.value = value
+        self.size = size
+        self.expires = expires
+
+    @property
+    def expired(self):
+        return self.expires is not None and self.expires <= time.monotonic()
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache.
+
+    The cache is bounded by number of entries and/or total size in bytes,
+    entries can optionally expire after a time-to-live (in seconds).
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        sizeof: Callable[[Any], int] = sizeof,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._lock = threading.RLock()
+        self._entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is not None and entry.expired:
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, size: Optional[int] = None):
+        """Store a value, if `ttl` is None the value never expires"""
+        if size is None:
+            size = self.sizeof(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            # would evict everything else and still not fit
+            return
+        expires = None if ttl is None else time.monotonic() + ttl
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = CacheEntry(value, size=size, expires=expires)
+            self.nbytes += size
+            self.evict()
+
+    def evict(self):
+        """Evict least recently used entries until within bounds"""
+        with self._lock:
+            while self._entries and self.over_capacity():
+                key = next(iter(self._entries))
+                self._remove(key)
+                self.evictions += 1
+
+    def over_capacity(self):
+        if self.max_entries is not None and len(self._entries) > self.max_entries:
+            return True
+        if self.max_bytes is not None and self.nbytes > self.max_bytes:
+            return True
+        return False
+
+    def pop(self, key: Hashable, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            return self._remove(key).value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = self.misses = 0
+            self.evictions = self.expirations = 0
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+                expirations=self.expirations,
+                entries=len(self._entries),
+                nbytes=self.nbytes,
+            )
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self.nbytes -= entry.size
+        return entry
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._entries.get(key, None)
+            return entry is not None and not entry.expired
+
+    def __len__(self):
+        return len(self._entries)
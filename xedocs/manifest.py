@@ -0,0 +1,240 @@
+"""File manifests of data folders.
+
+A manifest records for every file of a dataset its size, checksum,
+modification time (of local files), number of valid rows, the index labels it contains and the range of
+its interval indexes (e.g. `time`), so queries only need to open the
+files that can contain matching documents.
+"""
+
+import os
+import json
+import hashlib
+import datetime
+import fsspec
+
+import numpy as np
+import pandas as pd
+
+from typing import Dict, Optional
+from rframe import IntervalIndex, InterpolatingIndex
+
+from .columnar import records_to_dataframe
+from .dispatchers import read_files
+from .file_listing import MAX_NS, query_range, ranges_overlap
+from .interpolation import to_ns
+
+
+MANIFEST_VERSION = 1
+
+# index fields with more distinct values are not listed
+MAX_LABEL_VALUES = 1000
+
+
+def file_checksum(f, blocksize=2**20) -> str:
+    """The sha256 checksum of an open binary file"""
+    checksum = hashlib.sha256()
+    for block in iter(lambda: f.read(blocksize), b""):
+        checksum.update(block)
+    return checksum.hexdigest()
+
+
+def jsonable_label(value):
+    if isinstance(value, (pd.Timestamp, datetime.datetime)):
+        value = pd.Timestamp(value)
+        if value.tzinfo is None:
+            # naive times are stored as UTC
+            value = value.tz_localize("UTC")
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def label_summary(schema, df: pd.DataFrame) -> dict:
+    """The label values and ranges of the index fields of a frame"""
+    labels = {}
+    ranges = {}
+    index = df.index.to_frame(index=False) if len(df) else pd.DataFrame()
+    for name in schema.get_index_fields():
+        if name not in index.columns:
+            continue
+        values = index[name]
+        field_index = schema.index_for(name)
+        if isinstance(field_index, (IntervalIndex, InterpolatingIndex)):
+            if isinstance(values.dtype, pd.IntervalDtype):
+                intervals = pd.IntervalIndex(values)
+                left, right = intervals.left, intervals.right
+            else:
+                left = right = pd.Index(values)
+            # open ended intervals have no upper bound
+            hi = None if right.isna().any() else jsonable_label(right.max())
+            ranges[name] = [jsonable_label(left.min()), hi]
+            continue
+        unique = pd.unique(values)
+        if len(unique) <= MAX_LABEL_VALUES:
+            labels[name] = sorted(jsonable_label(v) for v in unique)
+    return dict(labels=labels, ranges=ranges)
+
+
+def validated_frame(accessor, records) -> pd.DataFrame:
+    """Validate raw records into a frame indexed like the accessor storage"""
+    df = records_to_dataframe(accessor.schema, records)
+    if df is None:
+        docs = accessor.validate_chunk(records)
+        df = pd.DataFrame(docs, columns=list(accessor.schema.__fields__))
+        df = df.set_index(accessor.index_fields)
+    return df
+
+
+def manifest_entry(accessor, fpath: str, protocol: str, storage_options: dict) -> dict:
+    """Summarize a single file of a LazyFileAccessor"""
+    with fsspec.open(fpath, "rb", protocol=protocol, **storage_options) as f:
+        checksum = file_checksum(f)
+        size = f.tell()
+    records = read_files(fpath, protocol=protocol, **storage_options)
+    df = validated_frame(accessor, list(records))
+    entry = dict(size=size, checksum=checksum, rows=len(df), **label_summary(accessor.schema, df))
+    if protocol in ("file", "local"):
+        entry["mtime_ns"] = os.stat(fpath).st_mtime_ns
+    return entry
+
+
+def build_manifest(folder) -> dict:
+    """Build the manifest of all datasets of a DataFolder"""
+    datasets = {}
+    for name, accessor in folder.get_datasets(use_manifest=False).items():
+        files = {}
+        for fpath, protocol, storage_options in accessor.matching_paths():
+            entry = manifest_entry(accessor, fpath, protocol, storage_options)
+            files[folder.rel_path(fpath)] = entry
+        datasets[name] = dict(schema=accessor.schema.__name__, files=files)
+    return dict(version=MANIFEST_VERSION,
+                created=datetime.datetime.utcnow().isoformat(),
+                datasets=datasets)
+
+
+def write_manifest(folder, path: str = None) -> str:
+    """Write the manifest of a DataFolder, by default to
+    its `manifest_path`. Returns the path written to.
+    """
+    manifest = build_manifest(folder)
+    if path is None:
+        path = folder.abs_path(folder.manifest_path)
+    with fsspec.open(path, "w", **folder.storage_kwargs(path)) as f:
+        json.dump(manifest, f, indent=1)
+    return path
+
+
+class FileManifest:
+    """The manifest entries of a single dataset, keyed by
+    the paths listed by the dataset accessor.
+    """
+
+    def __init__(self, schema, files: Dict[str, dict], local: bool = True):
+        self.schema = schema
+        self.files = files
+        self.local = local
+        # (size, mtime) of touched files whose checksum still matches
+        self.verified = {}
+        self.labels = {}
+        self.ranges = {}
+        for path, entry in files.items():
+            self.labels[path] = {k: set(self.validate_labels(k, vs))
+                                 for k, vs in entry.get("labels", {}).items()}
+            self.ranges[path] = {k: self.as_range(lo, hi)
+                                 for k, (lo, hi) in entry.get("ranges", {}).items()}
+
+    def validate_labels(self, name, values):
+        if name not in self.schema.__fields__:
+            return values
+        index = self.schema.index_for(name)
+        return [index.validate_label(v) for v in values]
+
+    @staticmethod
+    def as_range(lo, hi):
+        lo = to_ns(lo)
+        hi = MAX_NS if hi is None else to_ns(hi)
+        return lo, hi
+
+    def is_current(self, path: str) -> bool:
+        """Whether a local file is unchanged since the manifest was
+        written. Files with the recorded size and modification time
+        are trusted, otherwise the checksum must match, e.g. for
+        copied files or edits that keep the size. Remote files are trusted.
+        """
+        if not self.local:
+            return True
+        from .record_cache import local_checksum
+
+        entry = self.files[path]
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        if stat.st_size != entry.get("size"):
+            return False
+        signature = (stat.st_size, stat.st_mtime_ns)
+        if entry.get("mtime_ns") == stat.st_mtime_ns or self.verified.get(path) == signature:
+            return True
+        try:
+            current = local_checksum(path) == entry.get("checksum")
+        except OSError:
+            return False
+        if current:
+            self.verified[path] = signature
+        return current
+
+    def can_match(self, path: str, **labels) -> bool:
+        """Whether the file may contain documents matching the labels.
+        Files missing from the manifest always match.
+        """
+        if path not in self.files or not self.is_current(path):
+            return True
+        for k, vs in labels.items():
+            if vs is None:
+                continue
+            if not isinstance(vs, list):
+                vs = [vs]
+            elif not len(vs):
+                continue
+            if k in self.labels[path]:
+                try:
+                    vs = self.validate_labels(k, vs)
+                    if not any(v in self.labels[path][k] for v in vs):
+                        return False
+                except TypeError:
+                    continue
+            elif k in self.ranges[path] and isinstance(self.schema.index_for(k), IntervalIndex):
+                # interpolated values also depend on samples outside
+                # the queried range, only interval indexes are pruned.
+                lo, hi = self.ranges[path][k]
+                try:
+                    ranges = [query_range(v) for v in vs]
+                except (TypeError, ValueError):
+                    continue
+                if not ranges_overlap(ranges, lo, hi):
+                    return False
+        return True
+
+
+def read_manifest(path: str, schemas: Dict[str, type], to_listing_path=None,
+                  local: bool = True, **storage_kwargs) -> Optional[Dict[str, FileManifest]]:
+    """Read a manifest file, returns a FileManifest per dataset
+    or None if the manifest does not exist.
+    """
+    fs, _, _ = fsspec.get_fs_token_paths(path, storage_options=storage_kwargs)
+    if not fs.exists(path):
+        return None
+    with fsspec.open(path, "r", **storage_kwargs) as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    if to_listing_path is None:
+        to_listing_path = lambda p: p
+    manifests = {}
+    for name, dataset in manifest.get("datasets", {}).items():
+        if name not in schemas:
+            continue
+        files = {to_listing_path(p): entry for p, entry in dataset["files"].items()}
+        manifests[name] = FileManifest(schemas[name], files, local=local)
+    return manifests
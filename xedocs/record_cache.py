@@ -0,0 +1,182 @@
+"""Local cache of validated records.
+
+Validated frames of data files are stored under `settings.DATA_DIR`,
+keyed by the content of the source file (its checksum, or the etag/sha
+reported by remote filesystems) and the version of the schema, so
+later processes load the rows without parsing and validating them.
+Frames are stored as parquet files, a data-only format that round-trips
+the index (e.g. intervals) and dtypes exactly. Frames with nested values
+(e.g. dicts or lists) would not round-trip and are not cached.
+"""
+
+import os
+import hashlib
+import logging
+import tempfile
+import threading
+
+import pandas as pd
+
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+from ._settings import settings
+from .manifest import file_checksum
+
+logger = logging.getLogger(__name__)
+
+# bump when the layout of cached frames changes
+RECORD_CACHE_VERSION = 2
+
+# inferred types of object columns that parquet round-trips
+SCALAR_TYPES = {"empty", "string", "integer", "floating", "mixed-integer-float",
+                "boolean", "datetime", "datetime64", "date"}
+
+# content identifiers reported by fsspec filesystems
+# e.g. s3/gcs/http etags and github blob shas
+CONTENT_KEYS = ("ETag", "etag", "sha", "md5Hash", "checksum")
+
+_checksums: Dict[Tuple, str] = {}
+_checksums_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def schema_version(schema) -> str:
+    """Hash of the schema definition, changes to the fields,
+    their types or the xedocs version invalidate cached frames.
+    """
+    from xedocs import __version__
+
+    h = hashlib.sha256()
+    h.update(f"{schema.__module__}.{schema.__qualname__}".encode())
+    try:
+        h.update(schema.schema_json(sort_keys=True).encode())
+    except Exception:
+        h.update(repr(sorted(schema.__fields__.items())).encode())
+    h.update(f"{__version__}:{RECORD_CACHE_VERSION}".encode())
+    return h.hexdigest()
+
+
+def local_checksum(path: str) -> str:
+    """The checksum of a local file, remembered
+    while its size and modification time are unchanged.
+    """
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    with _checksums_lock:
+        if key in _checksums:
+            return _checksums[key]
+    with open(path, "rb") as f:
+        checksum = file_checksum(f)
+    with _checksums_lock:
+        _checksums[key] = checksum
+    return checksum
+
+
+def file_fingerprint(fs, path: str) -> Optional[str]:
+    """An identifier of the content of a file, None
+    if the filesystem does not provide one.
+    """
+    protocol = fs.protocol[0] if isinstance(fs.protocol, tuple) else fs.protocol
+    if protocol in ("file", "local"):
+        return "sha256:" + local_checksum(fs._strip_protocol(path))
+    info = fs.info(path)
+    for key in CONTENT_KEYS:
+        if info.get(key):
+            return f"{key}:{info[key]}"
+    return None
+
+
+def path_fingerprint(path: str, protocol: str = None, **storage_options) -> Optional[str]:
+    import fsspec
+
+    fs = fsspec.filesystem(protocol or "file", **storage_options)
+    return file_fingerprint(fs, path)
+
+
+def is_cacheable(df: pd.DataFrame) -> bool:
+    """Whether the columns and index levels of a frame
+    only hold values that parquet round-trips exactly.
+    """
+    index = df.index
+    levels = [index.get_level_values(i) for i in range(index.nlevels)]
+    for values in levels + [df[name] for name in df.columns]:
+        if values.dtype == object and pd.api.types.infer_dtype(values, skipna=True) not in SCALAR_TYPES:
+            return False
+    return True
+
+
+class RecordCache:
+    """Validated frames stored as files in a directory"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def key(self, schema, fingerprint: str) -> str:
+        h = hashlib.sha256()
+        h.update(fingerprint.encode())
+        h.update(schema_version(schema).encode())
+        return h.hexdigest()
+
+    def path(self, schema, key: str) -> str:
+        return os.path.join(self.root, schema.__name__, f"{key}.parquet")
+
+    def get(self, schema, key: str) -> Optional[pd.DataFrame]:
+        path = self.path(schema, key)
+        if not os.path.exists(path):
+            return None
+        try:
+            df = pd.read_parquet(path)
+        except ImportError:
+            return None
+        except Exception as e:
+            logger.warning(f"Discarding unreadable cached records {path}: {e}")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        if not isinstance(df, pd.DataFrame):
+            return None
+        return df
+
+    def put(self, schema, key: str, df: pd.DataFrame):
+        """Store a frame, concurrent writers of the same key
+        are safe since the file is replaced atomically.
+        """
+        if not is_cacheable(df):
+            logger.debug(f"Not caching {schema.__name__} records with nested values.")
+            return
+        path = self.path(schema, key)
+        tmp = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                df.to_parquet(f)
+            os.replace(tmp, path)
+        except ImportError:
+            # pyarrow is not installed
+            pass
+        except Exception as e:
+            logger.warning(f"Could not cache validated records to {path}: {e}")
+        finally:
+            if tmp is not None and os.path.exists(tmp):
+                os.remove(tmp)
+
+    def clear(self, schema=None):
+        """Remove the cached frames, of a single schema if given"""
+        import shutil
+
+        root = self.root if schema is None else os.path.join(self.root, schema.__name__)
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def record_cache() -> Optional[RecordCache]:
+    """The validated record cache, None if disabled"""
+    if not settings.RECORD_CACHE:
+        return None
+    root = settings.RECORD_CACHE_DIR
+    if root is None:
+        root = os.path.join(settings.DATA_DIR, "record_cache")
+    return RecordCache(root)
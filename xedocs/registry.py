@@ -0,0 +1,107 @@
+"""Process-wide registry of databases.
+
+Building a database can be expensive (e.g. creating a MongoDB
+datasource and an accessor for every registered schema), the
+registry builds each database once per name and kwargs and
+reuses it for all subsequent queries.
+"""
+
+import threading
+
+from typing import Any, Callable, Dict, Tuple, Union
+
+
+def freeze(value: Any):
+    """Convert a value to a hashable equivalent"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, set):
+        return frozenset(freeze(v) for v in value)
+    try:
+        hash(value)
+    except TypeError:
+        return repr(value)
+    return value
+
+
+class DatabaseRegistry:
+    """Thread-safe cache of databases keyed on the database
+    factory and the kwargs it was called with.
+
+    Databases are built outside of the registry lock, concurrent
+    requests for the same key wait for a single build while
+    other keys are built in parallel.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._databases: Dict[Tuple, Any] = {}
+        self._building: Dict[Tuple, threading.Lock] = {}
+
+    @staticmethod
+    def resolve(name: Union[str, Callable]) -> Callable:
+        """Returns the factory function for a database name"""
+        if callable(name):
+            return name
+        import xedocs
+
+        factory = getattr(xedocs.databases, name, None)
+        if not callable(factory):
+            raise KeyError(f"No database named {name}.")
+        return factory
+
+    def key_for(self, name: Union[str, Callable], **kwargs) -> Tuple:
+        return (self.resolve(name), freeze(kwargs))
+
+    def get(self, name: Union[str, Callable], **kwargs):
+        """Returns the database for the given name and kwargs,
+        building it if it does not exist yet.
+        """
+        key = self.key_for(name, **kwargs)
+        with self._lock:
+            if key in self._databases:
+                return self._databases[key]
+            build_lock = self._building.setdefault(key, threading.Lock())
+
+        with build_lock:
+            with self._lock:
+                if key in self._databases:
+                    return self._databases[key]
+            factory, _ = key
+            db = factory(**kwargs)
+            with self._lock:
+                self._databases[key] = db
+                self._building.pop(key, None)
+            return db
+
+    def invalidate(self, name: Union[str, Callable] = None, **kwargs):
+        """Drop cached databases.
+
+        If no name is given, all databases are dropped.
+        If no kwargs are given, all databases with the given name are dropped.
+        """
+        with self._lock:
+            if name is None:
+                self._databases.clear()
+                return
+            factory = self.resolve(name)
+            if kwargs:
+                keys = [self.key_for(factory, **kwargs)]
+            else:
+                keys = [key for key in self._databases if key[0] is factory]
+            for key in keys:
+                self._databases.pop(key, None)
+
+    def __contains__(self, name):
+        with self._lock:
+            factory = self.resolve(name)
+            return any(key[0] is factory for key in self._databases)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._databases)
+
+
+db_registry = DatabaseRegistry()
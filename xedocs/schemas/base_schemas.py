@@ -1,9 +1,12 @@
 import re
+import logging
 from typing import ClassVar
 
 import rframe
 from .._settings import settings
 
+logger = logging.getLogger(__name__)
+
 
 def camel_to_snake(name):
     name = re.sub("(.)([A-Z][a-z]+)", r"\1_\2", name)
@@ -39,6 +42,26 @@ class XeDoc(rframe.BaseSchema):
 
         return xedocs.default_datasource_for(cls)
 
+    @classmethod
+    def prefetch_run_docs(cls, run_ids):
+        """Fetch the run documents of many runs in one query
+        instead of one query per run in the run_id validators.
+        """
+        if len(run_ids) < 2:
+            return
+        try:
+            settings.prefetch_run_docs(run_ids)
+        except Exception as e:
+            # the validators fall back to per-run queries
+            logger.debug(f"Could not prefetch run documents: {e}")
+
+    @classmethod
+    def extract_labels(cls, **kwargs):
+        run_ids = kwargs.get("run_id", None)
+        if isinstance(run_ids, (list, tuple)):
+            cls.prefetch_run_docs(run_ids)
+        return super().extract_labels(**kwargs)
+
     @classmethod
     def help(cls):
         help_str = f"""
@@ -1,6 +1,7 @@
 import re
 import rframe
 import datetime
+import numpy as np
 import pandas as pd
 
 from typing import ClassVar, List
@@ -8,6 +9,7 @@ from pydantic import validator, BaseModel, Field, root_validator
 from rframe.dispatchers import are_equal
 from rframe.types import TimeInterval
 
+from ... import interpolation
 from ..._settings import settings
 from ..base_schemas import VersionedXeDoc
 
@@ -308,6 +310,37 @@ class TimeSampledCorrection(BaseCorrectionSchema):
             # until the current time.
             self.freeze_values(datasource)
 
+    @classmethod
+    def evaluate(cls, times_ns, version, datasource=None, attr="value", **labels):
+        """Evaluate the correction at many times at once.
+
+        The sample series selected by `version` and `labels` is fetched once
+        and interpolated with numpy, following the same interpolation
+        and extrapolation rules as single document queries.
+
+        Args:
+            times_ns (array-like): times as int64 ns since epoch (strax convention) or datetimes.
+            version (str): correction version.
+            datasource (optional): datasource to query. Defaults to the schema default.
+            attr (str, optional): the column to evaluate. Defaults to "value".
+            **labels: other index labels, must select a single series.
+        Returns:
+            np.ndarray: values at `times_ns`, NaN where the correction is undefined.
+        """
+        df = cls.find_df(datasource, version=version, **labels).reset_index()
+
+        others = [name for name in cls.get_index_fields() if name not in ("time", "version")]
+        if others and len(df) and df.groupby(others).ngroups > 1:
+            raise ValueError(
+                f"Labels {labels} match multiple {cls.__name__} series, "
+                f"select a single value for each of {others}."
+            )
+
+        times_ns = np.atleast_1d(interpolation.to_ns(times_ns))
+        extrapolate = interpolation.extrapolation_mask(cls, times_ns, version=version, **labels)
+        sample_ns, values = interpolation.sample_series(df, attr=attr)
+        return interpolation.interpolate_samples(times_ns, sample_ns, values, extrapolate=extrapolate)
+
     @classmethod
     def validity_intervals(cls, datasource=None, **labels):
         left = cls.min(datasource, fields="time", **labels)
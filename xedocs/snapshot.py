@@ -0,0 +1,246 @@
+"""In-memory snapshots of time-interval corrections.
+
+A snapshot loads all intervals matching a selection once and keeps
+them as sorted numpy arrays of interval boundaries per combination of
+the other index labels (e.g. version, config_name). Stabbing queries
+("the value at time t") are then answered locally with a binary search.
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+from typing import Dict, Optional, Tuple
+
+from rframe.types import TimeInterval, MAX_DATETIME
+
+from ._settings import settings
+from .interpolation import to_ns
+
+
+def label_matches(label, value) -> bool:
+    if label is None:
+        return True
+    if isinstance(label, (list, tuple, set)):
+        return value in label
+    return label == value
+
+
+def is_numeric_field(schema, name: str) -> bool:
+    """Whether the values of a schema field are numbers"""
+    if name not in schema.__fields__:
+        raise KeyError(f"{schema.__name__} has no field named {name}.")
+    type_ = schema.__fields__[name].type_
+    if not isinstance(type_, type) or issubclass(type_, (bool, np.bool_)):
+        return False
+    return issubclass(type_, (int, float, np.number))
+
+
+def missing_values(schema, name: str, size: int) -> np.ndarray:
+    """Values of a field where no interval is valid,
+    NaN for numeric fields and None otherwise.
+    """
+    if is_numeric_field(schema, name):
+        return np.full(size, np.nan, dtype=np.float64)
+    return np.full(size, None, dtype=object)
+
+
+class IntervalSeries:
+    """The intervals of a single label combination, sorted by start time"""
+
+    def __init__(self, df: pd.DataFrame):
+        intervals = pd.arrays.IntervalArray(df["time"])
+        left = to_ns(intervals.left)
+        right = to_ns(intervals.right.fillna(MAX_DATETIME))
+        order = np.argsort(left, kind="stable")
+        self.df = df.iloc[order].reset_index(drop=True)
+        self.left = left[order]
+        self.right = right[order]
+
+    def __len__(self):
+        return len(self.left)
+
+    def lookup(self, times_ns) -> np.ndarray:
+        """Row indices of the intervals containing `times_ns`, -1 if none.
+
+        Intervals are treated as closed on the left and open on the right.
+        """
+        times_ns = np.asarray(times_ns, dtype=np.int64)
+        idx = np.searchsorted(self.left, times_ns, side="right") - 1
+        found = idx >= 0
+        found[found] = times_ns[found] < self.right[idx[found]]
+        return np.where(found, idx, -1)
+
+
+class IntervalSnapshot:
+    """Local copy of a time-interval correction for fast lookups.
+
+    Args:
+        accessor (DataAccessor): accessor of a TimeIntervalCorrection schema.
+        **labels: selection of documents to load.
+
+    Usage::
+
+        snap = xedocs.snapshot("global_versions", "straxen_db", version="ONLINE")
+        doc = snap.find_one(time, config_name="electron_lifetime")
+        urls = snap.values(times_ns, attr="url", config_name="electron_lifetime")
+        snap.refresh()
+    """
+
+    def __init__(self, accessor, **labels):
+        self.accessor = accessor
+        self.schema = accessor.schema
+        self.labels = labels
+        self.group_fields = [name for name in self.schema.get_index_fields() if name != "time"]
+        self._lock = threading.RLock()
+        self._series: Dict[Tuple, IntervalSeries] = {}
+        self._latest = None
+        self._count = 0
+        self._frozen_ns = None
+        self.load()
+
+    def __repr__(self):
+        return (f"{self.__class__.__name__}({self.schema.__name__}, "
+                f"groups={len(self._series)}, intervals={len(self)})")
+
+    def __len__(self):
+        return sum(len(series) for series in self._series.values())
+
+    @property
+    def groups(self):
+        """The label combinations held by the snapshot"""
+        return [dict(zip(self.group_fields, key)) for key in self._series]
+
+    def _state(self):
+        latest = self.accessor.max(fields="created_date", **self.labels)
+        if latest is not None and pd.isnull(latest):
+            latest = None
+        return latest, self.accessor.count(**self.labels)
+
+    def _group(self, df: pd.DataFrame) -> Dict[Tuple, pd.DataFrame]:
+        if not len(df):
+            return {}
+        df = df.reset_index()
+        if not self.group_fields:
+            return {(): df}
+        return {
+            key if isinstance(key, tuple) else (key,): group
+            for key, group in df.groupby(self.group_fields, sort=False)
+        }
+
+    def load(self):
+        """Load all intervals matching the snapshot labels"""
+        with self._lock:
+            # values that end before the cutoff time can no longer change
+            frozen = settings.clock.cutoff_datetime()
+            latest, count = self._state()
+            df = self.accessor.find_df(**self.labels)
+            self._series = {key: IntervalSeries(group) for key, group in self._group(df).items()}
+            self._latest, self._count = latest, count
+            self._frozen_ns = to_ns(frozen)
+            return len(self)
+
+    def refresh(self) -> int:
+        """Fetch changes since the last load.
+
+        Nothing is fetched if no documents were created since the last
+        load. Otherwise only intervals that could have changed (those
+        ending after the cutoff time of the previous load) are fetched,
+        falling back to a full reload if documents were inserted elsewhere.
+
+        Returns:
+            int: number of documents fetched.
+        """
+        with self._lock:
+            latest, count = self._state()
+            if latest == self._latest and count == self._count:
+                return 0
+
+            if "time" in self.labels:
+                return self.load()
+
+            frozen = settings.clock.cutoff_datetime()
+            tail = TimeInterval(left=pd.Timestamp(self._frozen_ns, tz="UTC").to_pydatetime(),
+                                right=MAX_DATETIME)
+            df = self.accessor.find_df(**dict(self.labels, time=tail))
+            updates = self._group(df)
+
+            series = {}
+            for key in set(self._series) | set(updates):
+                parts = []
+                if key in self._series:
+                    current = self._series[key]
+                    parts.append(current.df[current.right <= self._frozen_ns])
+                if key in updates:
+                    parts.append(updates[key])
+                merged = pd.concat(parts, ignore_index=True)
+                if len(merged):
+                    series[key] = IntervalSeries(merged)
+
+            if sum(len(s) for s in series.values()) != count:
+                # documents were inserted before the previous cutoff,
+                # e.g. a new version. Start from scratch.
+                return self.load()
+
+            self._series = series
+            self._latest, self._count = latest, count
+            self._frozen_ns = to_ns(frozen)
+            return len(df)
+
+    def _series_for(self, **labels) -> Optional[IntervalSeries]:
+        unknown = set(labels) - set(self.group_fields)
+        if unknown:
+            raise KeyError(f"{self.schema.__name__} has no index named {unknown}.")
+        labels = dict(self.labels, **labels)
+        matches = [
+            series for key, series in self._series.items()
+            if all(label_matches(labels.get(name, None), value)
+                   for name, value in zip(self.group_fields, key))
+        ]
+        if not matches:
+            return None
+        if len(matches) > 1:
+            raise ValueError(
+                f"Labels {labels} match multiple {self.schema.__name__} series, "
+                f"select a single value for each of {self.group_fields}."
+            )
+        return matches[0]
+
+    def find_one(self, time, **labels):
+        """The document valid at `time` or None"""
+        series = self._series_for(**labels)
+        if series is None:
+            return None
+        idx = series.lookup(np.atleast_1d(to_ns(time)))[0]
+        if idx < 0:
+            return None
+        doc = series.df.iloc[idx].to_dict()
+        doc["time"] = TimeInterval(left=doc["time"].left, right=doc["time"].right)
+        return self.schema(**doc)
+
+    def values(self, times, attr="value", **labels) -> np.ndarray:
+        """Values of `attr` at many times.
+
+        Args:
+            times (array-like): datetimes or int64 ns since epoch.
+            attr (str, optional): the column to look up. Defaults to "value".
+            **labels: other index labels, must select a single series.
+        Returns:
+            np.ndarray: values at `times`, NaN (or None for non-numeric columns)
+                where no interval is valid.
+        """
+        times_ns = np.atleast_1d(to_ns(times))
+        series = self._series_for(**labels)
+        if series is None:
+            return missing_values(self.schema, attr, len(times_ns))
+
+        idx = series.lookup(times_ns)
+        column = series.df[attr].values
+        found = idx >= 0
+        if np.issubdtype(column.dtype, np.number) and not np.issubdtype(column.dtype, np.bool_):
+            result = np.full(len(times_ns), np.nan, dtype=np.float64)
+        else:
+            result = np.full(len(times_ns), None, dtype=object)
+        result[found] = column[idx[found]]
+        return result
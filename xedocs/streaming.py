@@ -0,0 +1,74 @@
+"""Helpers for streaming query results in batches."""
+
+import queue
+import threading
+
+from itertools import islice
+from typing import Iterable, Iterator, List, TypeVar
+
+
+T = TypeVar("T")
+
+_DONE = object()
+
+
+def batched(iterable: Iterable[T], size: int) -> Iterator[List[T]]:
+    """Split an iterable into lists of at most `size` items"""
+    if size is None or size < 1:
+        raise ValueError(f"Batch size must be a positive integer, got {size}.")
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class _Failure:
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+def prefetch(iterable: Iterable[T], depth: int = 1) -> Iterator[T]:
+    """Iterate over `iterable` in a background thread.
+
+    At most `depth` items are produced ahead of the consumer, so
+    the next item (e.g. a batch of documents) is fetched while the
+    current one is processed without holding more than `depth` + 1
+    items in memory. Exceptions raised by the producer are re-raised
+    in the consumer. Closing the returned generator stops the producer.
+    """
+    items = queue.Queue(maxsize=max(depth, 1))
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+        except BaseException as e:
+            put(_Failure(e))
+            return
+        put(_DONE)
+
+    thread = threading.Thread(target=produce, name="xedocs-prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.exc
+            yield item
+    finally:
+        stop.set()
@@ -1,17 +1,41 @@
 import os
-import parse
 import fsspec
+import logging
+import weakref
+import threading
 
+import numpy as np
 import pandas as pd
 
-from typing import Any, Union
-from collections import UserDict
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
+from collections import OrderedDict, UserDict
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 from pydantic import ValidationError
+from rframe import Index
 from rframe.data_accessor import DataAccessor
 from typing import List
 from plum import dispatch
 
-from .dispatchers import read_files
+from .columnar import (apply_pre_root_validators, empty_dataframe,
+                       projection_fields, records_to_dataframe, records_to_tuples, source_keys,
+                       supports_columnar, table_to_dataframe, table_to_records)
+from .dispatchers import (read_files, supports_filters, supports_frames,
+                          supports_memory_map, supports_streams)
+from .file_listing import PathListing, file_signature, template_to_glob
+from .lru import LRUCache
+from .record_cache import path_fingerprint, record_cache
+from .streaming import batched, prefetch as prefetch_iter
+
+logger = logging.getLogger(__name__)
+
+# number of filtered file reads kept by each LazyFileAccessor
+FILTERED_READ_ENTRIES = 128
+
+
+def frame_nbytes(df: pd.DataFrame) -> int:
+    """The memory used by the rows of a frame, in bytes"""
+    return int(df.memory_usage(index=True, deep=True).sum()) if len(df) else 0
 
 
 def docs_to_wiki(schema, docs, title=None, columns=None):
@@ -55,12 +79,127 @@ def docs_to_dataframe(schema, docs, columns=None):
     return df.set_index(index_fields)
 
 
-class LazyDataAccessor(DataAccessor):
+def thread_map(func, items, threads=None) -> list:
+    """Apply `func` to all items using a thread pool,
+    results are returned in the order of the items.
+    """
+    if threads is None:
+        from xedocs import settings
+        threads = settings.FILE_LOAD_THREADS
+    items = list(items)
+    if threads is None or threads <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(threads, len(items))) as executor:
+        return list(executor.map(func, items))
+
+
+class ColumnarDataAccessor(DataAccessor):
+    """DataAccessor that builds find_df results directly
+    from the raw query records (see `records_to_dataframe`)
+    instead of validating each record into a document.
+    """
+
+    def query_fields(self, fields=None):
+        """The stored fields needed to build documents
+        or the projection of the given fields, including
+        the inputs of the pre root validators (e.g. run_id).
+        """
+        return source_keys(self.schema, fields)
+
+    def iter_records(self, skip=None, limit=None, sort=None, batch_size=None, fields=None, **labels):
+        """Iterate over the raw records matching the labels.
+
+        `batch_size` is a hint for datasources that support fetching
+        results in batches, `fields` for datasources that can read
+        only some of the fields.
+        """
+        labels = {k: v for k, v in labels.items() if v is not None}
+        query = self.schema.compile_query(datasource=self.storage, **labels)
+        return query.iter(limit=limit, skip=skip, sort=sort)
+
+    def validate_records(self, records, seen: set) -> list:
+        """Validate records into documents, skipping invalid
+        records and index labels already in `seen`.
+        """
+        docs = []
+        for record in records:
+            if not isinstance(record, dict):
+                continue
+            try:
+                doc = self.schema(**record)
+            except ValidationError:
+                continue
+            key = doc.index_labels_tuple
+            if key in seen:
+                continue
+            seen.add(key)
+            docs.append(doc)
+        return docs
+
+    def _find_iter(self, skip=None, limit=None, sort=None, batch_size=None,
+                   prefetch=True, fields=None, **labels):
+        if batch_size is None:
+            from xedocs import settings
+            batch_size = settings.STREAM_BATCH_SIZE
+
+        records = self.iter_records(skip=skip, limit=limit, sort=sort,
+                                    batch_size=batch_size, fields=fields, **labels)
+        seen = set()
+        if fields is None:
+            batches = (self.validate_records(batch, seen) for batch in batched(records, batch_size))
+        else:
+            # only the projected fields are validated
+            batches = (records_to_tuples(self.schema, batch, fields, seen=seen)
+                       for batch in batched(records, batch_size))
+        if prefetch:
+            # fetch and validate the next batch while the current one is consumed
+            batches = prefetch_iter(batches)
+        for docs in batches:
+            yield from docs
+
+    def _find_docs(self, skip=None, limit=None, sort=None, fields=None, **labels):
+        return list(self._find_iter(skip=skip, limit=limit, sort=sort,
+                                    prefetch=False, fields=fields, **labels))
+
+    def _find_df(self, skip=None, limit=None, sort=None, validate=True, fields=None, **labels) -> pd.DataFrame:
+        records = list(self.iter_records(skip=skip, limit=limit, sort=sort, fields=fields, **labels))
+        df = records_to_dataframe(self.schema, records, validate=validate, fields=fields)
+        if df is None:
+            df = super()._find_df(skip=skip, limit=limit, sort=sort, **labels)
+            if fields is not None:
+                read = projection_fields(self.schema, fields)
+                df = df[[name for name in read if name in df.columns]]
+        return df
+
+
+class LazyDataAccessor(ColumnarDataAccessor):
     __storage__ = None
 
+    def record_cache_key(self):
+        """The validated record cache and the key of the storage
+        source, if it can identify its content (e.g. a JsonLoader).
+        """
+        cache = record_cache()
+        fingerprint = getattr(getattr(self, "get_storage", None), "fingerprint", None)
+        if cache is None or fingerprint is None:
+            return None, None
+        try:
+            fingerprint = fingerprint()
+        except Exception:
+            return None, None
+        if fingerprint is None:
+            return None, None
+        return cache, cache.key(self.schema, fingerprint)
+
     @property
     def storage(self):
+        cache, key = None, None
         if self.__storage__ is None:
+            cache, key = self.record_cache_key()
+            df = cache.get(self.schema, key) if key is not None else None
+            if df is not None:
+                self.__storage__ = df
+                return df
             self.__storage__ = self.get_storage()
         if not isinstance(self.__storage__, list):
             return self.__storage__
@@ -81,6 +220,8 @@ class LazyDataAccessor(DataAccessor):
         if len(idx_names) == 1:
             idx_names = idx_names[0]
         df = df.set_index(idx_names)
+        if key is not None:
+            cache.put(self.schema, key, df)
         self.__storage__ = df
         return df
 
@@ -99,112 +240,610 @@ def remove_prefix(text, prefix, sep="/"):
     return text
 
 
-class LazyFileAccessor(DataAccessor):
+class FileWatcher(threading.Thread):
+    """Polls the files of a LazyFileAccessor for changes,
+    stops once the accessor is garbage collected.
+    """
+
+    def __init__(self, accessor, interval: float = 1.0):
+        super().__init__(name=f"xedocs-watch-{accessor.schema.__name__}", daemon=True)
+        self.accessor = weakref.ref(accessor)
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            accessor = self.accessor()
+            if accessor is None:
+                break
+            try:
+                accessor.refresh()
+            except Exception as e:
+                # e.g. a file that is still being written, retried on the next poll
+                logger.warning(f"Failed to reload {accessor.schema.__name__} files: {e}")
+            del accessor
+
+
+class LazyFileAccessor(ColumnarDataAccessor):
+    """Reads documents from files on first use.
+
+    Newly loaded files are kept as separate partitions and only
+    merged into the sorted storage when the storage is accessed,
+    so consecutive loads are sorted once instead of on every load.
+    The source file of every stored row is tracked, so the rows of
+    a file can be replaced or dropped without reloading the others.
+
+    With a `memory_budget` (bytes, by default `settings.FILE_MEMORY_BUDGET`)
+    the least recently used files are evicted once their rows use more
+    memory, they are read again (usually from the record cache) when
+    a query needs them.
+    """
+    __storage__ = None
     loaded: set
+    manifest: Any
+    partitions: List[Tuple[str, pd.DataFrame]]
+    sources: np.ndarray
+    file_ids: Dict[str, int]
+    signatures: Dict[str, Optional[tuple]]
+    file_sizes: Dict[str, int]
+    recent: OrderedDict
+    filtered: LRUCache
+    memory_budget: Optional[int]
+    prune_interpolated: bool
     pattern: str
     protocol: str
     root: str
     urlpaths: List[str]
     storage_options: dict
     
-    def __init__(self, schema, urlpaths, **kwargs):
+    def __init__(self, schema, urlpaths, manifest=None, memory_budget=None,
+                 prune_interpolated=False, **kwargs):
         if isinstance(urlpaths, str):
             urlpaths = [urlpaths]
         self.loaded = set()
+        self.manifest = manifest
+        self.listings = {}
+        self.listings_lock = threading.Lock()
+        self.lock = threading.RLock()
+        self.file_ids = {}
+        self.signatures = {}
+        self.file_sizes = {}
+        self.recent = OrderedDict()
+        self.filtered = LRUCache(max_entries=FILTERED_READ_ENTRIES, sizeof=frame_nbytes)
+        self.memory_budget = memory_budget
+        self.prune_interpolated = prune_interpolated
+        self.evictions = 0
+        self.listed = None
+        self.watcher = None
         self.storage_options = kwargs
         self.urlpaths = urlpaths
         storage = schema.empty_dframe()
         super().__init__(schema, storage, False)
 
+    @property
+    def storage(self):
+        if self.partitions:
+            self.merge_partitions()
+        return self.__storage__
+
+    @storage.setter
+    def storage(self, value):
+        self.__storage__ = value
+        self.partitions = []
+        # rows not loaded from a file have no source
+        self.sources = np.full(len(value), -1, dtype=np.int64)
+
+    @property
+    def index_fields(self):
+        index_fields = list(self.schema.get_index_fields())
+        if len(index_fields) == 1:
+            index_fields = index_fields[0]
+        return index_fields
+
+    def file_id(self, path: str) -> int:
+        if path not in self.file_ids:
+            self.file_ids[path] = len(self.file_ids)
+        return self.file_ids[path]
+
+    def touch(self, path: str):
+        """Mark a loaded file as recently used"""
+        with self.lock:
+            if path in self.recent:
+                self.recent.move_to_end(path)
+
+    def track_file(self, path: str, df: pd.DataFrame):
+        """Record the memory used by the rows of a file"""
+        if path is None:
+            return
+        self.file_sizes[path] = frame_nbytes(df)
+        self.recent[path] = None
+        self.recent.move_to_end(path)
+
+    def add_partition(self, df: pd.DataFrame, path: str = None):
+        """Add newly loaded rows of a file, empty frames are ignored"""
+        with self.lock:
+            self.track_file(path, df)
+            if len(df):
+                self.partitions.append((path, df))
+
+    def sorted_storage(self, frames, sources):
+        """Concatenate frames and their row sources with a single sort"""
+        df = frames[0] if len(frames) == 1 else pd.concat(frames)
+        sources = sources[0] if len(sources) == 1 else np.concatenate(sources)
+        keys = df.index.to_frame(index=False)
+        # stable sort keeps the load order of duplicate index labels
+        order = keys.sort_values(keys.columns.tolist(), kind="mergesort").index.values
+        if (np.diff(order) == 1).all():
+            # e.g. a single sorted file, its columns are not copied
+            return df, sources
+        return df.iloc[order], sources[order]
+
+    def swap_files(self, removed=(), frames=()):
+        """Drop the rows of the `removed` paths and replace the rows
+        of the (path, frame) `frames` with a single storage update,
+        queries see either the previous or the new storage.
+        """
+        with self.lock:
+            removed = set(removed)
+            replaced = removed | {path for path, _ in frames}
+            partitions = [(p, df) for p, df in self.partitions if p not in replaced]
+            partitions += [(p, df) for p, df in frames if len(df)]
+            storage, sources = self.__storage__, self.sources
+            ids = [self.file_ids[p] for p in replaced if p in self.file_ids]
+            if ids and storage is not None and len(storage):
+                keep = ~np.isin(sources, ids)
+                storage, sources = storage[keep], sources[keep]
+            if partitions:
+                dfs, srcs = [], []
+                if storage is not None and len(storage):
+                    dfs.append(storage)
+                    srcs.append(sources)
+                for path, df in partitions:
+                    dfs.append(df)
+                    srcs.append(np.full(len(df), -1 if path is None else self.file_id(path),
+                                        dtype=np.int64))
+                storage, sources = self.sorted_storage(dfs, srcs)
+            self.__storage__, self.sources, self.partitions = storage, sources, []
+            self.loaded -= removed
+            for path in removed:
+                self.signatures.pop(path, None)
+                self.file_sizes.pop(path, None)
+                self.recent.pop(path, None)
+            for path, df in frames:
+                self.track_file(path, df)
+
+    @property
+    def budget(self) -> Optional[int]:
+        from xedocs import settings
+
+        if self.memory_budget is not None:
+            return self.memory_budget
+        return settings.FILE_MEMORY_BUDGET
+
+    def memory_used(self) -> int:
+        return sum(self.file_sizes.values())
+
+    def enforce_budget(self, keep=()):
+        """Evict the least recently used files until the rows fit the
+        memory budget. Files in `keep` (e.g. those of the current query)
+        are never evicted, evicted files are loaded again when needed.
+        """
+        budget = self.budget
+        if budget is None:
+            return
+        with self.lock:
+            used = self.memory_used()
+            evicted = []
+            for path in list(self.recent):
+                if used <= budget:
+                    break
+                if path in keep:
+                    continue
+                used -= self.file_sizes.get(path, 0)
+                evicted.append(path)
+            if evicted:
+                self.swap_files(removed=evicted)
+                self.evictions += len(evicted)
+
+    def memory_usage(self) -> dict:
+        """The memory used by the loaded rows, in bytes"""
+        with self.lock:
+            files = dict(self.file_sizes)
+            return dict(files=len(files),
+                        rows=len(self.__storage__) + sum(len(df) for _, df in self.partitions),
+                        bytes=sum(files.values()),
+                        budget=self.budget,
+                        evictions=self.evictions)
+
+    def merge_partitions(self):
+        """Merge the pending partitions into the storage with a single sort"""
+        self.swap_files()
+
     def _find(self, skip=None, limit=None, sort=None, **labels):
         self.load_files(**labels)
         return super()._find(skip=skip, limit=limit, sort=sort, **labels)
 
+    def iter_records(self, skip=None, limit=None, sort=None, batch_size=None, fields=None, **labels):
+        storage = self.query_storage(fields=fields, **labels)
+        labels = {k: v for k, v in labels.items() if v is not None}
+        query = self.schema.compile_query(datasource=storage, **labels)
+        return query.iter(limit=limit, skip=skip, sort=sort)
+
+    def label_filters(self, **labels) -> list:
+        """Filters of the form (field, "in", values) selecting the
+        plain index labels, for readers that support predicate pushdown.
+        """
+        filters = []
+        for name in self.schema.get_index_fields():
+            vs = labels.get(name, None)
+            if vs is None:
+                continue
+            index = self.schema.index_for(name)
+            if not isinstance(index, Index):
+                # interval and interpolated labels need neighboring rows
+                continue
+            if not isinstance(vs, list):
+                vs = [vs]
+            try:
+                vs = [index.validate_label(v) for v in vs]
+            except Exception:
+                continue
+            if vs and all(isinstance(v, (str, int, float, bool)) for v in vs):
+                filters.append((name, "in", vs))
+        return filters
+
+    def query_storage(self, fields=None, **labels) -> pd.DataFrame:
+        """The documents needed to query the labels.
+
+        Files are loaded into the storage unless only some of
+        their rows or fields are needed. The projected fields and
+        rows matching the plain index labels (for readers that support
+        filters, e.g. parquet) of those files are read instead and
+        kept per file, filters and fields, so repeated queries are
+        not read again. Modified local files are read again.
+        """
+        from xedocs import settings
+
+        filters = self.label_filters(**labels) if settings.FILE_FILTER_PUSHDOWN else []
+        if fields is None and not filters:
+            self.load_files(**labels)
+            return self.storage
+
+        matches, loaded = self.query_paths(**labels)
+        if fields is None:
+            # only files read with filters are worth skipping the cache
+            self.load_paths([m for m in matches if not supports_filters(m[0])], keep=loaded)
+            matches = [m for m in matches if supports_filters(m[0])]
+
+        read = projection_fields(self.schema, fields)
+        # e.g. run_id columns, converted to times by the pre root validators
+        sources = self.query_fields(fields)
+        columns = [name for name in read if name in self.storage.columns]
+        dfs = [self.storage[columns]]
+        key_filters = tuple((name, op, tuple(vs)) for name, op, vs in filters)
+        keys = [(fpath, file_signature(fpath, protocol), key_filters, tuple(read))
+                for fpath, protocol, _ in matches]
+        frames = [self.filtered.get(key) for key in keys]
+        pending = [i for i, df in enumerate(frames) if df is None]
+        results = self.read_paths([matches[i] for i in pending],
+                                  columns=sources, filters=filters, frames=True)
+        # the kept filtered frames are bounded by the same memory budget
+        self.filtered.max_bytes = self.budget
+        for i, (_, records) in zip(pending, results):
+            if not isinstance(records, list):
+                df = table_to_dataframe(self.schema, records, fields=read)
+            else:
+                df = records_to_dataframe(self.schema, records, fields=read)
+            if df is None:
+                # schema needs full documents
+                self.load_files(**labels)
+                return self.storage
+            self.filtered.set(keys[i], df)
+            frames[i] = df
+        dfs.extend(frames)
+        dfs = [df for df in dfs if len(df)] or dfs[:1]
+        if len(dfs) == 1:
+            return dfs[0]
+        return pd.concat(dfs)
+
     def format_to_glob(self, path):
-        for field in self.schema.__fields__:
-            test_cases = ["{" + field + "}", "{ " + field + " }", "{" + field + ":s}", "{" + field + ":d}"]
-            for test_case in test_cases:
-                if test_case in path:
-                    path = path.replace(test_case, "*")
-        return path
+        return template_to_glob(path)
 
     def glob_to_format(self, path):
         return path.replace("*", "{}")
 
-    def iter_path_records(self, ignore_paths=(), **labels):
+    def listing(self, path) -> PathListing:
+        """The cached listing of the files matching a url path"""
+        from xedocs import settings
+
+        with self.listings_lock:
+            if path not in self.listings:
+                self.listings[path] = PathListing(self.schema, path,
+                                                  self.format_to_glob(path),
+                                                  self.glob_to_format(path),
+                                                  storage_options=self.storage_options,
+                                                  ttl=settings.LISTING_CACHE_TTL,
+                                                  prune_interpolated=self.prune_interpolated)
+            return self.listings[path]
+
+    def path_labels(self, **labels) -> dict:
+        """The labels used to select files, e.g. with
+        run_id labels converted to times.
+        """
+        if labels.get("run_id", None) is not None and labels.get("time", None) is None:
+            converted = apply_pre_root_validators(self.schema, labels)
+            # the validators keep the run_id as time if it can not be converted
+            if (converted is not None and "run_id" not in converted
+                    and converted.get("time", None) is not labels["run_id"]):
+                labels = converted
+        return labels
+
+    def matching_paths(self, ignore_paths=(), **labels):
+        """Yield (path, protocol, storage_options) for all files
+        matching the url patterns and the labels.
+        """
+        ignore_paths = set(ignore_paths)
+        labels = self.path_labels(**labels)
         for path in self.urlpaths:
-            glob_patttern = self.format_to_glob(path)
-            fs, _, fpaths = fsspec.get_fs_token_paths(glob_patttern, storage_options=self.storage_options)
-
-            # Always define original_protocol
-            original_protocol = fs.protocol if fs.protocol else 'file'
-            if isinstance(original_protocol, tuple):
-                original_protocol = original_protocol[0]
-            else:
-                original_protocol = original_protocol
-
-            # Debug prints
-            # print(f"\n[DEBUG]")
-            # print(f"Processing path: {path}")
-            # print(f"fs.protocol: {fs.protocol}")
-            # print(f"Original protocol: {original_protocol}")
-            # print(f"Glob pattern: {glob_patttern}")
-            # print(f"File paths: {fpaths}")
-    
-            pattern = path.replace(f"{original_protocol}://", "")
-            pattern = parse.compile(self.glob_to_format(pattern))
-    
-            # More debug prints
-            # print(f"Parse pattern: {pattern}")
-    
-            loaded = set(ignore_paths)
-    
-            for fpath in fpaths:
-                if fpath in loaded:
+            listing = self.listing(path)
+            for fpath in listing.select(**labels):
+                if fpath in ignore_paths:
                     continue
-                r = pattern.parse(fpath)
-                if r is None:
+                if self.manifest is not None and not self.manifest.can_match(fpath, **labels):
                     continue
-                for k, vs in labels.items():
-                    if vs is None:
-                        continue
-                    if not isinstance(vs, list):
-                        vs = [vs]
-                    elif not len(vs):
-                        continue
-                    label = r.named.get(k, None)
-                    if label is None:
-                        continue
-                    if k in self.schema.__fields__:
-                        index = self.schema.index_for(k)
-                        label = index.validate_label(label)
-                        vs = [index.validate_label(v) for v in vs]
-                    if label not in vs:
-                        break
-                else:
-                    records = read_files(fpath, protocol=original_protocol, **fs.storage_options)
-                    yield fpath, records
-                    self.loaded.add(fpath)
-
+                yield fpath, listing.protocol, dict(listing.fs_options)
+
+    def read_paths(self, matches, columns=None, filters=None, frames=False, streams=False):
+        """Read the (path, protocol, storage_options) matches,
+        returns a list of (path, records).
+
+        With `frames`, readers that support it return a table
+        of the raw records instead of a list of dicts, with `streams`
+        an iterator that reads the records as they are consumed.
+        Files are read concurrently by up to `settings.FILE_LOAD_THREADS`
+        threads but always returned in the order they were listed.
+        """
+        def read(match):
+            fpath, protocol, kwargs = match
+            if columns is not None:
+                kwargs["columns"] = columns
+            if filters and supports_filters(fpath):
+                kwargs["filters"] = filters
+            if frames and supports_frames(fpath):
+                kwargs["frame"] = True
+            elif streams and supports_streams(fpath):
+                kwargs["stream"] = True
+            return read_files(fpath, protocol=protocol, **kwargs)
+
+        results = thread_map(read, matches)
+        return [(fpath, records) for (fpath, _, _), records in zip(matches, results)]
+
+    def iter_path_records(self, ignore_paths=(), columns=None, mark_loaded=True, **labels):
+        """Yield (path, records) for all files matching the labels."""
+        matches = list(self.matching_paths(ignore_paths=ignore_paths, **labels))
+        for fpath, records in self.read_paths(matches, columns=columns):
+            yield fpath, records
+            if mark_loaded:
+                self.loaded.add(fpath)
+
+    def validate_chunk(self, records) -> List[dict]:
+        docs = []
+        for doc in records:
+            if not isinstance(doc, dict):
+                continue
+            try:
+                doc = self.schema(**doc).pandas_dict()
+                docs.append(doc)
+            except ValidationError:
+                continue
+        return docs
+
+    def query_paths(self, **labels):
+        """The matches of the files that are not loaded and the paths
+        of the loaded files matching the labels, which are marked
+        as recently used.
+        """
+        matches = []
+        loaded = set()
+        for match in self.matching_paths(**labels):
+            if match[0] in self.loaded:
+                self.touch(match[0])
+                loaded.add(match[0])
+            else:
+                matches.append(match)
+        return matches, loaded
 
     def load_files(self, **labels):
-        index_fields = list(self.schema.get_index_fields())
-        if len(index_fields) == 1:
-            index_fields = index_fields[0]
-        docs = []
-        for fpath, records in self.iter_path_records(ignore_paths=self.loaded, **labels):
-            for doc in records:
-                if not isinstance(doc, dict):
-                    continue
-                try:
-                    doc = self.schema(**doc).pandas_dict()
-                    docs.append(doc)
-                except ValidationError as e:
-                    continue
-            self.loaded.add(fpath)
-        df = pd.DataFrame(docs, columns=list(self.schema.__fields__))
-        df = df.set_index(index_fields)
-        self.storage = pd.concat([self.storage, df]).sort_values(index_fields)
+        matches, loaded = self.query_paths(**labels)
+        self.load_paths(matches, keep=loaded)
+
+    def cached_frames(self, cache, matches) -> list:
+        """The (key, frame) of each match in the validated record
+        cache, the frame is None on a miss and the key is None
+        for files whose content can not be identified.
+        """
+        if cache is None:
+            return [(None, None)] * len(matches)
+
+        def lookup(match):
+            fpath, protocol, storage_options = match
+            if supports_memory_map(fpath, protocol):
+                # a cached copy would replace the shared pages with private memory
+                return None, None
+            try:
+                fingerprint = path_fingerprint(fpath, protocol, **storage_options)
+            except Exception:
+                # the file is then read and validated uncached
+                return None, None
+            if fingerprint is None:
+                return None, None
+            key = cache.key(self.schema, fingerprint)
+            return key, cache.get(self.schema, key)
+
+        return thread_map(lookup, matches)
+
+    def file_frame(self, frames, docs) -> pd.DataFrame:
+        """Combine the validated rows of a single file"""
+        if docs:
+            df = pd.DataFrame(docs, columns=list(self.schema.__fields__))
+            frames = frames + [df.set_index(self.index_fields)]
+        if not frames:
+            return empty_dataframe(self.schema, list(self.schema.__fields__))
+        if len(frames) == 1:
+            return frames[0]
+        return pd.concat(frames)
+
+    def read_frames(self, matches) -> List[Tuple[str, pd.DataFrame]]:
+        """Read and validate the matched files, returns the (path, frame)
+        of each file. Files found in the validated record cache are
+        neither read nor validated.
+        """
+        from xedocs import settings
+
+        matches = list(matches)
+        cache = record_cache()
+        keys = [None] * len(matches)
+        frames = [[] for _ in matches]
+        docs = [[] for _ in matches]
+        pending = []
+        for i, (key, df) in enumerate(self.cached_frames(cache, matches)):
+            keys[i] = key
+            if df is None:
+                pending.append(i)
+            else:
+                frames[i].append(df)
+
+        # rows are collected per file so each file is cached separately
+        tables = []
+        streams = []
+        chunks = []
+        columnar = supports_columnar(self.schema)
+        results = self.read_paths([matches[i] for i in pending], frames=columnar, streams=True)
+        for i, (_, records) in zip(pending, results):
+            if isinstance(records, list):
+                chunks.extend((i, chunk) for chunk in batched(records, settings.STREAM_BATCH_SIZE))
+            elif isinstance(records, Iterator):
+                streams.append((i, records))
+            else:
+                tables.append((i, records))
+
+        # tables are validated column-wise, without a model per record
+        validated = thread_map(partial(table_to_dataframe, self.schema), [t for _, t in tables])
+        for (i, table), df in zip(tables, validated):
+            if df is None:
+                records = table_to_records(table)
+                chunks.extend((i, chunk) for chunk in batched(records, settings.STREAM_BATCH_SIZE))
+            else:
+                frames[i].append(df)
+
+        # streamed records are validated chunk by chunk as they
+        # are read, only the validated rows are kept in memory
+        for i, records in streams:
+            for chunk in batched(records, settings.STREAM_BATCH_SIZE):
+                df = records_to_dataframe(self.schema, chunk) if columnar else None
+                if df is None:
+                    docs[i].extend(self.validate_chunk(chunk))
+                elif len(df):
+                    frames[i].append(df)
+
+        # model validation is pure python and holds the GIL, a thread
+        # pool only helps reading files, so chunks are validated here
+        for i, chunk in chunks:
+            docs[i].extend(self.validate_chunk(chunk))
+
+        for i in pending:
+            df = self.file_frame(frames[i], docs[i])
+            if keys[i] is not None:
+                cache.put(self.schema, keys[i], df)
+            frames[i] = [df]
+
+        return [(fpath, df) for (fpath, _, _), file_frames in zip(matches, frames)
+                for df in file_frames]
+
+    def load_paths(self, matches, keep=()):
+        """Read, validate and store the matched files, then evict
+        cold files other than these and the `keep` paths if the
+        memory budget is exceeded.
+        """
+        matches = list(matches)
+        signatures = {fpath: file_signature(fpath, protocol) for fpath, protocol, _ in matches}
+        frames = self.read_frames(matches)
+        with self.lock:
+            self.signatures.update(signatures)
+            self.loaded.update(signatures)
+            for fpath, df in frames:
+                self.add_partition(df, fpath)
+        self.enforce_budget(keep=set(signatures) | set(keep))
+
+    def listed_files(self) -> Dict[str, tuple]:
+        """The (path, protocol, storage_options) of all listed files"""
+        listed = {}
+        for urlpath in self.urlpaths:
+            listing = self.listing(urlpath)
+            for fpath in listing.select():
+                listed[fpath] = (fpath, listing.protocol, dict(listing.fs_options))
+        return listed
+
+    def refresh(self) -> Dict[str, List[str]]:
+        """Reload the loaded files that were modified since they were
+        read and drop the rows of removed files, the rows of each
+        file are swapped in a single storage update.
+
+        Returns the added, modified and removed paths. Added files
+        are read by the first query that matches them, only
+        local files are checked for modifications.
+        """
+        listed = self.listed_files()
+        with self.lock:
+            loaded = set(self.loaded)
+            signatures = dict(self.signatures)
+            previous, self.listed = self.listed, set(listed)
+
+        added = [] if previous is None else sorted(set(listed) - previous)
+        removed, modified = [], []
+        for fpath in sorted(loaded):
+            if fpath not in listed:
+                removed.append(fpath)
+                continue
+            signature = signatures.get(fpath, None)
+            if signature is None:
+                continue
+            current = file_signature(fpath)
+            if current is None:
+                removed.append(fpath)
+            elif current != signature:
+                modified.append(fpath)
+
+        if removed or modified:
+            updated = {fpath: file_signature(fpath) for fpath in modified}
+            frames = self.read_frames([listed[fpath] for fpath in modified])
+            with self.lock:
+                self.swap_files(removed, frames)
+                self.signatures.update(updated)
+        return dict(added=added, modified=modified, removed=removed)
+
+    def watch(self, interval: float = 1.0) -> "FileWatcher":
+        """Poll the files for changes every `interval` seconds
+        in a background thread and reload them, see `refresh`.
+        """
+        with self.lock:
+            if self.watcher is None:
+                # the first poll only records the listed files
+                self.listed = set(self.listed_files())
+                self.watcher = FileWatcher(self, interval)
+                self.watcher.start()
+            self.watcher.interval = interval
+            return self.watcher
+
+    def unwatch(self):
+        """Stop polling the files for changes"""
+        with self.lock:
+            watcher, self.watcher = self.watcher, None
+        if watcher is not None:
+            watcher.stop()
 
     def _min(self, **kwargs):
         self.load_files()
@@ -282,3 +921,50 @@ class Database(UserDict):
         if hasattr(key, "_ALIAS"):
             key = key._ALIAS
         return super().__getitem__(key)
+
+    def memory_usage(self) -> Dict[str, dict]:
+        """The memory used by the loaded rows of each dataset"""
+        return {name: accessor.memory_usage() for name, accessor in self.data.items()
+                if hasattr(accessor, "memory_usage")}
+
+
+class LazyDatabase(Database):
+    """A Database that builds its accessors on first access.
+
+    Callable values are treated as zero-argument factories, each
+    factory is called at most once and replaced by the accessor it returns.
+    """
+
+    def __init__(self, factories=None, **kwargs):
+        self._lock = threading.RLock()
+        self._built = set()
+        super().__init__(factories, **kwargs)
+
+    def __getitem__(self, key: Any) -> Any:
+        if hasattr(key, "_ALIAS"):
+            key = key._ALIAS
+        with self._lock:
+            value = self.data[key]
+            if key not in self._built:
+                value = value()
+                self.data[key] = value
+                self._built.add(key)
+        return value
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        with self._lock:
+            if callable(value):
+                self._built.discard(key)
+            else:
+                self._built.add(key)
+            self.data[key] = value
+
+    def __delitem__(self, key: Any) -> None:
+        with self._lock:
+            self._built.discard(key)
+            del self.data[key]
+
+    def is_built(self, key):
+        if hasattr(key, "_ALIAS"):
+            key = key._ALIAS
+        return key in self._built
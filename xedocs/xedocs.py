@@ -1,6 +1,7 @@
 """Main module."""
 
 from pathlib import Path
+import numpy as np
 import pandas as pd
 
 from collections import defaultdict
@@ -9,16 +10,25 @@ from rframe import DataAccessor
 from tqdm.auto import tqdm
 
 from ._settings import settings
+from .registry import db_registry
+from .cache import query_cache
 from .schemas import XeDoc
 from .data_locations.mongodb import MongoDB
+from .snapshot import IntervalSnapshot
+from .utils import ColumnarDataAccessor
+from .columnar import docs_to_records
+from . import interpolation
+from .streaming import batched, prefetch as prefetch_iter
 
 
-def find_docs(schema, datasource=None, **labels):
+def find_docs(schema, datasource=None, fields=None, **labels):
     """find documents by labels
 
     Args:
         schema (Union[XeDoc,str]): A Xedocs schema or name/alias of one.
         datasource (optional): compatible datasource or name of known source. Defaults to None.
+        fields (List[str], optional): only return these fields as lightweight
+            namedtuple records instead of full documents. Defaults to None.
         **labels: label selections
     Returns:
         List[XeDoc]: a list of documents matching selection.
@@ -26,15 +36,34 @@ def find_docs(schema, datasource=None, **labels):
 
     accessor = get_accessor(schema, datasource)
 
-    return accessor.find_docs(**labels)
+    if fields is not None and isinstance(accessor, ColumnarDataAccessor):
+        return accessor.find_docs(fields=fields, **labels)
 
+    if settings.QUERY_CACHE:
+        docs = query_cache.find_docs(accessor, **labels)
+    else:
+        docs = accessor.find_docs(**labels)
 
-def find_iter(schema, datasource=None, **labels):
+    if fields is None:
+        return docs
+
+    return docs_to_records(accessor.schema, docs, fields)
+
+
+def find_iter(schema, datasource=None, batch_size=None, prefetch=True, fields=None, **labels):
     """find documents by labels, return iterator
 
+    Documents are fetched and validated in batches, the next
+    batch is prefetched in a background thread while the current
+    one is consumed.
+
     Args:
         schema (Union[XeDoc,str]): A Xedocs schema or name/alias of one.
         datasource (optional): compatible datasource or name of known source. Defaults to None.
+        batch_size (int, optional): documents per batch. Defaults to settings.STREAM_BATCH_SIZE.
+        prefetch (bool, optional): prefetch the next batch. Defaults to True.
+        fields (List[str], optional): only return these fields as lightweight
+            namedtuple records instead of full documents. Defaults to None.
         **labels: label selections
     Returns:
         Iterator[XeDoc]: an iterator over documents matching selection.
@@ -42,7 +71,19 @@ def find_iter(schema, datasource=None, **labels):
 
     accessor = get_accessor(schema, datasource)
 
-    return accessor.find_iter(**labels)
+    if isinstance(accessor, ColumnarDataAccessor):
+        return accessor.find_iter(batch_size=batch_size, prefetch=prefetch, fields=fields, **labels)
+
+    # other accessors yield documents one by one, they are
+    # grouped into batches here so the next batch is prefetched
+    if batch_size is None:
+        batch_size = settings.STREAM_BATCH_SIZE
+    batches = batched(accessor.find_iter(**labels), batch_size)
+    if fields is not None:
+        batches = (docs_to_records(accessor.schema, docs, fields) for docs in batches)
+    if prefetch:
+        batches = prefetch_iter(batches)
+    return (doc for docs in batches for doc in docs)
 
 
 def find_df(schema, datasource=None, **labels):
@@ -74,9 +115,75 @@ def find_one(schema, datasource=None, **labels):
 
     accessor = get_accessor(schema, datasource)
 
+    if settings.QUERY_CACHE:
+        return query_cache.find_one(accessor, **labels)
+
     return accessor.find_one(**labels)
 
 
+def correction_matrix(schema, version, times, detector, pmts=None, datasource=None, attr="value"):
+    """Evaluate a per-PMT time-sampled correction at many times.
+
+    All samples are fetched with a single query and interpolated
+    with the same rules as single document queries.
+
+    Args:
+        schema (Union[XeDoc,str]): A per-PMT TimeSampledCorrection schema or name/alias of one.
+        version (str): correction version.
+        times (array-like): times to evaluate at, datetimes or int64 ns since epoch.
+        detector (str): detector name.
+        pmts (List[int], optional): PMTs to evaluate. Defaults to all PMTs found.
+        datasource (optional): compatible datasource or name of known source. Defaults to None.
+        attr (str, optional): the column to evaluate. Defaults to "value".
+    Returns:
+        np.ndarray: array of shape (n_times, n_pmts), NaN where the correction is undefined.
+            Columns follow the order of `pmts`, or sorted PMT numbers if `pmts` is None.
+    """
+    from .schemas.corrections import TimeSampledCorrection
+
+    schema = find_schema(schema)
+    if not issubclass(schema, TimeSampledCorrection) or "pmt" not in schema.get_index_fields():
+        raise TypeError(f"{schema.__name__} is not a per-PMT time-sampled correction.")
+
+    times_ns = np.atleast_1d(interpolation.to_ns(times))
+    df = find_df(schema, datasource=datasource, version=version, detector=detector, pmt=pmts)
+    df = df.reset_index()
+
+    if pmts is None:
+        pmts = sorted(df["pmt"].unique())
+
+    extrapolate = interpolation.extrapolation_mask(schema, times_ns, version=version, detector=detector)
+    result = np.full((len(times_ns), len(pmts)), np.nan)
+    groups = dict(list(df.groupby("pmt")))
+    for i, pmt in enumerate(pmts):
+        if pmt not in groups:
+            continue
+        sample_ns, values = interpolation.sample_series(groups[pmt], attr=attr)
+        result[:, i] = interpolation.interpolate_samples(times_ns, sample_ns, values, extrapolate=extrapolate)
+    return result
+
+
+def snapshot(schema, datasource=None, **labels) -> IntervalSnapshot:
+    """Load a time-interval correction into memory for fast lookups.
+
+    Args:
+        schema (Union[XeDoc,str]): A TimeIntervalCorrection schema or name/alias of one.
+        datasource (optional): compatible datasource or name of known source. Defaults to None.
+        **labels: label selections of the documents to load.
+    Returns:
+        IntervalSnapshot: answers point and batch queries locally,
+            call `refresh()` to fetch new documents.
+    """
+    from .schemas.corrections import TimeIntervalCorrection
+
+    schema = find_schema(schema)
+    if not issubclass(schema, TimeIntervalCorrection):
+        raise TypeError(f"{schema.__name__} is not a time-interval correction.")
+
+    accessor = get_accessor(schema, datasource)
+    return IntervalSnapshot(accessor, **labels)
+
+
 def insert_docs(schema: str, docs: Union[list, dict, pd.DataFrame], datasource=None, dry=False):
     # Currently stuck on how to deal with instances of schemas
     if datasource == 'straxen_db': # switch to straxen_db
@@ -116,8 +223,12 @@ def insert_docs(schema: str, docs: Union[list, dict, pd.DataFrame], datasource=N
         docs = docs.reset_index().to_dict(orient="records")
     if not isinstance(docs, list):
         docs = [docs]
+
     accessor = get_accessor(schema, datasource)
 
+    run_ids = [doc["run_id"] for doc in docs if isinstance(doc, dict) and "run_id" in doc]
+    accessor.schema.prefetch_run_docs(run_ids)
+
     return accessor.insert(docs, dry=dry)
 
 
@@ -159,8 +270,11 @@ def find_schema(name) -> Type[XeDoc]:
 
 
 def get_accessor(schema, db=None):
-    import xedocs
+    """Returns the accessor for a schema in a database.
 
+    Named databases are built once and cached in the
+    process-wide registry, see `xedocs.db_registry`.
+    """
     schema = find_schema(schema)
     if not issubclass(schema, XeDoc):
         raise TypeError(
@@ -169,10 +283,8 @@ def get_accessor(schema, db=None):
 
     if db is None:
         db = settings.DEFAULT_DATABASE
-    if isinstance(db, str):
-        db = getattr(xedocs.databases, db)
-    if callable(db):
-        db = db()
+    if isinstance(db, str) or callable(db):
+        db = db_registry.get(db)
     return db[schema._ALIAS]
 
 